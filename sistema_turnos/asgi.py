@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sistema_turnos.settings')
 
-application = get_asgi_application()
+# Sólo para /api/eventos/ (ver turnos.eventos): el resto del sitio corre en WSGI
+django_application = get_asgi_application()
+
+from turnos.eventos import Desconexion  # noqa: E402
+
+application = Desconexion(django_application)
@@ -33,6 +33,12 @@ app.conf.beat_schedule = {
         'schedule': crontab(day_of_week=0, hour=2, minute=0),
     },
     
+    # Eliminar comprobantes en lote vencidos a las 03:00
+    'limpiar-comprobantes-lote': {
+        'task': 'turnos.tasks.limpiar_comprobantes_lote',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    
     # Generar reportes diarios a las 08:00
     # Nota: Esta tarea se ejecutará para cada prestador activo
     'generar-reportes-diarios': {
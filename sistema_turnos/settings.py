@@ -20,6 +20,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Apps del proyecto
     'turnos',
@@ -53,6 +54,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'django.template.context_processors.media',
+                'turnos.context_processors.notificaciones',
             ],
         },
     },
@@ -75,6 +77,16 @@ DATABASES = {
 # Custom User Model
 AUTH_USER_MODEL = 'turnos.Usuario'
 
+# UsuarioBackend trae el perfil del prestador junto con el usuario de la
+# sesión. ModelBackend queda sólo para no cerrar las sesiones iniciadas
+# antes de agregarlo (turnos.decorators las pasa a UsuarioBackend); puede
+# quitarse pasado SESSION_COOKIE_AGE. Con dos backends, login() necesita
+# el argumento backend si el usuario no viene de authenticate().
+AUTHENTICATION_BACKENDS = [
+    'turnos.backends.UsuarioBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -116,6 +128,10 @@ EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@turnos.com')
 
+# Máximo de recordatorios por minuto hacia EMAIL_HOST, entre todos los
+# workers (0 = sin límite)
+RECORDATORIOS_POR_MINUTO = int(os.environ.get('RECORDATORIOS_POR_MINUTO', 0))
+
 # Google OAuth2 settings
 GOOGLE_OAUTH2_CLIENT_ID = os.environ.get('GOOGLE_OAUTH2_CLIENT_ID', '')
 GOOGLE_OAUTH2_CLIENT_SECRET = os.environ.get('GOOGLE_OAUTH2_CLIENT_SECRET', '')
@@ -124,6 +140,18 @@ GOOGLE_OAUTH2_REDIRECT_URI = os.environ.get('GOOGLE_OAUTH2_REDIRECT_URI', 'http:
 # MercadoPago settings
 MERCADOPAGO_PUBLIC_KEY = os.environ.get('MERCADOPAGO_PUBLIC_KEY', '')
 MERCADOPAGO_ACCESS_TOKEN = os.environ.get('MERCADOPAGO_ACCESS_TOKEN', '')
+MERCADOPAGO_API_URL = os.environ.get('MERCADOPAGO_API_URL', 'https://api.mercadopago.com')
+MERCADOPAGO_TIMEOUT = float(os.environ.get('MERCADOPAGO_TIMEOUT', 5))
+MERCADOPAGO_MAX_REINTENTOS = int(os.environ.get('MERCADOPAGO_MAX_REINTENTOS', 1))
+# Clientes HTTP reutilizados por proceso (uno por access token) y conexiones de cada uno
+MERCADOPAGO_MAX_CLIENTES = int(os.environ.get('MERCADOPAGO_MAX_CLIENTES', 100))
+MERCADOPAGO_CONEXIONES_POR_CLIENTE = int(os.environ.get('MERCADOPAGO_CONEXIONES_POR_CLIENTE', 4))
+# Crear la preferencia de pago en Celery en lugar de durante la solicitud
+MERCADOPAGO_PREFERENCIA_ASINCRONA = os.environ.get('MERCADOPAGO_PREFERENCIA_ASINCRONA', 'False') == 'True'
+# Circuit breaker: tras UMBRAL fallos en VENTANA segundos, no llamar durante PAUSA segundos
+MERCADOPAGO_CIRCUITO_UMBRAL = int(os.environ.get('MERCADOPAGO_CIRCUITO_UMBRAL', 5))
+MERCADOPAGO_CIRCUITO_VENTANA = int(os.environ.get('MERCADOPAGO_CIRCUITO_VENTANA', 60))
+MERCADOPAGO_CIRCUITO_PAUSA = int(os.environ.get('MERCADOPAGO_CIRCUITO_PAUSA', 30))
 
 # Celery Configuration (para tareas asíncronas como envío de notificaciones)
 CELERY_BROKER_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
@@ -133,6 +161,55 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Redis pub/sub para los eventos en tiempo real del panel (turnos.eventos)
+EVENTOS_REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+
+# Cache (misma instancia de Redis que Celery, en otra base)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_CACHE_URL', 'redis://localhost:6379/1'),
+        'KEY_PREFIX': 'turnos',
+    }
+}
+
+# Segundos que se conserva la disponibilidad calculada. La invalidación es
+# explícita (ver turnos.signals), esto sólo acota la memoria usada.
+DISPONIBILIDAD_CACHE_TIMEOUT = int(os.environ.get('DISPONIBILIDAD_CACHE_TIMEOUT', 60 * 60))
+
+# Segundos que se conservan las claves de versión de la cache. Las versiones
+# nuevas salen del reloj, así que al vencer no se reutilizan datos viejos
+VERSIONES_CACHE_TIMEOUT = int(os.environ.get('VERSIONES_CACHE_TIMEOUT', 24 * 60 * 60))
+
+# max-age de /api/disponibilidad/. Con 0 el navegador revalida siempre con
+# el ETag (respuesta 304 si no hubo cambios en el día)
+DISPONIBILIDAD_MAX_AGE = int(os.environ.get('DISPONIBILIDAD_MAX_AGE', 0))
+
+# Notificaciones particionadas por mes (ver turnos.particiones): meses de
+# particiones creadas por adelantado y meses que se conservan
+NOTIFICACIONES_MESES_ADELANTADOS = int(os.environ.get('NOTIFICACIONES_MESES_ADELANTADOS', 3))
+NOTIFICACIONES_RETENCION_MESES = int(os.environ.get('NOTIFICACIONES_RETENCION_MESES', 6))
+
+# Segundos que se conserva el contador de notificaciones no leídas
+NOTIFICACIONES_CACHE_TIMEOUT = int(os.environ.get('NOTIFICACIONES_CACHE_TIMEOUT', 24 * 60 * 60))
+
+# Segundos que se conservan las estadísticas del panel del prestador
+ESTADISTICAS_CACHE_TIMEOUT = int(os.environ.get('ESTADISTICAS_CACHE_TIMEOUT', 10 * 60))
+
+# Segundos que se conserva cada comprobante PDF dibujado (ver turnos.comprobantes)
+COMPROBANTES_CACHE_TIMEOUT = int(os.environ.get('COMPROBANTES_CACHE_TIMEOUT', 7 * 24 * 60 * 60))
+
+# Página pública de reserva: segundos que se conserva el catálogo cacheado
+# y max-age que se anuncia a navegadores y CDN
+CATALOGO_CACHE_TIMEOUT = int(os.environ.get('CATALOGO_CACHE_TIMEOUT', 60 * 60))
+CATALOGO_MAX_AGE = int(os.environ.get('CATALOGO_MAX_AGE', 60))
+
+# Más reservas que esto y los comprobantes en lote se generan con Celery
+COMPROBANTES_LOTE_SINCRONICO = int(os.environ.get('COMPROBANTES_LOTE_SINCRONICO', 200))
+
+# Días que se conservan en el storage los comprobantes generados en lote
+COMPROBANTES_LOTE_RETENCION_DIAS = int(os.environ.get('COMPROBANTES_LOTE_RETENCION_DIAS', 7))
+
 # Security settings for production
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
@@ -155,7 +232,10 @@ MESSAGE_TAGS = {
     messages.ERROR: 'alert-danger',
 }
 
-# Logging
+# Logging (logs/ no está en el repositorio: se crea al iniciar)
+LOG_DIR = BASE_DIR / 'logs'
+LOG_DIR.mkdir(exist_ok=True)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -169,7 +249,7 @@ LOGGING = {
         'file': {
             'level': 'INFO',
             'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'logs' / 'debug.log',
+            'filename': LOG_DIR / 'debug.log',
             'formatter': 'verbose',
         },
         'console': {
@@ -43,16 +43,29 @@ urlpatterns = [
     
     # Clientes
     path('clientes/', views.clientes_list, name='clientes_list'),
+    path('clientes/exportar/', views.clientes_exportar, name='clientes_exportar'),
     path('clientes/<int:pk>/', views.cliente_detail, name='cliente_detail'),
     path('clientes/<int:pk>/bloquear/', views.cliente_toggle_bloqueo, name='cliente_toggle_bloqueo'),
     
     # Reservas
     path('reservas/', views.reservas_list, name='reservas_list'),
+    path('reservas/exportar/', views.reservas_exportar, name='reservas_exportar'),
+    path('reservas/comprobantes/', views.reservas_comprobantes, name='reservas_comprobantes'),
+    path('reservas/comprobantes/<str:nombre>/', views.reservas_comprobantes_archivo, name='reservas_comprobantes_archivo'),
     path('reservas/<int:pk>/cancelar/', views.reserva_cancelar, name='reserva_cancelar'),
     
     # API para disponibilidad
     path('api/disponibilidad/', views.disponibilidad_ajax, name='disponibilidad_ajax'),
+    path('api/disponibilidad/rango/', views.disponibilidad_rango_ajax, name='disponibilidad_rango_ajax'),
+    path('api/disponibilidad/prestador/', views.disponibilidad_prestador_ajax, name='disponibilidad_prestador_ajax'),
     path('api/reserva/', views.procesar_reserva, name='procesar_reserva'),
+    path('api/csrf/', views.csrf_cookie, name='csrf_cookie'),
+    path('api/reserva/<uuid:codigo>/pago/', views.reserva_pago_estado, name='reserva_pago_estado'),
+    path('api/clientes/buscar/', views.clientes_buscar_ajax, name='clientes_buscar_ajax'),
+    path('api/eventos/reservas/', views.eventos_reservas, name='eventos_reservas'),
+    path('api/notificaciones/', views.notificaciones_ajax, name='notificaciones_ajax'),
+    path('api/notificaciones/leidas/', views.notificaciones_marcar_leidas, name='notificaciones_marcar_leidas'),
+    path('api/metricas/mercadopago/', views.metricas_mercadopago, name='metricas_mercadopago'),
     
     # Reservas públicas
     path('reservar/<slug:slug>/', views.reserva_publica, name='reserva_publica'),
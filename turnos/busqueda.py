@@ -0,0 +1,68 @@
+"""
+Búsqueda de clientes.
+
+Los campos de texto tienen índices GIN de trigramas (pg_trgm) sobre
+UPPER(campo::text), la misma expresión que genera `icontains`, así que
+tanto las búsquedas por subcadena como las aproximadas (`%>`, similitud de
+palabra) se resuelven con los índices en lugar de recorrer la tabla.
+
+- Sólo dígitos: prefijo de DNI (índice btree con varchar_pattern_ops).
+- Con '@': prefijo de email.
+- Resto: cada palabra debe aparecer, exacta o aproximada, en el nombre, el
+  apellido o el email.
+"""
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import Case, Q, TextField, Value, When
+from django.db.models.functions import Cast, Concat, Upper
+
+CAMPOS_TEXTO = ('nombre', 'apellido', 'email')
+
+# Resultados del autocompletado
+LIMITE_AUTOCOMPLETADO = 10
+
+
+def expresion_busqueda(campo):
+    """Expresión indexada del campo (ver migración 0008)"""
+    return Upper(Cast(campo, TextField()))
+
+
+def _con_alias(clientes):
+    return clientes.alias(**{
+        f'{campo}_busqueda': expresion_busqueda(campo) for campo in CAMPOS_TEXTO
+    })
+
+
+def filtrar_clientes(clientes, q):
+    """Clientes que coinciden con la búsqueda `q`"""
+    q = q.strip()
+    if not q:
+        return clientes
+    if q.isdigit():
+        return clientes.filter(dni__startswith=q)
+    if '@' in q:
+        return clientes.filter(email__istartswith=q)
+
+    condicion = Q()
+    for palabra in q.split():
+        coincide = Q()
+        for campo in CAMPOS_TEXTO:
+            coincide |= Q(**{f'{campo}__icontains': palabra})
+            coincide |= Q(**{f'{campo}_busqueda__trigram_word_similar': palabra.upper()})
+        condicion &= coincide
+    return _con_alias(clientes).filter(condicion)
+
+
+def buscar_clientes(clientes, q):
+    """Clientes que coinciden con `q`, del más al menos parecido"""
+    q = q.strip()
+    clientes = filtrar_clientes(clientes, q)
+    if q.isdigit():
+        return clientes.order_by('dni')
+    if '@' in q:
+        return clientes.order_by('email')
+
+    return clientes.annotate(
+        similitud=TrigramWordSimilarity(q, Concat('nombre', Value(' '), 'apellido')),
+        # Las coincidencias por prefijo del apellido van primero
+        prefijo=Case(When(apellido__istartswith=q, then=Value(1)), default=Value(0)),
+    ).order_by('-prefijo', '-similitud', 'apellido', 'id')
@@ -0,0 +1,60 @@
+"""
+Catálogo público de cada prestador (página de reserva).
+
+`catalogo(slug)` devuelve el prestador con sus servicios y agendas activos,
+cacheado por slug. Para visitantes anónimos también se cachea la página
+renderizada, bajo la versión del catálogo, que además es su ETag; así la
+página puede servirse con Cache-Control public desde un CDN.
+
+El catálogo se guarda bajo una clave de versión por slug (ver
+turnos.versiones), que es también la versión de la página y su ETag.
+turnos.signals incrementa la versión cuando cambia el prestador o alguno de
+sus servicios o agendas.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+
+from .models import PerfilPrestador
+from .versiones import incrementar_version, obtener_version
+
+
+def _clave_version(slug):
+    return f'catalogo:v:{slug}'
+
+
+def catalogo(slug):
+    """Prestador activo, servicios y agendas activos y versión del catálogo"""
+    version = obtener_version(_clave_version(slug))
+    clave = f'catalogo:{slug}:{version}'
+    datos = cache.get(clave)
+    if datos is None:
+        prestador = get_object_or_404(PerfilPrestador, slug=slug, activo=True)
+        datos = {
+            'prestador': prestador,
+            'servicios': list(prestador.servicios.filter(activo=True)),
+            'agendas': list(prestador.agendas.filter(activa=True)),
+            'version': version,
+        }
+        cache.set(clave, datos, settings.CATALOGO_CACHE_TIMEOUT)
+    return datos
+
+
+def pagina_publica(datos, renderizar):
+    """HTML de la página para anónimos; llama a `renderizar()` sólo si no está cacheado"""
+    clave = f"catalogo:pagina:{datos['prestador'].slug}:{datos['version']}"
+    contenido = cache.get(clave)
+    if contenido is None:
+        contenido = renderizar()
+        cache.set(clave, contenido, settings.CATALOGO_CACHE_TIMEOUT)
+    return contenido
+
+
+def invalidar_catalogo(*slugs):
+    for slug in filter(None, slugs):
+        incrementar_version(_clave_version(slug))
+
+
+def invalidar_catalogo_prestador(prestador_id):
+    slug = PerfilPrestador.objects.filter(id=prestador_id).values_list('slug', flat=True).first()
+    invalidar_catalogo(slug)
@@ -0,0 +1,141 @@
+"""
+Comprobantes PDF de reservas.
+
+Cada PDF se cachea con una clave derivada de los datos que aparecen impresos
+(`datos_comprobante`), así que cuando cambia alguno de ellos (un pago, el
+nombre del cliente) la clave cambia sola y la versión anterior vence por
+tiempo. El mismo hash es el ETag de la descarga: las descargas repetidas
+responden 304 o salen de la caché, sin volver a dibujar con reportlab.
+
+Los comprobantes en lote (`escribir_pdf`, `partes_zip`) leen las reservas
+como filas (`values`) en una sola consulta con cliente y servicio, por
+partes de TAMANO_LOTE, y dibujan un comprobante a la vez. No se crean
+instancias de Reserva: sus receptores de post_init (turnos.signals) leen
+campos que harían una consulta más por reserva.
+"""
+import hashlib
+import json
+import zipfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+# Subir al cambiar el diseño del comprobante, para no servir PDFs viejos
+VERSION_DISENO = 1
+
+FORMATOS_LOTE = ('pdf', 'zip')
+
+TAMANO_LOTE = 500
+
+
+def datos_comprobante(reserva):
+    """Datos impresos en el comprobante (requiere cliente y servicio)"""
+    return {
+        'codigo': str(reserva.codigo),
+        'cliente': f"{reserva.cliente.nombre} {reserva.cliente.apellido}",
+        'servicio': reserva.servicio.nombre,
+        'fecha': str(reserva.fecha),
+        'hora': str(reserva.hora_inicio),
+        'monto': str(reserva.monto_pagado),
+    }
+
+
+def huella(datos):
+    contenido = json.dumps([VERSION_DISENO, datos], sort_keys=True)
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+
+def dibujar_comprobante(p, datos):
+    """Una página del comprobante en el canvas `p`"""
+    p.drawString(100, 750, "Comprobante de Reserva")
+    p.drawString(100, 730, f"Código: {datos['codigo']}")
+    p.drawString(100, 710, f"Cliente: {datos['cliente']}")
+    p.drawString(100, 690, f"Servicio: {datos['servicio']}")
+    p.drawString(100, 670, f"Fecha: {datos['fecha']}")
+    p.drawString(100, 650, f"Hora: {datos['hora']}")
+    p.drawString(100, 630, f"Monto: ${datos['monto']}")
+    p.showPage()
+
+
+def renderizar(datos):
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+    dibujar_comprobante(p, datos)
+    p.save()
+    return buffer.getvalue()
+
+
+def comprobante_pdf(datos):
+    """
+    (contenido, generado) del PDF para `datos`, desde la caché o dibujándolo.
+    `generado` es la fecha en que se dibujó, para Last-Modified.
+    """
+    clave = f'comprobante:{huella(datos)}'
+    guardado = cache.get(clave)
+    if guardado is None:
+        guardado = (renderizar(datos), timezone.now())
+        cache.set(clave, guardado, settings.COMPROBANTES_CACHE_TIMEOUT)
+    return guardado
+
+
+CAMPOS_LOTE = (
+    'codigo', 'fecha', 'hora_inicio', 'monto_pagado',
+    'cliente__nombre', 'cliente__apellido', 'servicio__nombre',
+)
+
+
+def datos_lote(reservas):
+    """Datos de comprobante de cada reserva, sin cargarlas todas juntas"""
+    filas = reservas.order_by('fecha', 'hora_inicio', 'id').values_list(*CAMPOS_LOTE)
+    for codigo, fecha, hora_inicio, monto_pagado, nombre, apellido, servicio in filas.iterator(
+        chunk_size=TAMANO_LOTE
+    ):
+        yield {
+            'codigo': str(codigo),
+            'cliente': f"{nombre} {apellido}",
+            'servicio': servicio,
+            'fecha': str(fecha),
+            'hora': str(hora_inicio),
+            'monto': str(monto_pagado),
+        }
+
+
+def escribir_pdf(reservas, archivo):
+    """Un PDF con una página por reserva, en el mismo canvas"""
+    p = canvas.Canvas(archivo, pagesize=letter, pageCompression=1)
+    for datos in datos_lote(reservas):
+        dibujar_comprobante(p, datos)
+    p.save()
+
+
+class _Salida:
+    """Destino no posicionable para ZipFile: junta lo escrito hasta vaciarlo"""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+def partes_zip(reservas):
+    """ZIP con un PDF por reserva, generado a medida que se envía"""
+    salida = _Salida()
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as archivo:
+        for datos in datos_lote(reservas):
+            archivo.writestr(f"comprobante_{datos['codigo']}.pdf", renderizar(datos))
+            yield salida.vaciar()
+    yield salida.vaciar()
@@ -0,0 +1,8 @@
+from .notificaciones import no_leidas
+
+
+def notificaciones(request):
+    """Cantidad de notificaciones no leídas para el badge de base.html"""
+    if not request.user.is_authenticated:
+        return {}
+    return {'notificaciones_no_leidas': no_leidas(request.user.id)}
@@ -0,0 +1,44 @@
+from functools import wraps
+
+from django.contrib import messages
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import redirect
+
+
+def _denegar_pagina(request):
+    messages.error(request, 'No tienes permisos para acceder.')
+    return redirect('home')
+
+
+def _denegar_api(request):
+    return JsonResponse({'error': 'No autorizado'}, status=403)
+
+
+USUARIO_BACKEND = 'turnos.backends.UsuarioBackend'
+
+
+def _verificar_prestador(denegar):
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if request.user.rol != 'prestador':
+                return denegar(request)
+            # Ya cargado con el usuario (turnos.backends.UsuarioBackend)
+            request.prestador = request.user.perfil_prestador
+            # Sesiones iniciadas con ModelBackend: desde el próximo pedido el
+            # usuario se carga con UsuarioBackend, junto con el perfil
+            if request.session.get(BACKEND_SESSION_KEY, USUARIO_BACKEND) != USUARIO_BACKEND:
+                request.session[BACKEND_SESSION_KEY] = USUARIO_BACKEND
+            return vista(request, *args, **kwargs)
+        return login_required(envoltura)
+    return decorador
+
+
+# Vistas del prestador: requieren sesión y rol prestador, y dejan el perfil
+# en request.prestador
+prestador_requerido = _verificar_prestador(_denegar_pagina)
+
+# Igual, pero para endpoints JSON: responden 403 en lugar de redirigir
+prestador_requerido_api = _verificar_prestador(_denegar_api)
@@ -0,0 +1,265 @@
+"""
+Motor de disponibilidad de agendas.
+
+Un día de agenda se representa como minutos desde la medianoche: la jornada
+es el intervalo [inicio, fin) y las reservas activas son una lista ordenada
+de intervalos ocupados ya fusionados. Los horarios libres para una duración
+se obtienen en un único recorrido lineal sobre esa lista.
+
+Los resultados se cachean en Redis por (agenda, fecha, duración). Cada clave
+incluye la versión de la agenda y la del día, que se incrementan desde
+turnos.signals cuando cambia una reserva de ese día o la configuración de la
+agenda; así la invalidación es exacta sin tener que borrar claves por patrón
+(ver turnos.versiones).
+Las agendas y servicios cacheados usan el mismo esquema de versiones, para
+que una lectura concurrente con la invalidación no vuelva a guardar la fila
+anterior.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+
+from .models import Agenda, Servicio, Reserva
+from .versiones import incrementar_version, obtener_version, obtener_versiones
+
+# Índice de weekday() -> campo booleano de Agenda
+DIAS_SEMANA = ('lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo')
+
+# Separación entre horarios ofrecidos (minutos)
+PASO_MINUTOS = 30
+
+
+def a_minutos(hora):
+    """Convierte un time a minutos desde la medianoche"""
+    return hora.hour * 60 + hora.minute
+
+
+def formatear(minutos):
+    """Formatea minutos desde la medianoche como HH:MM"""
+    return f'{minutos // 60:02d}:{minutos % 60:02d}'
+
+
+def agenda_atiende(agenda, fecha):
+    """Indica si la agenda trabaja el día de la semana de la fecha"""
+    return getattr(agenda, DIAS_SEMANA[fecha.weekday()])
+
+
+def intervalos_ocupados(reservas):
+    """Ordena y fusiona los intervalos (hora_inicio, hora_fin) de las reservas"""
+    intervalos = sorted((a_minutos(inicio), a_minutos(fin)) for inicio, fin in reservas)
+
+    fusionados = []
+    for inicio, fin in intervalos:
+        if fusionados and inicio <= fusionados[-1][1]:
+            if fin > fusionados[-1][1]:
+                fusionados[-1][1] = fin
+        else:
+            fusionados.append([inicio, fin])
+    return fusionados
+
+
+def calcular_slots(agenda, fecha, duracion_minutos, reservas, paso=PASO_MINUTOS):
+    """
+    Devuelve los minutos de inicio libres para un servicio de la duración dada.
+
+    `reservas` es un iterable de tuplas (hora_inicio, hora_fin) del día.
+    """
+    if not agenda_atiende(agenda, fecha):
+        return []
+
+    inicio_jornada = a_minutos(agenda.hora_inicio)
+    fin_jornada = a_minutos(agenda.hora_fin)
+    ocupados = intervalos_ocupados(reservas)
+
+    slots = []
+    i = 0
+    for inicio in range(inicio_jornada, fin_jornada - duracion_minutos + 1, paso):
+        # Descartar intervalos que terminan antes del slot: los inicios crecen,
+        # así que el puntero nunca retrocede.
+        while i < len(ocupados) and ocupados[i][1] <= inicio:
+            i += 1
+        if i == len(ocupados) or ocupados[i][0] >= inicio + duracion_minutos:
+            slots.append(inicio)
+    return slots
+
+
+# ==================== CACHE ====================
+
+def _clave_version_agenda(agenda_id):
+    return f'disp:v:agenda:{agenda_id}'
+
+
+def _clave_version_dia(agenda_id, fecha):
+    return f'disp:v:dia:{agenda_id}:{fecha.isoformat()}'
+
+
+def _clave_version_servicio(servicio_id):
+    return f'disp:v:servicio:{servicio_id}'
+
+
+def _clave_version_prestador(prestador_id):
+    return f'disp:v:prestador:{prestador_id}'
+
+
+def _clave_slots(agenda_id, version_agenda, fecha, version_dia, duracion_minutos):
+    return f'disp:slots:{agenda_id}:{version_agenda}:{fecha.isoformat()}:{version_dia}:{duracion_minutos}'
+
+
+def version_dia(agenda_id, fecha):
+    """
+    Versión de la disponibilidad de una agenda en una fecha: cambia con cada
+    reserva de ese día y con cada cambio de la agenda. Sirve como ETag.
+    """
+    clave_agenda = _clave_version_agenda(agenda_id)
+    clave_dia = _clave_version_dia(agenda_id, fecha)
+    versiones = obtener_versiones([clave_agenda, clave_dia])
+    return f'{versiones[clave_agenda]}-{versiones[clave_dia]}'
+
+
+def invalidar_dia(agenda_id, fecha):
+    """Invalida la disponibilidad cacheada de una agenda en una fecha"""
+    incrementar_version(_clave_version_dia(agenda_id, fecha))
+
+
+def invalidar_agenda(agenda_id, prestador_id):
+    """Invalida toda la disponibilidad cacheada de una agenda"""
+    incrementar_version(_clave_version_agenda(agenda_id))
+    incrementar_version(_clave_version_prestador(prestador_id))
+
+
+def invalidar_agendas_prestador(prestador_id):
+    """Descarta la lista cacheada de agendas activas del prestador"""
+    incrementar_version(_clave_version_prestador(prestador_id))
+
+
+def invalidar_servicio(servicio_id):
+    """Descarta el servicio cacheado (cambió su duración o se eliminó)"""
+    incrementar_version(_clave_version_servicio(servicio_id))
+
+
+def _cacheado(clave_version, clave, cargar):
+    """
+    Valor de `cargar()` cacheado bajo la versión actual de `clave_version`.
+    Una lectura que empezó antes de una invalidación guarda el valor viejo
+    bajo la versión anterior, que ya nadie consulta.
+    """
+    version = obtener_version(clave_version)
+    clave = f'{clave}:{version}'
+    valor = cache.get(clave)
+    if valor is None:
+        valor = cargar()
+        cache.set(clave, valor, settings.DISPONIBILIDAD_CACHE_TIMEOUT)
+    return valor
+
+
+def obtener_agenda(agenda_id):
+    """Agenda por id (entero), cacheada hasta que se modifique"""
+    return _cacheado(
+        _clave_version_agenda(agenda_id), f'disp:agenda:{agenda_id}',
+        lambda: get_object_or_404(Agenda, id=agenda_id)
+    )
+
+
+def agendas_activas(prestador_id):
+    """Agendas activas de un prestador activo, cacheadas hasta que se modifique alguna"""
+    return _cacheado(
+        _clave_version_prestador(prestador_id), f'disp:agendas:{prestador_id}',
+        lambda: list(Agenda.objects.filter(
+            prestador_id=prestador_id,
+            prestador__activo=True,
+            activa=True
+        ).order_by('id'))
+    )
+
+
+def obtener_servicio(servicio_id):
+    """Servicio por id (entero), cacheado hasta que se modifique"""
+    return _cacheado(
+        _clave_version_servicio(servicio_id), f'disp:servicio:{servicio_id}',
+        lambda: get_object_or_404(Servicio, id=servicio_id)
+    )
+
+
+# ==================== CONSULTAS ====================
+
+def _slots_cacheados(pares, duracion_minutos):
+    """
+    Minutos libres para cada par (agenda, fecha). Lee de la cache y calcula
+    los pares que faltan con una única consulta de reservas.
+    Devuelve {(agenda_id, fecha): [minutos]}.
+    """
+    pares = [(agenda, fecha) for agenda, fecha in pares if agenda_atiende(agenda, fecha)]
+    if not pares:
+        return {}
+
+    claves_version = set()
+    for agenda, fecha in pares:
+        claves_version.add(_clave_version_agenda(agenda.id))
+        claves_version.add(_clave_version_dia(agenda.id, fecha))
+    versiones = obtener_versiones(list(claves_version))
+
+    claves = {
+        (agenda, fecha): _clave_slots(
+            agenda.id, versiones[_clave_version_agenda(agenda.id)],
+            fecha, versiones[_clave_version_dia(agenda.id, fecha)], duracion_minutos
+        )
+        for agenda, fecha in pares
+    }
+    cacheados = cache.get_many(claves.values())
+    resultado = {
+        (agenda.id, fecha): cacheados[clave]
+        for (agenda, fecha), clave in claves.items() if clave in cacheados
+    }
+
+    faltantes = [(agenda, fecha) for agenda, fecha in pares if (agenda.id, fecha) not in resultado]
+    if faltantes:
+        reservas_por_dia = defaultdict(list)
+        reservas = Reserva.objects.filter(
+            agenda__in={agenda.id for agenda, _ in faltantes},
+            fecha__in={fecha for _, fecha in faltantes},
+            estado__in=Reserva.ESTADOS_ACTIVOS
+        ).values_list('agenda_id', 'fecha', 'hora_inicio', 'hora_fin')
+        for agenda_id, fecha, inicio, fin in reservas:
+            reservas_por_dia[(agenda_id, fecha)].append((inicio, fin))
+
+        nuevos = {}
+        for agenda, fecha in faltantes:
+            slots = calcular_slots(agenda, fecha, duracion_minutos, reservas_por_dia[(agenda.id, fecha)])
+            resultado[(agenda.id, fecha)] = slots
+            nuevos[claves[(agenda, fecha)]] = slots
+        cache.set_many(nuevos, settings.DISPONIBILIDAD_CACHE_TIMEOUT)
+
+    return resultado
+
+
+def slots_disponibles(agenda, fecha, duracion_minutos):
+    """Horarios libres (HH:MM) de una agenda para una fecha y duración"""
+    slots = _slots_cacheados([(agenda, fecha)], duracion_minutos).get((agenda.id, fecha), [])
+    return [formatear(m) for m in slots]
+
+
+def disponibilidad_rango(agenda, desde, dias, duracion_minutos):
+    """
+    Horarios libres por fecha (minutos desde la medianoche) para `dias` días
+    a partir de `desde`. Los días sin horarios libres no se incluyen.
+    """
+    fechas = [desde + timedelta(days=n) for n in range(dias)]
+    slots = _slots_cacheados([(agenda, fecha) for fecha in fechas], duracion_minutos)
+    return {fecha: slots[(agenda.id, fecha)] for fecha in fechas if slots.get((agenda.id, fecha))}
+
+
+def disponibilidad_agendas(agendas, fecha, duracion_minutos):
+    """
+    Unión de los horarios libres de varias agendas en una fecha.
+    Devuelve [(minutos, [agenda_id, ...])] ordenado por horario.
+    """
+    slots = _slots_cacheados([(agenda, fecha) for agenda in agendas], duracion_minutos)
+
+    agendas_por_horario = defaultdict(list)
+    for agenda in agendas:
+        for minutos in slots.get((agenda.id, fecha), ()):
+            agendas_por_horario[minutos].append(agenda.id)
+    return sorted(agendas_por_horario.items())
@@ -0,0 +1,59 @@
+"""
+Estadísticas del panel del prestador.
+
+Los contadores se leen del resumen diario (turnos.resumenes) en una sola
+consulta con agregación condicional sobre rangos de fechas, y se cachean por
+prestador y día. turnos.signals borra la entrada cuando cambia alguna
+reserva del prestador.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import ResumenDiario
+from .resumenes import ESTADOS_INGRESOS
+
+
+def _clave(prestador_id, hoy):
+    return f'estadisticas:{prestador_id}:{hoy.isoformat()}'
+
+
+def rango_mes(fecha):
+    """Primer día del mes de `fecha` y primer día del mes siguiente"""
+    inicio = fecha.replace(day=1)
+    siguiente = (inicio + timedelta(days=32)).replace(day=1)
+    return inicio, siguiente
+
+
+def calcular_estadisticas(prestador_id, hoy):
+    inicio_mes, inicio_siguiente = rango_mes(hoy)
+    estadisticas = ResumenDiario.objects.filter(prestador_id=prestador_id).filter(
+        Q(estado='pendiente')
+        | Q(fecha=hoy, estado='confirmada')
+        | Q(fecha__gte=inicio_mes, fecha__lt=inicio_siguiente, estado__in=ESTADOS_INGRESOS)
+    ).aggregate(
+        reservas_hoy=Sum('cantidad', filter=Q(fecha=hoy, estado='confirmada')),
+        reservas_pendientes=Sum('cantidad', filter=Q(estado='pendiente')),
+        ingresos_mes=Sum('monto_pagado', filter=Q(
+            fecha__gte=inicio_mes, fecha__lt=inicio_siguiente, estado__in=ESTADOS_INGRESOS
+        )),
+    )
+    return {campo: valor or 0 for campo, valor in estadisticas.items()}
+
+
+def estadisticas_prestador(prestador_id, hoy=None):
+    """Contadores del panel: reservas de hoy, pendientes e ingresos del mes"""
+    hoy = hoy or timezone.now().date()
+    clave = _clave(prestador_id, hoy)
+    estadisticas = cache.get(clave)
+    if estadisticas is None:
+        estadisticas = calcular_estadisticas(prestador_id, hoy)
+        cache.set(clave, estadisticas, settings.ESTADISTICAS_CACHE_TIMEOUT)
+    return estadisticas
+
+
+def invalidar_estadisticas(prestador_id):
+    cache.delete(_clave(prestador_id, timezone.now().date()))
@@ -0,0 +1,169 @@
+"""
+Eventos de reservas en tiempo real para el panel del prestador.
+
+Cuando se crea, cancela o paga una reserva, turnos.signals publica un
+mensaje JSON en el canal Redis del prestador (`eventos:prestador:<id>`).
+La vista `eventos_reservas` se suscribe a ese canal y reenvía cada mensaje
+al navegador como Server-Sent Events; así el panel se actualiza sin recargar
+la página.
+
+Sólo esa vista corre bajo ASGI (sistema_turnos.asgi, en un proceso aparte):
+el resto del sitio sigue en WSGI, porque Django 4.2 bajo ASGI lee entero en
+memoria el contenido de las respuestas en streaming sincrónicas (las
+exportaciones y los comprobantes en lote).
+
+Django 4.2 tampoco avisa cuando el cliente se desconecta. `Desconexion`
+(aplicado en sistema_turnos.asgi) escucha el `http.disconnect` y lo marca en
+un asyncio.Event del scope, con el que `escuchar` termina y libera la
+suscripción. Además cada conexión dura a lo sumo DURACION_MAXIMA segundos;
+después el navegador se reconecta solo (campo `retry`).
+"""
+import asyncio
+import json
+import time
+
+import redis
+import redis.asyncio as redis_async
+from django.conf import settings
+
+# Segundos entre comentarios de keep-alive, para que proxies y balanceadores
+# no cierren la conexión por inactividad
+INTERVALO_KEEPALIVE = 15
+
+# Segundos que dura cada conexión antes de cerrarla para que se reconecte
+DURACION_MAXIMA = 5 * 60
+
+# Milisegundos que espera el navegador antes de reconectarse
+ESPERA_RECONEXION = 1000
+
+_cliente = None
+
+
+def _redis():
+    global _cliente
+    if _cliente is None:
+        _cliente = redis.Redis.from_url(settings.EVENTOS_REDIS_URL)
+    return _cliente
+
+
+def canal_prestador(prestador_id):
+    return f'eventos:prestador:{prestador_id}'
+
+
+def publicar_evento_reserva(reserva, tipo):
+    """Publica `tipo` (creada, cancelada, pagada) para el prestador de la reserva"""
+    evento = {
+        'tipo': tipo,
+        'reserva_id': reserva.id,
+        'codigo': str(reserva.codigo),
+        'cliente': str(reserva.cliente),
+        'servicio': reserva.servicio.nombre,
+        'fecha': reserva.fecha.isoformat(),
+        'hora_inicio': reserva.hora_inicio.strftime('%H:%M'),
+        'estado': reserva.estado,
+        'estado_pago': reserva.estado_pago,
+    }
+    try:
+        _redis().publish(canal_prestador(reserva.prestador_id), json.dumps(evento))
+    except redis.RedisError as e:
+        print(f"Error publicando evento de reserva {reserva.id}: {e}")
+
+
+def tipo_evento(anterior, actual, creada):
+    """
+    Evento que corresponde a un cambio de (estado, estado_pago), o None si
+    el cambio no interesa al panel.
+    """
+    if creada:
+        return 'creada'
+    if actual[0] == 'cancelada' and anterior[0] != 'cancelada':
+        return 'cancelada'
+    if actual[1] in ('seña', 'total') and anterior[1] != actual[1]:
+        return 'pagada'
+    return None
+
+
+# Clave del scope ASGI con el asyncio.Event que marca la desconexión
+CLAVE_DESCONEXION = 'turnos.desconectado'
+
+
+class Desconexion:
+    """
+    Middleware ASGI: cuando el cliente se desconecta marca el evento
+    scope[CLAVE_DESCONEXION]. Empieza a escuchar después de que Django leyó
+    el cuerpo de la petición, para no quitarle mensajes.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        desconectado = asyncio.Event()
+        cuerpo_leido = asyncio.Event()
+
+        async def recibir():
+            mensaje = await receive()
+            if mensaje['type'] == 'http.disconnect':
+                desconectado.set()
+            if mensaje['type'] == 'http.disconnect' or not mensaje.get('more_body'):
+                cuerpo_leido.set()
+            return mensaje
+
+        async def vigilar():
+            await cuerpo_leido.wait()
+            while not desconectado.is_set():
+                if (await receive())['type'] == 'http.disconnect':
+                    desconectado.set()
+
+        vigilante = asyncio.ensure_future(vigilar())
+        try:
+            await self.app({**scope, CLAVE_DESCONEXION: desconectado}, recibir, send)
+        finally:
+            vigilante.cancel()
+
+
+async def _proximo_mensaje(suscripcion, desconectado, timeout):
+    """Próximo mensaje del canal, o None si pasó `timeout` o el cliente se desconectó"""
+    lectura = asyncio.ensure_future(
+        suscripcion.get_message(ignore_subscribe_messages=True, timeout=timeout)
+    )
+    corte = asyncio.ensure_future(desconectado.wait())
+    await asyncio.wait({lectura, corte}, return_when=asyncio.FIRST_COMPLETED)
+    corte.cancel()
+    if not lectura.done():
+        lectura.cancel()
+        return None
+    return lectura.result()
+
+
+async def escuchar(prestador_id, desconectado=None):
+    """
+    Mensajes SSE con los eventos del prestador, hasta que el cliente se
+    desconecta o pasan DURACION_MAXIMA segundos
+    """
+    desconectado = desconectado or asyncio.Event()
+    fin = time.monotonic() + DURACION_MAXIMA
+    cliente = redis_async.Redis.from_url(settings.EVENTOS_REDIS_URL)
+    suscripcion = cliente.pubsub()
+    await suscripcion.subscribe(canal_prestador(prestador_id))
+    try:
+        yield f'retry: {ESPERA_RECONEXION}\n\n'
+        while not desconectado.is_set():
+            restante = fin - time.monotonic()
+            if restante <= 0:
+                break
+            mensaje = await _proximo_mensaje(suscripcion, desconectado, min(INTERVALO_KEEPALIVE, restante))
+            if desconectado.is_set():
+                break
+            if mensaje is None:
+                yield ': keepalive\n\n'
+                continue
+            datos = mensaje['data'].decode()
+            yield f"event: reserva\ndata: {datos}\n\n"
+    finally:
+        await suscripcion.unsubscribe()
+        await suscripcion.aclose()
+        await cliente.aclose()
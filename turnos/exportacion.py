@@ -0,0 +1,159 @@
+"""
+Exportación de reservas y clientes a CSV y XLSX.
+
+Las filas se leen con `values_list().iterator()`, que en PostgreSQL usa un
+cursor del lado del servidor: nunca hay más de TAMANO_LOTE filas en memoria
+ni se crean instancias de modelos.
+
+- CSV: se genera a medida que se envía (StreamingHttpResponse).
+- XLSX: openpyxl en modo write_only vuelca las filas a un archivo temporal
+  y ese archivo se envía por partes (FileResponse).
+
+En ambos formatos el texto que empieza con un carácter de fórmula (=, +, -,
+@, tabulación o retorno de carro) se exporta con un apóstrofo adelante, para
+que la planilla no lo evalúe.
+"""
+import csv
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .models import Reserva
+
+TAMANO_LOTE = 2000
+
+FORMATOS = ('csv', 'xlsx')
+
+COLUMNAS_RESERVAS = (
+    ('Código', 'codigo'),
+    ('Fecha', 'fecha'),
+    ('Hora inicio', 'hora_inicio'),
+    ('Hora fin', 'hora_fin'),
+    ('Agenda', 'agenda__nombre'),
+    ('Servicio', 'servicio__nombre'),
+    ('Nombre', 'cliente__nombre'),
+    ('Apellido', 'cliente__apellido'),
+    ('DNI', 'cliente__dni'),
+    ('Email', 'cliente__email'),
+    ('Estado', 'estado'),
+    ('Estado del pago', 'estado_pago'),
+    ('Monto total', 'monto_total'),
+    ('Monto pagado', 'monto_pagado'),
+)
+
+COLUMNAS_CLIENTES = (
+    ('Nombre', 'nombre'),
+    ('Apellido', 'apellido'),
+    ('DNI', 'dni'),
+    ('Email', 'email'),
+    ('Teléfono', 'telefono'),
+    ('Fecha de nacimiento', 'fecha_nacimiento'),
+    ('Bloqueado', 'bloqueado'),
+    ('Fecha de registro', 'fecha_registro'),
+)
+
+# Filtros del listado de reservas (parámetros GET)
+FILTROS_RESERVAS = ('fecha_desde', 'fecha_hasta', 'estado')
+
+ESTADOS = dict(Reserva.ESTADOS)
+ESTADOS_PAGO = dict(Reserva.ESTADO_PAGO)
+
+
+# Primeros caracteres con los que Excel/LibreOffice interpretan una celda
+# como fórmula. Los datos vienen del formulario público de reservas.
+INICIOS_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def celda_segura(valor):
+    """Texto que empieza como una fórmula, con un apóstrofo adelante"""
+    if isinstance(valor, str) and valor.startswith(INICIOS_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def fila_segura(fila):
+    return [celda_segura(valor) for valor in fila]
+
+
+class _Eco:
+    """Objeto tipo archivo que devuelve lo escrito, para csv.writer"""
+
+    def write(self, valor):
+        return valor
+
+
+def filtrar_reservas(prestador_id, filtros):
+    """Reservas del prestador con los filtros del listado"""
+    reservas = Reserva.objects.filter(prestador_id=prestador_id)
+    if filtros.get('fecha_desde'):
+        reservas = reservas.filter(fecha__gte=filtros['fecha_desde'])
+    if filtros.get('fecha_hasta'):
+        reservas = reservas.filter(fecha__lte=filtros['fecha_hasta'])
+    if filtros.get('estado'):
+        reservas = reservas.filter(estado=filtros['estado'])
+    return reservas
+
+
+def filas_reservas(reservas):
+    campos = [campo for _, campo in COLUMNAS_RESERVAS]
+    estado = campos.index('estado')
+    estado_pago = campos.index('estado_pago')
+    codigo = campos.index('codigo')
+    for fila in reservas.values_list(*campos).iterator(chunk_size=TAMANO_LOTE):
+        fila = list(fila)
+        fila[codigo] = str(fila[codigo])
+        fila[estado] = ESTADOS.get(fila[estado], fila[estado])
+        fila[estado_pago] = ESTADOS_PAGO.get(fila[estado_pago], fila[estado_pago])
+        yield fila
+
+
+def filas_clientes(clientes):
+    campos = [campo for _, campo in COLUMNAS_CLIENTES]
+    bloqueado = campos.index('bloqueado')
+    registro = campos.index('fecha_registro')
+    for fila in clientes.values_list(*campos).iterator(chunk_size=TAMANO_LOTE):
+        fila = list(fila)
+        fila[bloqueado] = 'Sí' if fila[bloqueado] else 'No'
+        # Excel no admite fechas con zona horaria: se exporta la hora local
+        fila[registro] = timezone.localtime(fila[registro]).replace(tzinfo=None) if fila[registro] else None
+        yield fila
+
+
+def respuesta_csv(nombre, columnas, filas):
+    escritor = csv.writer(_Eco())
+
+    def contenido():
+        # BOM para que Excel reconozca UTF-8
+        yield '\ufeff' + escritor.writerow([titulo for titulo, _ in columnas])
+        for fila in filas:
+            yield escritor.writerow(fila_segura(fila))
+
+    respuesta = StreamingHttpResponse(contenido(), content_type='text/csv; charset=utf-8')
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre}.csv"'
+    return respuesta
+
+
+def respuesta_xlsx(nombre, columnas, filas):
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(nombre[:31])
+    hoja.append([titulo for titulo, _ in columnas])
+    for fila in filas:
+        hoja.append(fila_segura(fila))
+
+    archivo = tempfile.TemporaryFile()
+    libro.save(archivo)
+    archivo.seek(0)
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=f'{nombre}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def exportar(formato, nombre, columnas, filas):
+    if formato == 'xlsx':
+        return respuesta_xlsx(nombre, columnas, filas)
+    return respuesta_csv(nombre, columnas, filas)
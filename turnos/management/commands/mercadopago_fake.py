@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from turnos.mercadopago_fake import ServidorMercadoPagoFake
+
+
+class Command(BaseCommand):
+    help = 'Levanta un servidor falso de MercadoPago para desarrollo local'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--puerto', type=int, default=8090)
+        parser.add_argument('--demora', type=float, default=0, help='Segundos de demora por solicitud')
+
+    def handle(self, *args, **options):
+        servidor = ServidorMercadoPagoFake(options['host'], options['puerto'])
+        servidor.demora = options['demora']
+        self.stdout.write(f'MercadoPago falso en {servidor.url} (usar MERCADOPAGO_API_URL={servidor.url})')
+        try:
+            servidor.servir()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from turnos import particiones
+
+
+class Command(BaseCommand):
+    help = 'Convierte la tabla de notificaciones en una tabla particionada por mes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--meses-adelantados', type=int, default=settings.NOTIFICACIONES_MESES_ADELANTADOS,
+            help='Meses futuros para los que se crean particiones'
+        )
+
+    def handle(self, *args, **options):
+        if particiones.esta_particionada():
+            raise CommandError('La tabla de notificaciones ya está particionada')
+
+        particiones.particionar(options['meses_adelantados'])
+        meses = particiones.particiones()
+        self.stdout.write(self.style.SUCCESS(
+            f'Notificaciones particionadas: {len(meses)} particiones mensuales '
+            f'({meses[0]:%Y-%m} a {meses[-1]:%Y-%m})'
+        ))
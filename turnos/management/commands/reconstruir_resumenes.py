@@ -0,0 +1,17 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from turnos.resumenes import reconstruir
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el resumen diario de reservas a partir de la tabla de reservas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=date.fromisoformat, help='Primer día a recalcular (AAAA-MM-DD)')
+        parser.add_argument('--hasta', type=date.fromisoformat, help='Último día a recalcular (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        filas = reconstruir(options['desde'], options['hasta'])
+        self.stdout.write(self.style.SUCCESS(f'Resumen reconstruido: {filas} filas'))
@@ -0,0 +1,106 @@
+"""
+Servidor HTTP falso de MercadoPago para desarrollo local y tests.
+
+Implementa sólo los endpoints que usa el proyecto (crear preferencia y
+devolver un pago). Se usa apuntando MERCADOPAGO_API_URL a `servidor.url`:
+
+    with ServidorMercadoPagoFake() as servidor:
+        with override_settings(MERCADOPAGO_API_URL=servidor.url):
+            ...
+
+`demora` (segundos) y `status_error` permiten simular un MercadoPago lento
+o caído.
+"""
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RUTA_DEVOLUCION = re.compile(r'^/v1/payments/(?P<payment_id>[^/]+)/refunds$')
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        servidor = self.server.fake
+        longitud = int(self.headers.get('Content-Length') or 0)
+        cuerpo = json.loads(self.rfile.read(longitud) or b'null')
+        servidor.solicitudes.append((self.path, cuerpo))
+
+        if servidor.demora:
+            time.sleep(servidor.demora)
+
+        if servidor.status_error:
+            return self._responder(servidor.status_error, {'message': 'error simulado'})
+
+        if self.path == '/checkout/preferences':
+            preference_id = f'pref-{uuid.uuid4()}'
+            return self._responder(201, {
+                'id': preference_id,
+                'init_point': f'{servidor.url}/checkout?pref_id={preference_id}',
+                'items': cuerpo.get('items', []),
+                'external_reference': cuerpo.get('external_reference'),
+            })
+
+        coincidencia = RUTA_DEVOLUCION.match(self.path)
+        if coincidencia:
+            return self._responder(201, {
+                'id': int(time.time() * 1000),
+                'payment_id': coincidencia['payment_id'],
+                'status': 'approved',
+            })
+
+        return self._responder(404, {'message': 'not found'})
+
+    def _responder(self, status, datos):
+        contenido = json.dumps(datos).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(contenido)))
+            self.end_headers()
+            self.wfile.write(contenido)
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente abandonó por timeout
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ServidorMercadoPagoFake:
+    """Servidor falso en un hilo propio"""
+
+    def __init__(self, host='127.0.0.1', puerto=0):
+        self.demora = 0
+        self.status_error = None
+        self.solicitudes = []
+        self._httpd = ThreadingHTTPServer((host, puerto), _Handler)
+        self._httpd.fake = self
+        self._hilo = None
+
+    @property
+    def url(self):
+        host, puerto = self._httpd.server_address[:2]
+        return f'http://{host}:{puerto}'
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def servir(self):
+        """Atender solicitudes en el hilo actual hasta Ctrl+C"""
+        self._httpd.serve_forever()
+
+    def detener(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.detener()
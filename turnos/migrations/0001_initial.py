@@ -0,0 +1,209 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:24
+
+from django.conf import settings
+import django.contrib.auth.models
+import django.contrib.auth.validators
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Usuario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
+                ('username', models.CharField(error_messages={'unique': 'A user with that username already exists.'}, help_text='Required. 150 characters or fewer. Letters, digits and @/./+/-/_ only.', max_length=150, unique=True, validators=[django.contrib.auth.validators.UnicodeUsernameValidator()], verbose_name='username')),
+                ('first_name', models.CharField(blank=True, max_length=150, verbose_name='first name')),
+                ('last_name', models.CharField(blank=True, max_length=150, verbose_name='last name')),
+                ('email', models.EmailField(blank=True, max_length=254, verbose_name='email address')),
+                ('is_staff', models.BooleanField(default=False, help_text='Designates whether the user can log into this admin site.', verbose_name='staff status')),
+                ('is_active', models.BooleanField(default=True, help_text='Designates whether this user should be treated as active. Unselect this instead of deleting accounts.', verbose_name='active')),
+                ('date_joined', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date joined')),
+                ('rol', models.CharField(choices=[('admin', 'Administrador'), ('prestador', 'Prestador de Servicio'), ('cliente', 'Cliente')], default='cliente', max_length=20)),
+                ('telefono', models.CharField(blank=True, max_length=20, null=True)),
+                ('fecha_nacimiento', models.DateField(blank=True, null=True)),
+                ('dni', models.CharField(blank=True, max_length=20, null=True, unique=True)),
+                ('google_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('bloqueado', models.BooleanField(default=False)),
+                ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.group', verbose_name='groups')),
+                ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.permission', verbose_name='user permissions')),
+            ],
+            options={
+                'db_table': 'usuarios',
+            },
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Agenda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('descripcion', models.TextField(blank=True)),
+                ('activa', models.BooleanField(default=True)),
+                ('hora_inicio', models.TimeField(default='09:00')),
+                ('hora_fin', models.TimeField(default='18:00')),
+                ('lunes', models.BooleanField(default=True)),
+                ('martes', models.BooleanField(default=True)),
+                ('miercoles', models.BooleanField(default=True)),
+                ('jueves', models.BooleanField(default=True)),
+                ('viernes', models.BooleanField(default=True)),
+                ('sabado', models.BooleanField(default=False)),
+                ('domingo', models.BooleanField(default=False)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'agendas',
+            },
+        ),
+        migrations.CreateModel(
+            name='Cliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('apellido', models.CharField(max_length=100)),
+                ('email', models.EmailField(max_length=254)),
+                ('dni', models.CharField(max_length=20)),
+                ('telefono', models.CharField(blank=True, max_length=20)),
+                ('fecha_nacimiento', models.DateField(blank=True, null=True)),
+                ('notas', models.TextField(blank=True)),
+                ('bloqueado', models.BooleanField(default=False)),
+                ('fecha_registro', models.DateTimeField(auto_now_add=True)),
+                ('ultima_visita', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'clientes',
+            },
+        ),
+        migrations.CreateModel(
+            name='ConfiguracionGlobal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=100, unique=True)),
+                ('valor', models.TextField()),
+                ('descripcion', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Configuraciones Globales',
+                'db_table': 'configuracion_global',
+            },
+        ),
+        migrations.CreateModel(
+            name='PerfilPrestador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre_negocio', models.CharField(max_length=200)),
+                ('descripcion', models.TextField(blank=True)),
+                ('direccion', models.CharField(blank=True, max_length=300)),
+                ('logo', models.ImageField(blank=True, null=True, upload_to='logos/')),
+                ('mp_access_token', models.CharField(blank=True, max_length=500)),
+                ('mp_public_key', models.CharField(blank=True, max_length=500)),
+                ('requiere_pago_total', models.BooleanField(default=False)),
+                ('porcentaje_seña', models.DecimalField(decimal_places=2, default=50.0, max_digits=5)),
+                ('horas_cancelacion_con_devolucion', models.IntegerField(default=24)),
+                ('horas_cancelacion_sin_devolucion', models.IntegerField(default=2)),
+                ('slug', models.SlugField(unique=True)),
+                ('activo', models.BooleanField(default=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='perfil_prestador', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Perfiles de Prestadores',
+                'db_table': 'perfiles_prestadores',
+            },
+        ),
+        migrations.CreateModel(
+            name='Servicio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=200)),
+                ('descripcion', models.TextField(blank=True)),
+                ('categoria', models.CharField(choices=[('uñas', 'Uñas'), ('pestañas', 'Pestañas'), ('pelo', 'Peluquería'), ('barberia', 'Barbería'), ('veterinaria', 'Veterinaria'), ('masajes', 'Masajes'), ('estetica', 'Estética'), ('otro', 'Otro')], max_length=50)),
+                ('precio', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)])),
+                ('duracion_minutos', models.IntegerField(validators=[django.core.validators.MinValueValidator(15)])),
+                ('activo', models.BooleanField(default=True)),
+                ('prestador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='servicios', to='turnos.perfilprestador')),
+            ],
+            options={
+                'db_table': 'servicios',
+            },
+        ),
+        migrations.CreateModel(
+            name='Reserva',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('fecha', models.DateField()),
+                ('hora_inicio', models.TimeField()),
+                ('hora_fin', models.TimeField()),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('confirmada', 'Confirmada'), ('cancelada', 'Cancelada'), ('completada', 'Completada'), ('no_asistio', 'No Asistió')], default='pendiente', max_length=20)),
+                ('estado_pago', models.CharField(choices=[('pendiente', 'Pendiente'), ('seña', 'Seña Pagada'), ('total', 'Pagado Total'), ('devuelto', 'Devuelto')], default='pendiente', max_length=20)),
+                ('monto_total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('monto_pagado', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('mp_payment_id', models.CharField(blank=True, max_length=200, null=True)),
+                ('mp_preference_id', models.CharField(blank=True, max_length=200, null=True)),
+                ('notas', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_cancelacion', models.DateTimeField(blank=True, null=True)),
+                ('motivo_cancelacion', models.TextField(blank=True)),
+                ('agenda', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='turnos.agenda')),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='turnos.cliente')),
+                ('servicio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='turnos.servicio')),
+            ],
+            options={
+                'db_table': 'reservas',
+                'ordering': ['fecha', 'hora_inicio'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Notificacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('nueva_reserva', 'Nueva Reserva'), ('cancelacion', 'Cancelación'), ('recordatorio', 'Recordatorio'), ('pago', 'Pago Recibido')], max_length=30)),
+                ('titulo', models.CharField(max_length=200)),
+                ('mensaje', models.TextField()),
+                ('leida', models.BooleanField(default=False)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('reserva', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='turnos.reserva')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notificaciones', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'notificaciones',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='prestador',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clientes', to='turnos.perfilprestador'),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='usuario',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='agenda',
+            name='prestador',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agendas', to='turnos.perfilprestador'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='cliente',
+            unique_together={('prestador', 'dni')},
+        ),
+    ]
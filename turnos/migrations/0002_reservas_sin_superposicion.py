@@ -0,0 +1,92 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:24
+
+import django.contrib.postgres.constraints
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+from django.utils import timezone
+import turnos.models
+
+ESTADOS_ACTIVOS = ['pendiente', 'confirmada']
+
+MOTIVO = 'Cancelada al migrar: se superponía con la reserva {} de la misma agenda'
+MOTIVO_HORARIO = 'Cancelada al migrar: termina antes de empezar (pasaba la medianoche)'
+
+
+def cancelar_superpuestas(apps, schema_editor):
+    """
+    Cancela las reservas activas que impedirían crear la restricción: las que
+    se superponen con otra reserva activa de la misma agenda creada antes (se
+    conserva la primera en reservarse) y las que terminan antes de empezar.
+    Cada una queda con el motivo en motivo_cancelacion y se lista en la salida
+    para avisar a los prestadores.
+    """
+    Reserva = apps.get_model('turnos', 'Reserva')
+    activas = Reserva.objects.filter(estado__in=ESTADOS_ACTIVOS)
+    canceladas = []
+
+    for reserva in activas.filter(hora_fin__lt=models.F('hora_inicio')):
+        canceladas.append((reserva, MOTIVO_HORARIO))
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT DISTINCT r.agenda_id, r.fecha
+            FROM reservas r
+            JOIN reservas o ON o.agenda_id = r.agenda_id AND o.fecha = r.fecha AND o.id < r.id
+            WHERE r.estado IN %s AND o.estado IN %s
+              AND r.hora_inicio < r.hora_fin AND o.hora_inicio < o.hora_fin
+              AND o.hora_inicio < r.hora_fin AND r.hora_inicio < o.hora_fin
+            """,
+            [tuple(ESTADOS_ACTIVOS), tuple(ESTADOS_ACTIVOS)]
+        )
+        dias = cursor.fetchall()
+
+    for agenda_id, fecha in dias:
+        conservadas = []
+        reservas = activas.filter(
+            agenda_id=agenda_id, fecha=fecha, hora_inicio__lt=models.F('hora_fin')
+        ).order_by('id')
+        for reserva in reservas:
+            anterior = next(
+                (c for c in conservadas if c.hora_inicio < reserva.hora_fin and reserva.hora_inicio < c.hora_fin),
+                None
+            )
+            if anterior is None:
+                conservadas.append(reserva)
+            else:
+                canceladas.append((reserva, MOTIVO.format(anterior.codigo)))
+
+    ahora = timezone.now()
+    for reserva, motivo in canceladas:
+        reserva.estado = 'cancelada'
+        reserva.fecha_cancelacion = ahora
+        reserva.motivo_cancelacion = motivo
+        reserva.save(update_fields=['estado', 'fecha_cancelacion', 'motivo_cancelacion'])
+        print(f'  Reserva {reserva.codigo} (agenda {reserva.agenda_id}, {reserva.fecha} '
+              f'{reserva.hora_inicio}-{reserva.hora_fin}): {motivo}')
+    if canceladas:
+        print(f'  {len(canceladas)} reservas canceladas para crear reservas_sin_superposicion')
+
+
+class Migration(migrations.Migration):
+    # Se aplica en una transacción que bloquea la tabla: primero para
+    # escrituras (SHARE ROW EXCLUSIVE, así no entran reservas superpuestas
+    # entre la limpieza y la restricción) y, mientras se construye el índice
+    # GiST de la restricción, también para lecturas (ACCESS EXCLUSIVE). Una
+    # restricción de exclusión no puede usar un índice creado CONCURRENTLY,
+    # así que en tablas grandes conviene aplicarla en una ventana de
+    # mantenimiento.
+
+    dependencies = [
+        ('turnos', '0001_initial'),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.RunSQL('LOCK TABLE reservas IN SHARE ROW EXCLUSIVE MODE', migrations.RunSQL.noop),
+        migrations.RunPython(cancelar_superpuestas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reserva',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('estado__in', ['pendiente', 'confirmada'])), expressions=[('agenda', '='), (turnos.models.RangoHorario(turnos.models.FechaHora('fecha', 'hora_inicio'), turnos.models.FechaHora('fecha', 'hora_fin')), '&&')], name='reservas_sin_superposicion'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('turnos', '0002_reservas_sin_superposicion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reserva',
+            name='mp_init_point',
+            field=models.URLField(blank=True, max_length=500, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:27
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY: no bloquear escrituras sobre una tabla grande.
+    # Los índices del dashboard y del listado se crean en 0005, ya sobre
+    # reservas.prestador, para no construirlos dos veces.
+    atomic = False
+
+    dependencies = [
+        ('turnos', '0003_reserva_mp_init_point'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='reserva',
+            index=models.Index(condition=models.Q(('estado__in', ['pendiente', 'confirmada'])), fields=['agenda', 'fecha'], name='reservas_agenda_fecha_activas'),
+        ),
+        AddIndexConcurrently(
+            model_name='reserva',
+            index=models.Index(condition=models.Q(('estado', 'confirmada')), fields=['fecha'], name='reservas_fecha_confirmadas'),
+        ),
+    ]
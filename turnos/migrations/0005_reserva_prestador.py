@@ -0,0 +1,54 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+TAMANO_LOTE = 50000
+
+
+def copiar_prestador(apps, schema_editor):
+    """Completar reservas.prestador_id desde agendas, por lotes de ids"""
+    Reserva = apps.get_model('turnos', 'Reserva')
+    if not Reserva.objects.exists():
+        return
+
+    maximo = Reserva.objects.aggregate(maximo=models.Max('id'))['maximo']
+    with schema_editor.connection.cursor() as cursor:
+        for desde in range(0, maximo + 1, TAMANO_LOTE):
+            cursor.execute(
+                """
+                UPDATE reservas SET prestador_id = agendas.prestador_id
+                FROM agendas
+                WHERE reservas.agenda_id = agendas.id
+                  AND reservas.id >= %s AND reservas.id < %s
+                  AND reservas.prestador_id IS NULL
+                """,
+                [desde, desde + TAMANO_LOTE],
+            )
+
+
+class Migration(migrations.Migration):
+    # Sin transacción global: cada lote del backfill se confirma por separado
+    # y los índices se crean CONCURRENTLY. La columna queda nullable y sin
+    # índice propio; el NOT NULL se agrega en 0013 y 0014 sin bloquear la tabla.
+    atomic = False
+
+    dependencies = [
+        ('turnos', '0004_indices_reservas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reserva',
+            name='prestador',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='turnos.perfilprestador'),
+        ),
+        migrations.RunPython(copiar_prestador, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='reserva',
+            index=models.Index(fields=['prestador', 'estado', 'fecha'], name='reservas_prest_estado_fecha'),
+        ),
+        AddIndexConcurrently(
+            model_name='reserva',
+            index=models.Index(fields=['prestador', '-fecha', '-hora_inicio', '-id'], name='reservas_prest_fecha_hora_id'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('turnos', '0005_reserva_prestador'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('confirmada', 'Confirmada'), ('cancelada', 'Cancelada'), ('completada', 'Completada'), ('no_asistio', 'No Asistió')], max_length=20)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('monto_pagado', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('agenda', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='turnos.agenda')),
+                ('prestador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='turnos.perfilprestador')),
+            ],
+            options={
+                'db_table': 'resumenes_diarios',
+                'indexes': [models.Index(fields=['prestador', 'fecha'], name='resumenes_prestador_fecha')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resumendiario',
+            constraint=models.UniqueConstraint(fields=('agenda', 'fecha', 'estado'), name='resumenes_agenda_fecha_estado'),
+        ),
+        # Resumen inicial a partir de las reservas existentes
+        migrations.RunSQL(
+            """
+            INSERT INTO resumenes_diarios (agenda_id, prestador_id, fecha, estado, cantidad, monto_pagado)
+            SELECT agenda_id, prestador_id, fecha, estado, COUNT(*), COALESCE(SUM(monto_pagado), 0)
+            FROM reservas
+            GROUP BY agenda_id, prestador_id, fecha, estado
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
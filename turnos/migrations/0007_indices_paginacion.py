@@ -0,0 +1,19 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # El índice de paginación de reservas (prestador, -fecha, -hora_inicio, -id)
+    # ya se crea en 0005
+    atomic = False
+
+    dependencies = [
+        ('turnos', '0006_resumen_diario'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='cliente',
+            index=models.Index(fields=['prestador', '-fecha_registro', '-id'], name='clientes_prest_registro'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations, models
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('turnos', '0007_indices_paginacion'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='cliente',
+            index=models.Index(models.F('prestador'), django.contrib.postgres.indexes.OpClass(models.F('dni'), name='varchar_pattern_ops'), name='clientes_prest_dni_prefijo'),
+        ),
+        AddIndexConcurrently(
+            model_name='cliente',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper(django.db.models.functions.comparison.Cast('nombre', models.TextField())), name='gin_trgm_ops'), name='clientes_nombre_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='cliente',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper(django.db.models.functions.comparison.Cast('apellido', models.TextField())), name='gin_trgm_ops'), name='clientes_apellido_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='cliente',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper(django.db.models.functions.comparison.Cast('email', models.TextField())), name='gin_trgm_ops'), name='clientes_email_trgm'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('turnos', '0008_busqueda_clientes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reserva',
+            name='fecha_recordatorio',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('turnos', '0009_reserva_fecha_recordatorio'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='notificacion',
+            index=models.Index(condition=models.Q(('leida', True)), fields=['fecha_creacion'], name='notificaciones_leidas_fecha'),
+        ),
+    ]
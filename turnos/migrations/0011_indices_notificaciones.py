@@ -0,0 +1,21 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('turnos', '0010_notificaciones_leidas_fecha'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='notificacion',
+            index=models.Index(fields=['usuario', '-fecha_creacion', '-id'], name='notificaciones_usuario_fecha'),
+        ),
+        AddIndexConcurrently(
+            model_name='notificacion',
+            index=models.Index(condition=models.Q(('leida', False)), fields=['usuario'], name='notificaciones_no_leidas'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('turnos', '0011_indices_notificaciones'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notificacion',
+            name='tipo',
+            field=models.CharField(choices=[('nueva_reserva', 'Nueva Reserva'), ('cancelacion', 'Cancelación'), ('recordatorio', 'Recordatorio'), ('pago', 'Pago Recibido'), ('comprobantes', 'Comprobantes Listos')], max_length=30),
+        ),
+    ]
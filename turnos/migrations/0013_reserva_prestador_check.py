@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CHECK NOT VALID: sólo toma el lock un instante, no recorre la tabla.
+    # Las filas nuevas ya se controlan; las existentes se validan en 0014.
+    # Aplicar cuando ya no queden procesos con código anterior a 0005 (que
+    # insertan reservas sin prestador): sus inserts fallarían con el CHECK.
+    atomic = False
+
+    dependencies = [
+        ('turnos', '0012_notificacion_tipo_comprobantes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'ALTER TABLE reservas ADD CONSTRAINT reservas_prestador_no_nulo '
+            'CHECK (prestador_id IS NOT NULL) NOT VALID',
+            'ALTER TABLE reservas DROP CONSTRAINT IF EXISTS reservas_prestador_no_nulo',
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    # Sin transacción global: VALIDATE recorre la tabla con SHARE UPDATE
+    # EXCLUSIVE (no bloquea lecturas ni escrituras) y se confirma antes del
+    # SET NOT NULL, que con el CHECK ya validado no vuelve a recorrerla.
+    atomic = False
+
+    dependencies = [
+        ('turnos', '0013_reserva_prestador_check'),
+    ]
+
+    operations = [
+        # Reservas insertadas sin prestador por procesos con la versión
+        # anterior mientras corría el backfill de 0005 (o hasta terminar el
+        # deploy). Desde 0013 el CHECK ya no deja insertar filas nuevas así.
+        migrations.RunSQL(
+            """
+            UPDATE reservas SET prestador_id = agendas.prestador_id
+            FROM agendas
+            WHERE reservas.agenda_id = agendas.id
+              AND reservas.prestador_id IS NULL
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            'ALTER TABLE reservas VALIDATE CONSTRAINT reservas_prestador_no_nulo',
+            migrations.RunSQL.noop,
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'ALTER TABLE reservas ALTER COLUMN prestador_id SET NOT NULL',
+                    'ALTER TABLE reservas ALTER COLUMN prestador_id DROP NOT NULL',
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='reserva',
+                    name='prestador',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='turnos.perfilprestador'),
+                ),
+            ],
+        ),
+        migrations.RunSQL(
+            'ALTER TABLE reservas DROP CONSTRAINT reservas_prestador_no_nulo',
+            'ALTER TABLE reservas ADD CONSTRAINT reservas_prestador_no_nulo '
+            'CHECK (prestador_id IS NOT NULL) NOT VALID',
+        ),
+    ]
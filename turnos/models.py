@@ -1,9 +1,25 @@
 from django.db import models
+from django.db.models import F, Func, Q
+from django.db.models.functions import Cast, Upper
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 import uuid
 
+class FechaHora(Func):
+    """fecha + hora como timestamp (DateField + TimeField en PostgreSQL)"""
+    arg_joiner = ' + '
+    template = '(%(expressions)s)'
+    output_field = models.DateTimeField()
+
+class RangoHorario(Func):
+    """Rango [inicio, fin) de timestamps"""
+    function = 'TSRANGE'
+    output_field = DateTimeRangeField()
+
 class Usuario(AbstractUser):
     """Usuario extendido con roles"""
     ROLES = (
@@ -128,10 +144,24 @@ class Cliente(models.Model):
     class Meta:
         db_table = 'clientes'
         unique_together = ['prestador', 'dni']
+        indexes = [
+            # Listado paginado por clave, de los más recientes a los más antiguos
+            models.Index(fields=['prestador', '-fecha_registro', '-id'], name='clientes_prest_registro'),
+            # Búsqueda (turnos.busqueda): prefijo de DNI y trigramas sobre
+            # UPPER(campo::text), la expresión que usa icontains
+            models.Index(F('prestador'), OpClass(F('dni'), name='varchar_pattern_ops'), name='clientes_prest_dni_prefijo'),
+            GinIndex(OpClass(Upper(Cast('nombre', models.TextField())), name='gin_trgm_ops'), name='clientes_nombre_trgm'),
+            GinIndex(OpClass(Upper(Cast('apellido', models.TextField())), name='gin_trgm_ops'), name='clientes_apellido_trgm'),
+            GinIndex(OpClass(Upper(Cast('email', models.TextField())), name='gin_trgm_ops'), name='clientes_email_trgm'),
+        ]
     
     def __str__(self):
         return f"{self.nombre} {self.apellido}"
 
+# Estados de reserva que ocupan un horario en la agenda. A nivel de módulo
+# para poder usarlo en Reserva.Meta (restricción e índice parcial).
+ESTADOS_ACTIVOS_RESERVA = ['pendiente', 'confirmada']
+
 class Reserva(models.Model):
     """Reservas/Turnos"""
     ESTADOS = (
@@ -142,6 +172,9 @@ class Reserva(models.Model):
         ('no_asistio', 'No Asistió'),
     )
     
+    # Estados que ocupan un horario en la agenda
+    ESTADOS_ACTIVOS = tuple(ESTADOS_ACTIVOS_RESERVA)
+    
     ESTADO_PAGO = (
         ('pendiente', 'Pendiente'),
         ('seña', 'Seña Pagada'),
@@ -151,6 +184,11 @@ class Reserva(models.Model):
     
     codigo = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     agenda = models.ForeignKey(Agenda, on_delete=models.CASCADE, related_name='reservas')
+    # Copia de agenda.prestador para filtrar sin pasar por agendas (ver save).
+    # Sin índice propio: lo cubren los índices compuestos que empiezan por prestador.
+    prestador = models.ForeignKey(
+        PerfilPrestador, on_delete=models.CASCADE, related_name='reservas', db_index=False
+    )
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='reservas')
     servicio = models.ForeignKey(Servicio, on_delete=models.CASCADE)
     
@@ -167,23 +205,69 @@ class Reserva(models.Model):
     # Datos de pago
     mp_payment_id = models.CharField(max_length=200, blank=True, null=True)
     mp_preference_id = models.CharField(max_length=200, blank=True, null=True)
+    mp_init_point = models.URLField(max_length=500, blank=True, null=True)
     
     notas = models.TextField(blank=True)
     
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_cancelacion = models.DateTimeField(blank=True, null=True)
     motivo_cancelacion = models.TextField(blank=True)
+    fecha_recordatorio = models.DateTimeField(blank=True, null=True)
     
     class Meta:
         db_table = 'reservas'
         ordering = ['fecha', 'hora_inicio']
+        indexes = [
+            # Disponibilidad: reservas activas de una agenda en unas fechas
+            models.Index(
+                fields=['agenda', 'fecha'],
+                name='reservas_agenda_fecha_activas',
+                condition=Q(estado__in=ESTADOS_ACTIVOS_RESERVA),
+            ),
+            # Dashboard: conteos por estado y rangos de fechas del prestador
+            models.Index(fields=['prestador', 'estado', 'fecha'], name='reservas_prest_estado_fecha'),
+            # Listado de reservas del prestador, de la más reciente a la más antigua
+            models.Index(fields=['prestador', '-fecha', '-hora_inicio', '-id'], name='reservas_prest_fecha_hora_id'),
+            # Recordatorios y no asistidas: confirmadas de un día
+            models.Index(
+                fields=['fecha'],
+                name='reservas_fecha_confirmadas',
+                condition=Q(estado='confirmada'),
+            ),
+        ]
+        constraints = [
+            # Dos reservas activas de la misma agenda no pueden superponerse.
+            # Requiere la extensión btree_gist (migración 0002).
+            ExclusionConstraint(
+                name='reservas_sin_superposicion',
+                expressions=[
+                    ('agenda', RangeOperators.EQUAL),
+                    (
+                        RangoHorario(FechaHora('fecha', 'hora_inicio'), FechaHora('fecha', 'hora_fin')),
+                        RangeOperators.OVERLAPS,
+                    ),
+                ],
+                condition=Q(estado__in=ESTADOS_ACTIVOS_RESERVA),
+            ),
+        ]
     
     def __str__(self):
         return f"Reserva {self.codigo} - {self.cliente} - {self.fecha}"
     
+    def save(self, *args, **kwargs):
+        """Mantiene `prestador` igual al prestador de la agenda"""
+        # Se copia al crear la reserva o al asignarle otra agenda; quien cambie
+        # sólo agenda_id (o use update/bulk_create) debe fijar prestador_id.
+        if self.prestador_id is None or Reserva.agenda.is_cached(self):
+            self.prestador_id = self.agenda.prestador_id
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'agenda' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'prestador'}
+        super().save(*args, **kwargs)
+    
     def puede_cancelar_con_devolucion(self):
         """Verifica si puede cancelar con devolución"""
-        prestador = self.agenda.prestador
+        prestador = self.prestador
         horas_limite = prestador.horas_cancelacion_con_devolucion
         fecha_hora_reserva = timezone.make_aware(
             timezone.datetime.combine(self.fecha, self.hora_inicio)
@@ -191,6 +275,28 @@ class Reserva(models.Model):
         diferencia = fecha_hora_reserva - timezone.now()
         return diferencia.total_seconds() / 3600 >= horas_limite
 
+class ResumenDiario(models.Model):
+    """Cantidad de reservas y monto pagado por agenda, día y estado"""
+    agenda = models.ForeignKey(Agenda, on_delete=models.CASCADE, related_name='resumenes')
+    prestador = models.ForeignKey(PerfilPrestador, on_delete=models.CASCADE, related_name='resumenes')
+    fecha = models.DateField()
+    estado = models.CharField(max_length=20, choices=Reserva.ESTADOS)
+    
+    cantidad = models.IntegerField(default=0)
+    monto_pagado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        db_table = 'resumenes_diarios'
+        constraints = [
+            models.UniqueConstraint(fields=['agenda', 'fecha', 'estado'], name='resumenes_agenda_fecha_estado'),
+        ]
+        indexes = [
+            models.Index(fields=['prestador', 'fecha'], name='resumenes_prestador_fecha'),
+        ]
+    
+    def __str__(self):
+        return f"{self.agenda} - {self.fecha} - {self.estado}: {self.cantidad}"
+
 class Notificacion(models.Model):
     """Sistema de notificaciones"""
     TIPOS = (
@@ -198,6 +304,7 @@ class Notificacion(models.Model):
         ('cancelacion', 'Cancelación'),
         ('recordatorio', 'Recordatorio'),
         ('pago', 'Pago Recibido'),
+        ('comprobantes', 'Comprobantes Listos'),
     )
     
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='notificaciones')
@@ -212,6 +319,13 @@ class Notificacion(models.Model):
     class Meta:
         db_table = 'notificaciones'
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Limpieza por lotes de las leídas antiguas
+            models.Index(fields=['fecha_creacion'], name='notificaciones_leidas_fecha', condition=Q(leida=True)),
+            # Bandeja paginada por clave y conteo de no leídas
+            models.Index(fields=['usuario', '-fecha_creacion', '-id'], name='notificaciones_usuario_fecha'),
+            models.Index(fields=['usuario'], name='notificaciones_no_leidas', condition=Q(leida=False)),
+        ]
 
 class ConfiguracionGlobal(models.Model):
     """Configuraciones globales del sistema"""
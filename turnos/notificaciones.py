@@ -0,0 +1,95 @@
+"""
+Bandeja de notificaciones y contador de no leídas.
+
+El contador de cada usuario vive en la cache (Redis) y se mantiene con
+incr/decr al crear notificaciones y al marcarlas como leídas, así el badge
+de base.html no consulta la base en cada página. Si la clave no existe se
+recalcula con un COUNT. Quien elimina notificaciones no leídas usa
+`eliminar_notificaciones`, que borra las claves afectadas (no hay receptor
+de post_delete, para no perder el DELETE directo de la limpieza de leídas);
+también se borra la clave si un decr la dejaría negativa.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Notificacion
+
+
+def _clave(usuario_id):
+    return f'notif:no_leidas:{usuario_id}'
+
+
+def no_leidas(usuario_id):
+    """Cantidad de notificaciones no leídas del usuario"""
+    clave = _clave(usuario_id)
+    cantidad = cache.get(clave)
+    if cantidad is not None:
+        return cantidad
+    
+    # La clave se crea en 0 antes de contar, así los incr/decr de las
+    # notificaciones creadas o leídas mientras tanto no se pierden. Si hubo
+    # alguno no se sabe si el COUNT ya lo incluía: se descarta para recontar.
+    sembrada = cache.add(clave, 0, settings.NOTIFICACIONES_CACHE_TIMEOUT)
+    cantidad = Notificacion.objects.filter(usuario_id=usuario_id, leida=False).count()
+    if sembrada:
+        try:
+            if cache.incr(clave, cantidad) != cantidad:
+                cache.delete(clave)
+        except ValueError:
+            pass
+    return cantidad
+
+
+def sumar_no_leidas(usuario_id, cantidad):
+    """Ajusta el contador si está cacheado (si no, se recalculará al leerlo)"""
+    if not cantidad:
+        return
+    clave = _clave(usuario_id)
+    try:
+        if cantidad > 0:
+            cache.incr(clave, cantidad)
+        elif cache.decr(clave, -cantidad) < 0:
+            # Se desvió (p. ej. una baja que no se descontó): recalcular al leerlo
+            cache.delete(clave)
+    except ValueError:
+        pass
+
+
+def invalidar_no_leidas(*usuario_ids):
+    """Descarta los contadores cacheados; se recalculan al leerlos"""
+    cache.delete_many([_clave(usuario_id) for usuario_id in usuario_ids])
+
+
+def crear_notificaciones(notificaciones):
+    """bulk_create que también actualiza los contadores de no leídas"""
+    creadas = Notificacion.objects.bulk_create(notificaciones)
+    por_usuario = Counter(n.usuario_id for n in creadas if not n.leida)
+    transaction.on_commit(lambda: [
+        sumar_no_leidas(usuario_id, cantidad) for usuario_id, cantidad in por_usuario.items()
+    ])
+    return creadas
+
+
+def eliminar_notificaciones(notificaciones):
+    """
+    Elimina las notificaciones del queryset e invalida los contadores de los
+    usuarios que tenían alguna no leída entre ellas. Devuelve cuántas eliminó.
+    """
+    usuarios = list(notificaciones.filter(leida=False).values_list('usuario_id', flat=True).distinct())
+    cantidad = notificaciones.delete()[0]
+    if usuarios:
+        transaction.on_commit(lambda: invalidar_no_leidas(*usuarios))
+    return cantidad
+
+
+def marcar_leidas(usuario_id, ids=None):
+    """Marca como leídas las notificaciones `ids` del usuario (o todas). Devuelve cuántas."""
+    pendientes = Notificacion.objects.filter(usuario_id=usuario_id, leida=False)
+    if ids is not None:
+        pendientes = pendientes.filter(id__in=ids)
+    cantidad = pendientes.update(leida=True)
+    transaction.on_commit(lambda: sumar_no_leidas(usuario_id, -cantidad))
+    return cantidad
@@ -0,0 +1,111 @@
+"""
+Paginación por clave (keyset) para listados largos.
+
+En lugar de OFFSET, cada página se pide a partir de los valores de orden
+de la última fila mostrada: `WHERE (fecha, hora_inicio, id) < (...)`.
+Con un índice sobre esas columnas el costo de una página es el mismo sin
+importar cuán lejos esté del principio, y nunca se cargan más de
+`tamano + 1` filas.
+
+El cursor viaja en el parámetro GET `cursor`; el resto de los parámetros
+(filtros, búsqueda) se conservan en los enlaces.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Func, Value
+
+TAMANO_PAGINA = 50
+
+
+class Fila(Func):
+    """Constructor de fila de SQL: (a, b, c), comparable como tupla"""
+    template = '(%(expressions)s)'
+    output_field = models.Field()
+
+
+class Pagina:
+    """Objetos de una página y enlaces a la anterior y la siguiente"""
+
+    def __init__(self, objetos, url_anterior=None, url_siguiente=None):
+        self.objetos = objetos
+        self.url_anterior = url_anterior
+        self.url_siguiente = url_siguiente
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+
+def _codificar(direccion, valores):
+    contenido = json.dumps([direccion, valores], cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(contenido.encode()).decode().rstrip('=')
+
+
+def _decodificar(cursor, campos):
+    """(dirección, valores) del cursor, o None si no es válido"""
+    try:
+        contenido = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direccion, valores = json.loads(contenido)
+        if direccion not in ('anterior', 'siguiente') or len(valores) != len(campos):
+            return None
+        return direccion, [campo.to_python(valor) for campo, valor in zip(campos, valores)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _url(request, cursor):
+    parametros = request.GET.copy()
+    parametros['cursor'] = cursor
+    return f'?{parametros.urlencode()}'
+
+
+def paginar(queryset, orden, request, tamano=TAMANO_PAGINA):
+    """
+    Página de `queryset` ordenada por `orden` (p. ej. ('-fecha', '-id')).
+
+    Todos los campos deben ir en el mismo sentido y el último debe ser
+    único para que el orden sea estable. Un cursor inválido devuelve la
+    primera página.
+    """
+    nombres = [campo.lstrip('-') for campo in orden]
+    campos = [queryset.model._meta.get_field(nombre) for nombre in nombres]
+    descendente = orden[0].startswith('-')
+
+    cursor = request.GET.get('cursor')
+    direccion, valores = (cursor and _decodificar(cursor, campos)) or ('siguiente', None)
+    hacia_atras = direccion == 'anterior'
+
+    if valores is not None:
+        limite = Fila(*[Value(valor, output_field=campo) for campo, valor in zip(campos, valores)])
+        comparacion = 'lt' if descendente != hacia_atras else 'gt'
+        queryset = queryset.alias(clave_pagina=Fila(*nombres)).filter(
+            **{f'clave_pagina__{comparacion}': limite}
+        )
+
+    if hacia_atras:
+        orden = [nombre if descendente else f'-{nombre}' for nombre in nombres]
+    objetos = list(queryset.order_by(*orden)[:tamano + 1])
+    hay_mas = len(objetos) > tamano
+    objetos = objetos[:tamano]
+    if hacia_atras:
+        objetos.reverse()
+
+    if not objetos:
+        return Pagina(objetos)
+
+    def clave(objeto):
+        return [getattr(objeto, campo.attname) for campo in campos]
+
+    hay_anterior = hay_mas if hacia_atras else valores is not None
+    hay_siguiente = hay_mas if not hacia_atras else True
+    return Pagina(
+        objetos,
+        url_anterior=_url(request, _codificar('anterior', clave(objetos[0]))) if hay_anterior else None,
+        url_siguiente=_url(request, _codificar('siguiente', clave(objetos[-1]))) if hay_siguiente else None,
+    )
@@ -0,0 +1,210 @@
+"""
+Integración con MercadoPago.
+
+Todas las llamadas al SDK pasan por `ejecutar`, que aplica un timeout corto y
+un circuit breaker compartido entre procesos (en la cache de Redis): tras
+varios fallos seguidos se deja de llamar a MercadoPago durante un tiempo y
+se responde con MercadoPagoNoDisponible sin bloquear al worker.
+
+Los SDK se guardan por access token en `registro_clientes`, así cada
+prestador reutiliza su sesión HTTP (y la conexión TLS) entre reservas.
+"""
+import threading
+from collections import OrderedDict
+
+import mercadopago
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from mercadopago.config import Config, RequestOptions
+from mercadopago.http import HttpClient
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+CLAVE_CIRCUITO_ABIERTO = 'mp:circuito:abierto'
+CLAVE_CIRCUITO_FALLOS = 'mp:circuito:fallos'
+
+
+class MercadoPagoError(Exception):
+    """MercadoPago rechazó la operación"""
+
+
+class MercadoPagoNoDisponible(MercadoPagoError):
+    """MercadoPago no responde o el circuito está abierto"""
+
+
+class ClienteHttpMercadoPago(HttpClient):
+    """
+    Cliente HTTP del SDK con una sesión persistente (keep-alive): reutiliza
+    las conexiones TLS entre llamadas en lugar de abrir una por solicitud.
+    También permite apuntar a otra URL base (p. ej. el servidor falso).
+    """
+
+    URL_BASE = Config().api_base_url
+
+    def __init__(self):
+        reintentos = Retry(
+            total=settings.MERCADOPAGO_MAX_REINTENTOS,
+            status_forcelist=[429, 500, 502, 503, 504]
+        )
+        adaptador = HTTPAdapter(
+            pool_maxsize=settings.MERCADOPAGO_CONEXIONES_POR_CLIENTE,
+            max_retries=reintentos
+        )
+        self.sesion = requests.Session()
+        self.sesion.mount('https://', adaptador)
+        self.sesion.mount('http://', adaptador)
+
+    def request(self, method, url, maxretries=None, **kwargs):
+        if url.startswith(self.URL_BASE):
+            url = settings.MERCADOPAGO_API_URL.rstrip('/') + url[len(self.URL_BASE):]
+        api_result = self.sesion.request(method, url, **kwargs)
+        return {
+            "status": api_result.status_code,
+            "response": api_result.json()
+        }
+
+    def cerrar(self):
+        self.sesion.close()
+
+
+class RegistroClientesMercadoPago:
+    """
+    SDKs por access token, compartidos por todo el proceso. Tamaño acotado
+    con desalojo LRU; cuenta aciertos, fallos y desalojos.
+    """
+
+    def __init__(self):
+        self._clientes = OrderedDict()
+        self._lock = threading.Lock()
+        self._metricas = {'aciertos': 0, 'fallos': 0, 'desalojos': 0, 'invalidaciones': 0}
+
+    def obtener(self, access_token):
+        with self._lock:
+            sdk = self._clientes.get(access_token)
+            if sdk is not None:
+                self._clientes.move_to_end(access_token)
+                self._metricas['aciertos'] += 1
+                return sdk
+
+            self._metricas['fallos'] += 1
+            sdk = _crear_sdk(access_token)
+            self._clientes[access_token] = sdk
+            while len(self._clientes) > settings.MERCADOPAGO_MAX_CLIENTES:
+                _, desalojado = self._clientes.popitem(last=False)
+                desalojado.http_client.cerrar()
+                self._metricas['desalojos'] += 1
+            return sdk
+
+    def invalidar(self, access_token):
+        """Descarta el cliente de un token que dejó de usarse"""
+        with self._lock:
+            sdk = self._clientes.pop(access_token, None)
+            if sdk is not None:
+                sdk.http_client.cerrar()
+                self._metricas['invalidaciones'] += 1
+
+    def limpiar(self):
+        with self._lock:
+            for sdk in self._clientes.values():
+                sdk.http_client.cerrar()
+            self._clientes.clear()
+
+    def metricas(self):
+        with self._lock:
+            return {**self._metricas, 'clientes': len(self._clientes)}
+
+
+registro_clientes = RegistroClientesMercadoPago()
+
+
+def _crear_sdk(access_token):
+    opciones = RequestOptions(
+        connection_timeout=settings.MERCADOPAGO_TIMEOUT,
+        max_retries=settings.MERCADOPAGO_MAX_REINTENTOS,
+    )
+    return mercadopago.SDK(access_token, http_client=ClienteHttpMercadoPago(), request_options=opciones)
+
+
+def sdk_para(access_token):
+    """SDK del access token, reutilizado entre llamadas del mismo proceso"""
+    return registro_clientes.obtener(access_token)
+
+
+# ==================== CIRCUIT BREAKER ====================
+
+def circuito_abierto():
+    return cache.get(CLAVE_CIRCUITO_ABIERTO) is not None
+
+
+def _registrar_fallo():
+    cache.add(CLAVE_CIRCUITO_FALLOS, 0, settings.MERCADOPAGO_CIRCUITO_VENTANA)
+    try:
+        fallos = cache.incr(CLAVE_CIRCUITO_FALLOS)
+    except ValueError:
+        return
+    if fallos >= settings.MERCADOPAGO_CIRCUITO_UMBRAL:
+        cache.set(CLAVE_CIRCUITO_ABIERTO, 1, settings.MERCADOPAGO_CIRCUITO_PAUSA)
+        cache.delete(CLAVE_CIRCUITO_FALLOS)
+
+
+def _registrar_exito():
+    cache.delete(CLAVE_CIRCUITO_FALLOS)
+
+
+def ejecutar(operacion, *args, **kwargs):
+    """
+    Ejecuta una operación del SDK (p. ej. sdk.preference().create) y devuelve
+    el campo `response`. Los errores de red, timeouts y respuestas 5xx cuentan
+    como fallos del circuito.
+    """
+    if circuito_abierto():
+        raise MercadoPagoNoDisponible('Circuito abierto')
+
+    try:
+        resultado = operacion(*args, **kwargs)
+    except (requests.RequestException, ValueError) as e:
+        _registrar_fallo()
+        raise MercadoPagoNoDisponible(str(e)) from e
+
+    if resultado['status'] >= 500:
+        _registrar_fallo()
+        raise MercadoPagoNoDisponible(f"Error {resultado['status']}: {resultado['response']}")
+
+    _registrar_exito()
+    if resultado['status'] >= 400:
+        raise MercadoPagoError(f"Error {resultado['status']}: {resultado['response']}")
+    return resultado['response']
+
+
+# ==================== OPERACIONES ====================
+
+def crear_preferencia(reserva, back_urls):
+    """Crea la preferencia de pago de la reserva y guarda su id e init_point"""
+    prestador = reserva.prestador
+    monto_total = reserva.monto_total
+    monto_a_pagar = monto_total if prestador.requiere_pago_total else (monto_total * prestador.porcentaje_seña / 100)
+
+    preference_data = {
+        "items": [{
+            "title": f"{reserva.servicio.nombre} - {prestador.nombre_negocio}",
+            "quantity": 1,
+            "unit_price": float(monto_a_pagar)
+        }],
+        "back_urls": back_urls,
+        "external_reference": str(reserva.codigo)
+    }
+
+    sdk = sdk_para(prestador.mp_access_token)
+    preferencia = ejecutar(sdk.preference().create, preference_data)
+
+    reserva.mp_preference_id = preferencia["id"]
+    reserva.mp_init_point = preferencia["init_point"]
+    reserva.save(update_fields=['mp_preference_id', 'mp_init_point'])
+    return preferencia
+
+
+def crear_devolucion(reserva):
+    """Devuelve el pago de la reserva"""
+    sdk = sdk_para(reserva.prestador.mp_access_token)
+    return ejecutar(sdk.refund().create, reserva.mp_payment_id)
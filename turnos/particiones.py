@@ -0,0 +1,200 @@
+"""
+Particionado opcional de la tabla de notificaciones por mes.
+
+`particionar()` (comando `particionar_notificaciones`) convierte
+`notificaciones` en una tabla particionada por rango de fecha_creacion, con
+una partición por mes (notificaciones_AAAA_MM) y una partición por defecto
+que recibe lo que quede fuera de los meses creados. Luego
+`limpiar_notificaciones_antiguas` crea las particiones de los próximos meses
+y elimina enteras las de meses vencidos (DROP TABLE, sin borrar fila por
+fila). Antes de eliminar una partición se pasan a la partición por defecto
+sus notificaciones no leídas, que la limpieza fila por fila conserva.
+
+Las particiones requieren que la clave primaria incluya la columna de
+partición, así que pasa a ser (id, fecha_creacion). Para Django el id sigue
+siendo único porque sale de la misma secuencia.
+"""
+import re
+from datetime import date
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Notificacion
+from .notificaciones import invalidar_no_leidas
+
+TABLA = Notificacion._meta.db_table
+PARTICION_DEFECTO = f'{TABLA}_defecto'
+NOMBRE_PARTICION = re.compile(rf'^{TABLA}_(\d{{4}})_(\d{{2}})$')
+
+
+def sumar_meses(fecha, meses):
+    """Primer día del mes que está `meses` meses después del de `fecha`"""
+    indice = fecha.year * 12 + fecha.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def esta_particionada():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass)',
+            [TABLA]
+        )
+        return cursor.fetchone()[0]
+
+
+def particiones():
+    """Meses (primer día) que tienen partición propia"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT hija.relname FROM pg_inherits
+            JOIN pg_class hija ON hija.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = %s::regclass
+            """,
+            [TABLA]
+        )
+        nombres = [fila[0] for fila in cursor.fetchall()]
+    meses = []
+    for nombre in nombres:
+        coincidencia = NOMBRE_PARTICION.match(nombre)
+        if coincidencia:
+            meses.append(date(int(coincidencia[1]), int(coincidencia[2]), 1))
+    return sorted(meses)
+
+
+def _nombre_particion(mes):
+    return f'{TABLA}_{mes.year:04d}_{mes.month:02d}'
+
+
+def _crear_particion(cursor, mes):
+    cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {_nombre_particion(mes)}
+        PARTITION OF {TABLA} FOR VALUES FROM (%s) TO (%s)
+        """,
+        [mes.isoformat(), sumar_meses(mes, 1).isoformat()]
+    )
+
+
+def _crear_particion_desde_defecto(cursor, mes):
+    """
+    Crea la partición de `mes` pasando a ella las filas de ese mes que están
+    en la partición por defecto; con ellas ahí PostgreSQL no deja crearla.
+    """
+    rango = [mes.isoformat(), sumar_meses(mes, 1).isoformat()]
+    cursor.execute(
+        f'SELECT EXISTS (SELECT 1 FROM {PARTICION_DEFECTO} WHERE fecha_creacion >= %s AND fecha_creacion < %s)',
+        rango
+    )
+    if not cursor.fetchone()[0]:
+        _crear_particion(cursor, mes)
+        return
+
+    cursor.execute(f'ALTER TABLE {TABLA} DETACH PARTITION {PARTICION_DEFECTO}')
+    _crear_particion(cursor, mes)
+    cursor.execute(
+        f"""
+        WITH movidas AS (
+            DELETE FROM {PARTICION_DEFECTO}
+            WHERE fecha_creacion >= %s AND fecha_creacion < %s
+            RETURNING *
+        )
+        INSERT INTO {TABLA} SELECT * FROM movidas
+        """,
+        rango
+    )
+    cursor.execute(f'ALTER TABLE {TABLA} ATTACH PARTITION {PARTICION_DEFECTO} DEFAULT')
+
+
+def crear_particiones(desde, meses):
+    """Particiones de `meses` meses a partir del mes de `desde`"""
+    existentes = set(particiones())
+    with transaction.atomic(), connection.cursor() as cursor:
+        for n in range(meses):
+            mes = sumar_meses(desde, n)
+            if mes not in existentes:
+                _crear_particion_desde_defecto(cursor, mes)
+
+
+def eliminar_particiones_anteriores(limite):
+    """
+    Elimina las particiones de meses que terminan antes de `limite`, salvo sus
+    notificaciones no leídas, que pasan a la partición por defecto. Devuelve
+    cuántas particiones eliminó.
+    """
+    vencidas = [mes for mes in particiones() if sumar_meses(mes, 1) <= limite]
+    usuarios = set()
+    with transaction.atomic(), connection.cursor() as cursor:
+        for mes in vencidas:
+            nombre = _nombre_particion(mes)
+            cursor.execute(f'ALTER TABLE {TABLA} DETACH PARTITION {nombre}')
+            # Sin la partición del mes, las filas van a la partición por defecto
+            cursor.execute(f'INSERT INTO {TABLA} SELECT * FROM {nombre} WHERE NOT leida RETURNING usuario_id')
+            usuarios.update(fila[0] for fila in cursor.fetchall())
+            cursor.execute(f'DROP TABLE {nombre}')
+        # Los DROP no disparan señales: recalcular los contadores afectados
+        transaction.on_commit(lambda: invalidar_no_leidas(*usuarios))
+    return len(vencidas)
+
+
+def particionar(meses_adelantados=3):
+    """
+    Convierte `notificaciones` en tabla particionada por mes, copiando las
+    filas existentes. Bloquea la tabla mientras dura la copia.
+    """
+    nueva = f'{TABLA}_particionada'
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {TABLA} IN ACCESS EXCLUSIVE MODE')
+
+        # Índices y claves foráneas actuales, para recrearlos en la tabla nueva
+        cursor.execute(
+            """
+            SELECT indexdef FROM pg_indexes
+            WHERE tablename = %s AND indexname <> %s
+            """,
+            [TABLA, f'{TABLA}_pkey']
+        )
+        indices = [fila[0] for fila in cursor.fetchall()]
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'f'
+            """,
+            [TABLA]
+        )
+        foraneas = cursor.fetchall()
+        cursor.execute(f'SELECT MIN(fecha_creacion)::date, MAX(id) FROM {TABLA}')
+        primera, ultimo_id = cursor.fetchone()
+
+        cursor.execute(
+            f"""
+            CREATE TABLE {nueva} (LIKE {TABLA} INCLUDING DEFAULTS)
+            PARTITION BY RANGE (fecha_creacion)
+            """
+        )
+        cursor.execute(f'ALTER TABLE {nueva} ADD PRIMARY KEY (id, fecha_creacion)')
+        # El id sale de una secuencia propia que sigue desde el último id
+        cursor.execute(f'CREATE SEQUENCE {nueva}_id_seq')
+        cursor.execute('SELECT setval(%s, %s, false)', [f'{nueva}_id_seq', (ultimo_id or 0) + 1])
+        cursor.execute(f"ALTER TABLE {nueva} ALTER COLUMN id SET DEFAULT nextval('{nueva}_id_seq')")
+
+        cursor.execute(f'ALTER TABLE {TABLA} RENAME TO {TABLA}_anterior')
+        cursor.execute(f'ALTER TABLE {nueva} RENAME TO {TABLA}')
+        cursor.execute(f'ALTER SEQUENCE {nueva}_id_seq OWNED BY {TABLA}.id')
+
+        hoy = timezone.localdate()
+        desde = primera.replace(day=1) if primera else hoy.replace(day=1)
+        mes = desde
+        while mes < sumar_meses(hoy, meses_adelantados):
+            _crear_particion(cursor, mes)
+            mes = sumar_meses(mes, 1)
+        cursor.execute(f'CREATE TABLE {PARTICION_DEFECTO} PARTITION OF {TABLA} DEFAULT')
+
+        cursor.execute(f'INSERT INTO {TABLA} SELECT * FROM {TABLA}_anterior')
+        cursor.execute(f'DROP TABLE {TABLA}_anterior')
+
+        for definicion in indices:
+            cursor.execute(definicion)
+        for nombre, definicion in foraneas:
+            cursor.execute(f'ALTER TABLE {TABLA} ADD CONSTRAINT {nombre} {definicion}')
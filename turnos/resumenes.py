@@ -0,0 +1,132 @@
+"""
+Resumen diario de reservas (tabla resumenes_diarios).
+
+Cada fila acumula, para una agenda, un día y un estado, la cantidad de
+reservas y la suma de monto_pagado. Se mantiene de forma incremental desde
+turnos.signals (cada alta, cambio o baja de una reserva mueve su aporte de
+una fila a otra) y se puede reconstruir desde cero con el comando
+`reconstruir_resumenes`. Los reportes mensuales o anuales leen una fila por
+día y estado en lugar de recorrer las reservas.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from .models import Reserva, ResumenDiario
+
+# Estados cuyo monto pagado cuenta como ingreso
+ESTADOS_INGRESOS = ('confirmada', 'completada')
+
+# Campos de Reserva que determinan su aporte al resumen
+CAMPOS_RESUMEN = ('agenda_id', 'prestador_id', 'fecha', 'estado', 'monto_pagado')
+
+SQL_ACUMULAR = """
+    INSERT INTO resumenes_diarios (agenda_id, prestador_id, fecha, estado, cantidad, monto_pagado)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (agenda_id, fecha, estado) DO UPDATE SET
+        cantidad = resumenes_diarios.cantidad + EXCLUDED.cantidad,
+        monto_pagado = resumenes_diarios.monto_pagado + EXCLUDED.monto_pagado
+"""
+
+SQL_RECONSTRUIR = """
+    INSERT INTO resumenes_diarios (agenda_id, prestador_id, fecha, estado, cantidad, monto_pagado)
+    SELECT agenda_id, prestador_id, fecha, estado, COUNT(*), COALESCE(SUM(monto_pagado), 0)
+    FROM reservas
+    {filtro}
+    GROUP BY agenda_id, prestador_id, fecha, estado
+"""
+
+
+def aporte(reserva):
+    """Valores de la reserva que determinan su fila y su monto en el resumen"""
+    return tuple(getattr(reserva, campo) for campo in CAMPOS_RESUMEN)
+
+
+def acumular(deltas):
+    """
+    Suma cantidades y montos a las filas del resumen.
+
+    `deltas` es una lista de (agenda_id, prestador_id, fecha, estado,
+    cantidad, monto); las filas se crean si no existen. Se aplican en orden
+    de clave para que dos transacciones concurrentes no se bloqueen
+    mutuamente.
+    """
+    deltas = sorted(deltas, key=lambda d: (d[0], d[2], d[3]))
+    if deltas:
+        with connection.cursor() as cursor:
+            cursor.executemany(SQL_ACUMULAR, deltas)
+
+
+def registrar_cambio(anterior, actual):
+    """Mover el aporte de una reserva de `anterior` a `actual` (None = no existe)"""
+    if anterior == actual:
+        return
+    deltas = []
+    if anterior is not None:
+        deltas.append((*anterior[:4], -1, -anterior[4]))
+    if actual is not None:
+        deltas.append((*actual[:4], 1, actual[4]))
+    acumular(deltas)
+
+
+def cambiar_estado(reservas, estado):
+    """
+    reservas.update(estado=estado) manteniendo el resumen (update() no
+    dispara señales). Devuelve la cantidad de reservas actualizadas.
+    """
+    with transaction.atomic():
+        ids = list(reservas.exclude(estado=estado).select_for_update().values_list('id', flat=True))
+        grupos = (
+            Reserva.objects.filter(id__in=ids)
+            .values('agenda_id', 'prestador_id', 'fecha', 'estado')
+            .annotate(cantidad=Count('id'), monto=Sum('monto_pagado'))
+            .order_by()
+        )
+        grupos = list(grupos)
+        cantidad = Reserva.objects.filter(id__in=ids).update(estado=estado)
+
+        movidos = defaultdict(lambda: [0, 0])
+        deltas = []
+        for g in grupos:
+            deltas.append((g['agenda_id'], g['prestador_id'], g['fecha'], g['estado'], -g['cantidad'], -g['monto']))
+            destino = movidos[(g['agenda_id'], g['prestador_id'], g['fecha'])]
+            destino[0] += g['cantidad']
+            destino[1] += g['monto']
+        for (agenda_id, prestador_id, fecha), (n, monto) in movidos.items():
+            deltas.append((agenda_id, prestador_id, fecha, estado, n, monto))
+        acumular(deltas)
+    return cantidad
+
+
+def ingresos(prestador_id, desde, hasta):
+    """Monto pagado de reservas confirmadas o completadas entre dos fechas (inclusive)"""
+    return ResumenDiario.objects.filter(
+        prestador_id=prestador_id,
+        fecha__gte=desde,
+        fecha__lte=hasta,
+        estado__in=ESTADOS_INGRESOS
+    ).aggregate(total=Sum('monto_pagado'))['total'] or 0
+
+
+def reconstruir(desde=None, hasta=None):
+    """Recalcular el resumen desde las reservas, opcionalmente sólo en [desde, hasta]"""
+    condiciones, parametros = [], []
+    if desde:
+        condiciones.append('fecha >= %s')
+        parametros.append(desde)
+    if hasta:
+        condiciones.append('fecha <= %s')
+        parametros.append(hasta)
+    filtro = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+
+    with transaction.atomic():
+        resumenes = ResumenDiario.objects.all()
+        if desde:
+            resumenes = resumenes.filter(fecha__gte=desde)
+        if hasta:
+            resumenes = resumenes.filter(fecha__lte=hasta)
+        resumenes.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(SQL_RECONSTRUIR.format(filtro=filtro), parametros)
+            return cursor.rowcount
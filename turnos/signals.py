@@ -0,0 +1,159 @@
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import PerfilPrestador, Agenda, Servicio, Reserva, Notificacion
+from .pagos import registro_clientes
+from .disponibilidad import (
+    invalidar_dia, invalidar_agenda, invalidar_agendas_prestador, invalidar_servicio
+)
+from .estadisticas import invalidar_estadisticas
+from .resumenes import aporte, registrar_cambio
+from .notificaciones import sumar_no_leidas
+from .eventos import publicar_evento_reserva, tipo_evento
+from .catalogo import invalidar_catalogo, invalidar_catalogo_prestador
+
+# Campos de Reserva que afectan la disponibilidad de la agenda
+CAMPOS_DISPONIBILIDAD = ('agenda_id', 'fecha', 'hora_inicio', 'hora_fin', 'estado')
+
+
+def _estado_disponibilidad(reserva):
+    return tuple(getattr(reserva, campo) for campo in CAMPOS_DISPONIBILIDAD)
+
+
+@receiver(post_init, sender=Reserva)
+def guardar_estado_original(sender, instance, **kwargs):
+    """Recordar los valores cargados para detectar cambios al guardar"""
+    instance._disponibilidad_original = _estado_disponibilidad(instance)
+
+
+@receiver(post_save, sender=Reserva)
+def invalidar_disponibilidad_reserva(sender, instance, created, **kwargs):
+    """Invalidar la disponibilidad de los días afectados por la reserva"""
+    original = instance._disponibilidad_original
+    actual = _estado_disponibilidad(instance)
+    instance._disponibilidad_original = actual
+    
+    if not created and original == actual:
+        return
+    
+    dias = {(actual[0], actual[1])}
+    if not created:
+        dias.add((original[0], original[1]))
+    
+    # Invalidar al confirmar la transacción, para que nadie recalcule y
+    # cachee la disponibilidad anterior bajo la nueva versión.
+    for agenda_id, fecha in dias:
+        transaction.on_commit(lambda a=agenda_id, f=fecha: invalidar_dia(a, f))
+
+
+@receiver(post_delete, sender=Reserva)
+def invalidar_disponibilidad_reserva_eliminada(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidar_dia(instance.agenda_id, instance.fecha))
+
+
+@receiver(post_init, sender=Reserva)
+def guardar_aporte_original(sender, instance, **kwargs):
+    instance._resumen_original = aporte(instance)
+
+
+@receiver(post_save, sender=Reserva)
+def actualizar_resumen_reserva(sender, instance, created, **kwargs):
+    """Mover el aporte de la reserva en el resumen diario (misma transacción)"""
+    actual = aporte(instance)
+    registrar_cambio(None if created else instance._resumen_original, actual)
+    instance._resumen_original = actual
+
+
+@receiver(post_delete, sender=Reserva)
+def actualizar_resumen_reserva_eliminada(sender, instance, **kwargs):
+    registrar_cambio(instance._resumen_original, None)
+
+
+@receiver(post_init, sender=Reserva)
+def guardar_estado_evento(sender, instance, **kwargs):
+    instance._evento_original = (instance.estado, instance.estado_pago)
+
+
+@receiver(post_save, sender=Reserva)
+def publicar_evento(sender, instance, created, **kwargs):
+    """Avisar al panel del prestador (turnos.eventos)"""
+    actual = (instance.estado, instance.estado_pago)
+    tipo = tipo_evento(instance._evento_original, actual, created)
+    instance._evento_original = actual
+    if tipo:
+        transaction.on_commit(lambda: publicar_evento_reserva(instance, tipo))
+
+
+@receiver([post_save, post_delete], sender=Reserva)
+def invalidar_estadisticas_reserva(sender, instance, **kwargs):
+    """Contadores del panel del prestador"""
+    transaction.on_commit(lambda: invalidar_estadisticas(instance.prestador_id))
+
+
+@receiver([post_save, post_delete], sender=Agenda)
+def invalidar_disponibilidad_agenda(sender, instance, **kwargs):
+    """Horarios o días laborables modificados"""
+    transaction.on_commit(lambda: invalidar_agenda(instance.id, instance.prestador_id))
+
+
+@receiver([post_save, post_delete], sender=Servicio)
+def invalidar_disponibilidad_servicio(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidar_servicio(instance.id))
+
+
+@receiver(post_save, sender=PerfilPrestador)
+def invalidar_disponibilidad_prestador(sender, instance, **kwargs):
+    """El prestador pudo activarse o desactivarse"""
+    transaction.on_commit(lambda: invalidar_agendas_prestador(instance.id))
+
+
+@receiver([post_save, post_delete], sender=Agenda)
+@receiver([post_save, post_delete], sender=Servicio)
+def invalidar_catalogo_publico(sender, instance, **kwargs):
+    """Servicios y agendas de la página pública de reserva"""
+    transaction.on_commit(lambda: invalidar_catalogo_prestador(instance.prestador_id))
+
+
+@receiver(post_init, sender=PerfilPrestador)
+def guardar_slug_original(sender, instance, **kwargs):
+    instance._slug_original = instance.slug
+
+
+@receiver([post_save, post_delete], sender=PerfilPrestador)
+def invalidar_catalogo_perfil(sender, instance, **kwargs):
+    """Datos del prestador en la página pública (también bajo el slug anterior)"""
+    slugs = (instance._slug_original, instance.slug)
+    instance._slug_original = instance.slug
+    transaction.on_commit(lambda: invalidar_catalogo(*slugs))
+
+
+@receiver(post_init, sender=PerfilPrestador)
+def guardar_token_original(sender, instance, **kwargs):
+    instance._mp_access_token_original = instance.mp_access_token
+
+
+@receiver(post_save, sender=PerfilPrestador)
+def invalidar_cliente_mercadopago(sender, instance, **kwargs):
+    """Cerrar el cliente de MercadoPago del token anterior"""
+    anterior = instance._mp_access_token_original
+    instance._mp_access_token_original = instance.mp_access_token
+    if anterior and anterior != instance.mp_access_token:
+        registro_clientes.invalidar(anterior)
+
+
+@receiver(post_init, sender=Notificacion)
+def guardar_leida_original(sender, instance, **kwargs):
+    instance._leida_original = instance.leida
+
+
+@receiver(post_save, sender=Notificacion)
+def actualizar_no_leidas(sender, instance, created, **kwargs):
+    """Contador de no leídas del usuario"""
+    # Sin receptor de post_delete, para que los DELETE masivos sigan siendo
+    # directos: quien borra no leídas usa notificaciones.eliminar_notificaciones.
+    antes = 0 if created else int(not instance._leida_original)
+    instance._leida_original = instance.leida
+    delta = int(not instance.leida) - antes
+    if delta:
+        transaction.on_commit(lambda: sumar_no_leidas(instance.usuario_id, delta))
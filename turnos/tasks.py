@@ -1,9 +1,36 @@
-from celery import shared_task
-from django.core.mail import send_mail
+import tempfile
+import time
+from itertools import groupby
+
+from celery import chord, shared_task
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMessage, get_connection, send_mail
 from django.conf import settings
+from django.db.models import Sum
+from django.urls import reverse
 from django.utils import timezone
-from datetime import timedelta
-from .models import Reserva, Notificacion, Usuario
+from datetime import datetime, timedelta, timezone as dt_timezone
+from .models import Reserva, Notificacion, Usuario, ResumenDiario
+from .estadisticas import invalidar_estadisticas
+from . import particiones
+from .notificaciones import crear_notificaciones
+from .resumenes import ESTADOS_INGRESOS, cambiar_estado, ingresos
+from .comprobantes import escribir_pdf, partes_zip
+from .exportacion import filtrar_reservas
+from .pagos import MercadoPagoError, MercadoPagoNoDisponible, crear_preferencia, crear_devolucion
+
+# Recordatorios y reportes enviados por cada conexión SMTP
+TAMANO_LOTE_RECORDATORIOS = 200
+TAMANO_LOTE_REPORTES = 100
+
+# Reintentos de una tarea de recordatorios ante errores de conexión SMTP
+MAX_FALLOS_SMTP = 3
+
+# Limpieza de notificaciones: filas por DELETE y segundos entre lotes
+TAMANO_LOTE_LIMPIEZA = 5000
+PAUSA_LIMPIEZA = 0.5
 
 @shared_task
 def enviar_email_confirmacion_reserva(reserva_id):
@@ -11,7 +38,7 @@ def enviar_email_confirmacion_reserva(reserva_id):
     try:
         reserva = Reserva.objects.get(id=reserva_id)
         
-        asunto = f'Reserva Confirmada - {reserva.agenda.prestador.nombre_negocio}'
+        asunto = f'Reserva Confirmada - {reserva.prestador.nombre_negocio}'
         mensaje = f"""
         Hola {reserva.cliente.nombre},
         
@@ -21,16 +48,16 @@ def enviar_email_confirmacion_reserva(reserva_id):
         - Servicio: {reserva.servicio.nombre}
         - Fecha: {reserva.fecha.strftime('%d/%m/%Y')}
         - Hora: {reserva.hora_inicio.strftime('%H:%M')}
-        - Lugar: {reserva.agenda.prestador.nombre_negocio}
-        {f'- Dirección: {reserva.agenda.prestador.direccion}' if reserva.agenda.prestador.direccion else ''}
+        - Lugar: {reserva.prestador.nombre_negocio}
+        {f'- Dirección: {reserva.prestador.direccion}' if reserva.prestador.direccion else ''}
         
         Código de reserva: {reserva.codigo}
         
-        Recuerda que puedes cancelar tu reserva hasta {reserva.agenda.prestador.horas_cancelacion_con_devolucion} horas antes para obtener reembolso completo.
+        Recuerda que puedes cancelar tu reserva hasta {reserva.prestador.horas_cancelacion_con_devolucion} horas antes para obtener reembolso completo.
         
         ¡Te esperamos!
         
-        {reserva.agenda.prestador.nombre_negocio}
+        {reserva.prestador.nombre_negocio}
         """
         
         send_mail(
@@ -42,9 +69,9 @@ def enviar_email_confirmacion_reserva(reserva_id):
         )
         
         # Crear notificación para el prestador
-        if reserva.agenda.prestador.usuario:
+        if reserva.prestador.usuario:
             Notificacion.objects.create(
-                usuario=reserva.agenda.prestador.usuario,
+                usuario=reserva.prestador.usuario,
                 tipo='nueva_reserva',
                 titulo='Nueva Reserva',
                 mensaje=f'Nueva reserva de {reserva.cliente.nombre} {reserva.cliente.apellido} para {reserva.servicio.nombre}',
@@ -62,7 +89,7 @@ def enviar_email_cancelacion(reserva_id, motivo=''):
     try:
         reserva = Reserva.objects.get(id=reserva_id)
         
-        asunto = f'Reserva Cancelada - {reserva.agenda.prestador.nombre_negocio}'
+        asunto = f'Reserva Cancelada - {reserva.prestador.nombre_negocio}'
         mensaje = f"""
         Hola {reserva.cliente.nombre},
         
@@ -80,7 +107,7 @@ def enviar_email_cancelacion(reserva_id, motivo=''):
         
         Puedes hacer una nueva reserva cuando lo desees.
         
-        {reserva.agenda.prestador.nombre_negocio}
+        {reserva.prestador.nombre_negocio}
         """
         
         send_mail(
@@ -96,57 +123,167 @@ def enviar_email_cancelacion(reserva_id, motivo=''):
         print(f"Error enviando email de cancelación: {e}")
         return False
 
+def _email_recordatorio(reserva, conexion):
+    mensaje = f"""
+    Hola {reserva.cliente.nombre},
+    
+    Te recordamos que tienes una reserva para mañana.
+    
+    Detalles:
+    - Servicio: {reserva.servicio.nombre}
+    - Fecha: {reserva.fecha.strftime('%d/%m/%Y')}
+    - Hora: {reserva.hora_inicio.strftime('%H:%M')}
+    - Lugar: {reserva.prestador.nombre_negocio}
+    {f'- Dirección: {reserva.prestador.direccion}' if reserva.prestador.direccion else ''}
+    
+    ¡Te esperamos!
+    
+    {reserva.prestador.nombre_negocio}
+    """
+    return EmailMessage(
+        'Recordatorio: Tu reserva es mañana',
+        mensaje,
+        settings.DEFAULT_FROM_EMAIL,
+        [reserva.cliente.email],
+        connection=conexion,
+    )
+
+def _cupo_smtp(cantidad):
+    """
+    Cuántos de `cantidad` envíos entran en el minuto actual según
+    RECORDATORIOS_POR_MINUTO. El contador está en la cache compartida, así
+    vale para todos los workers.
+    """
+    limite = settings.RECORDATORIOS_POR_MINUTO
+    if not limite:
+        return cantidad
+    clave = f'smtp:envios:{settings.EMAIL_HOST}:{int(time.time() // 60)}'
+    cache.add(clave, 0, 120)
+    try:
+        usados = cache.incr(clave, cantidad)
+    except ValueError:
+        # La clave expiró entre add e incr
+        return 0
+    return max(0, min(cantidad, limite - (usados - cantidad)))
+
+def _registrar_recordatorios(enviadas):
+    """Marca los recordatorios como enviados y crea las notificaciones en un solo INSERT"""
+    Reserva.objects.filter(id__in=[r.id for r in enviadas]).update(fecha_recordatorio=timezone.now())
+    crear_notificaciones([
+        Notificacion(
+            usuario_id=reserva.cliente.usuario_id,
+            tipo='recordatorio',
+            titulo='Recordatorio de Reserva',
+            mensaje=f'Tu reserva es mañana a las {reserva.hora_inicio.strftime("%H:%M")}',
+            reserva=reserva
+        )
+        for reserva in enviadas if reserva.cliente.usuario_id
+    ])
+
+def _enviar_lote_recordatorios(reservas):
+    """
+    Envía los recordatorios de un lote por una única conexión SMTP y devuelve
+    la cantidad de errores. Si no se puede (re)abrir la conexión la excepción
+    sigue de largo; lo enviado hasta ahí queda registrado igual.
+    """
+    enviadas = []
+    conexion = get_connection()
+    try:
+        conexion.open()
+        for reserva in reservas:
+            try:
+                conexion.send_messages([_email_recordatorio(reserva, conexion)])
+                enviadas.append(reserva)
+            except Exception as e:
+                print(f"Error enviando recordatorio para reserva {reserva.id}: {e}")
+                # El servidor pudo cerrar la conexión: abrir una nueva
+                conexion.close()
+                conexion.open()
+    finally:
+        conexion.close()
+        _registrar_recordatorios(enviadas)
+    return len(reservas) - len(enviadas)
+
+def _recordatorios_pendientes(fecha):
+    return Reserva.objects.filter(
+        fecha=fecha,
+        estado='confirmada',
+        fecha_recordatorio__isnull=True
+    )
+
 @shared_task
 def enviar_recordatorios_diarios():
-    """Enviar recordatorios de reservas para el día siguiente"""
+    """Enviar recordatorios de reservas para el día siguiente, una tarea por prestador"""
     mañana = timezone.now().date() + timedelta(days=1)
     
-    reservas = Reserva.objects.filter(
-        fecha=mañana,
-        estado='confirmada'
-    ).select_related('cliente', 'servicio', 'agenda__prestador')
+    prestadores = list(
+        _recordatorios_pendientes(mañana).order_by().values_list('prestador_id', flat=True).distinct()
+    )
+    if not prestadores:
+        return "No hay recordatorios pendientes"
     
-    for reserva in reservas:
-        try:
-            asunto = f'Recordatorio: Tu reserva es mañana'
-            mensaje = f"""
-            Hola {reserva.cliente.nombre},
-            
-            Te recordamos que tienes una reserva para mañana.
-            
-            Detalles:
-            - Servicio: {reserva.servicio.nombre}
-            - Fecha: {reserva.fecha.strftime('%d/%m/%Y')}
-            - Hora: {reserva.hora_inicio.strftime('%H:%M')}
-            - Lugar: {reserva.agenda.prestador.nombre_negocio}
-            {f'- Dirección: {reserva.agenda.prestador.direccion}' if reserva.agenda.prestador.direccion else ''}
-            
-            ¡Te esperamos!
-            
-            {reserva.agenda.prestador.nombre_negocio}
-            """
-            
-            send_mail(
-                asunto,
-                mensaje,
-                settings.DEFAULT_FROM_EMAIL,
-                [reserva.cliente.email],
-                fail_silently=True,
-            )
-            
-            # Crear notificación
-            if reserva.cliente.usuario:
-                Notificacion.objects.create(
-                    usuario=reserva.cliente.usuario,
-                    tipo='recordatorio',
-                    titulo='Recordatorio de Reserva',
-                    mensaje=f'Tu reserva es mañana a las {reserva.hora_inicio.strftime("%H:%M")}',
-                    reserva=reserva
+    chord(
+        enviar_recordatorios_prestador.s(prestador_id, mañana.isoformat())
+        for prestador_id in prestadores
+    )(resumir_recordatorios.s())
+    
+    return f"Recordatorios repartidos en {len(prestadores)} tareas"
+
+@shared_task(bind=True, acks_late=True, max_retries=None)
+def enviar_recordatorios_prestador(self, prestador_id, fecha, desde_id=0, enviados=0, errores=0, fallos_smtp=0):
+    """
+    Recordatorios de un prestador para `fecha`, por lotes de reservas aún no
+    recordadas con id mayor a `desde_id`.
+    
+    Cuando se agota el cupo SMTP del minuto la tarea se reprograma (countdown)
+    para el minuto siguiente, a partir de la última reserva procesada, en vez
+    de esperar en el worker con la conexión abierta. Los errores de conexión
+    SMTP se reintentan con backoff hasta MAX_FALLOS_SMTP veces.
+    """
+    reservas = _recordatorios_pendientes(fecha).filter(
+        prestador_id=prestador_id
+    ).select_related('cliente', 'servicio', 'prestador').order_by('id')
+    
+    def progreso(**extra):
+        return {'desde_id': desde_id, 'enviados': enviados, 'errores': errores, 'fallos_smtp': fallos_smtp, **extra}
+    
+    while True:
+        lote = list(reservas.filter(id__gt=desde_id)[:TAMANO_LOTE_RECORDATORIOS])
+        if not lote:
+            break
+        cupo = _cupo_smtp(len(lote))
+        if cupo:
+            try:
+                errores_lote = _enviar_lote_recordatorios(lote[:cupo])
+            except Exception as e:
+                if fallos_smtp >= MAX_FALLOS_SMTP:
+                    print(f"Error enviando recordatorios del prestador {prestador_id}: {e}")
+                    return {'prestador_id': prestador_id, 'enviados': enviados, 'errores': errores, 'fallo': str(e)}
+                # Las ya enviadas del lote quedaron registradas y no se repiten
+                raise self.retry(
+                    exc=e, countdown=min(2 ** fallos_smtp * 60, 900),
+                    kwargs=progreso(fallos_smtp=fallos_smtp + 1)
                 )
-        except Exception as e:
-            print(f"Error enviando recordatorio para reserva {reserva.id}: {e}")
+            enviados += cupo - errores_lote
+            errores += errores_lote
+            desde_id = lote[cupo - 1].id
+        if cupo < len(lote):
+            raise self.retry(countdown=60 - time.time() % 60, kwargs=progreso())
     
-    return f"Enviados {len(reservas)} recordatorios"
+    return {'prestador_id': prestador_id, 'enviados': enviados, 'errores': errores}
+
+@shared_task
+def resumir_recordatorios(resultados):
+    """Resumen de los recordatorios enviados por cada prestador"""
+    enviados = sum(r['enviados'] for r in resultados)
+    errores = sum(r['errores'] for r in resultados)
+    fallidos = [r['prestador_id'] for r in resultados if 'fallo' in r]
+    
+    resumen = f"Enviados {enviados} recordatorios ({errores} con error)"
+    if fallidos:
+        resumen += f"; prestadores sin terminar: {fallidos}"
+    print(resumen)
+    return resumen
 
 @shared_task
 def marcar_reservas_no_asistidas():
@@ -158,66 +295,112 @@ def marcar_reservas_no_asistidas():
         estado='confirmada'
     )
     
-    cantidad = reservas.update(estado='no_asistio')
+    prestadores = set(reservas.values_list('prestador_id', flat=True).distinct())
+    cantidad = cambiar_estado(reservas, 'no_asistio')
+    
+    # El cambio masivo no dispara señales
+    for prestador_id in prestadores:
+        invalidar_estadisticas(prestador_id)
     
     return f"Marcadas {cantidad} reservas como no asistidas"
 
-@shared_task
-def limpiar_notificaciones_antiguas():
-    """Eliminar notificaciones leídas con más de 30 días"""
-    hace_30_dias = timezone.now() - timedelta(days=30)
+@shared_task(bind=True)
+def limpiar_notificaciones_antiguas(self):
+    """
+    Eliminar notificaciones leídas con más de 30 días, por lotes y con pausas
+    para no retener bloqueos ni generar una ráfaga de WAL.
     
-    cantidad = Notificacion.objects.filter(
+    Si la tabla está particionada la retención es por mes: se eliminan enteras
+    las particiones vencidas y los lotes sólo borran las leídas anteriores a
+    ese límite, que son las no leídas que las particiones pasaron a la
+    partición por defecto y se leyeron después.
+    """
+    limite = timezone.now() - timedelta(days=30)
+    
+    particiones_eliminadas = 0
+    if particiones.esta_particionada():
+        hoy = timezone.localdate()
+        inicio_retencion = particiones.sumar_meses(hoy, -settings.NOTIFICACIONES_RETENCION_MESES)
+        particiones.crear_particiones(hoy, settings.NOTIFICACIONES_MESES_ADELANTADOS)
+        particiones_eliminadas = particiones.eliminar_particiones_anteriores(inicio_retencion)
+        # Los límites de las particiones son fechas en UTC (la zona de la conexión)
+        limite = datetime(inicio_retencion.year, inicio_retencion.month, 1, tzinfo=dt_timezone.utc)
+    
+    antiguas = Notificacion.objects.filter(
         leida=True,
-        fecha_creacion__lt=hace_30_dias
-    ).delete()[0]
+        fecha_creacion__lt=limite
+    ).order_by()
     
-    return f"Eliminadas {cantidad} notificaciones antiguas"
-
-@shared_task
-def generar_reporte_diario_prestador(prestador_id):
-    """Generar y enviar reporte diario al prestador"""
-    from .models import PerfilPrestador
+    cantidad = 0
+    while True:
+        ids = list(antiguas.values_list('id', flat=True)[:TAMANO_LOTE_LIMPIEZA])
+        if not ids:
+            break
+        cantidad += Notificacion.objects.filter(id__in=ids).delete()[0]
+        if self.request.id:
+            self.update_state(state='PROGRESS', meta={'eliminadas': cantidad})
+        print(f"Limpieza de notificaciones: {cantidad} eliminadas")
+        time.sleep(PAUSA_LIMPIEZA)
     
-    try:
-        prestador = PerfilPrestador.objects.get(id=prestador_id)
-        hoy = timezone.now().date()
-        
-        reservas_hoy = Reserva.objects.filter(
-            agenda__prestador=prestador,
-            fecha=hoy
-        ).select_related('cliente', 'servicio')
-        
-        if not reservas_hoy.exists():
-            return "No hay reservas para hoy"
-        
-        # Construir mensaje
-        mensaje = f"""
+    resultado = f"Eliminadas {cantidad} notificaciones antiguas"
+    if particiones_eliminadas:
+        resultado += f" y {particiones_eliminadas} particiones vencidas"
+    return resultado
+
+def _mensaje_reporte_diario(hoy, reservas, ingresos_dia):
+    """Texto del reporte diario a partir de las reservas del día ordenadas por hora"""
+    mensaje = f"""
         Buenos días,
         
         Reporte de turnos para hoy {hoy.strftime('%d/%m/%Y')}:
         
-        Total de reservas: {reservas_hoy.count()}
+        Total de reservas: {len(reservas)}
         
         Detalle:
         """
+    
+    for reserva in reservas:
+        estado_emoji = {
+            'confirmada': '✅',
+            'pendiente': '⏳',
+            'cancelada': '❌'
+        }.get(reserva.estado, '❓')
         
-        for reserva in reservas_hoy.order_by('hora_inicio'):
-            estado_emoji = {
-                'confirmada': '✅',
-                'pendiente': '⏳',
-                'cancelada': '❌'
-            }.get(reserva.estado, '❓')
-            
-            mensaje += f"""
+        mensaje += f"""
         {estado_emoji} {reserva.hora_inicio.strftime('%H:%M')} - {reserva.cliente.nombre} {reserva.cliente.apellido}
            Servicio: {reserva.servicio.nombre}
            Tel: {reserva.cliente.telefono or 'N/A'}
         """
+    
+    mensaje += f"\n\nIngresos del día: ${ingresos_dia}"
+    return mensaje
+
+def _notificacion_reporte_diario(prestador, cantidad):
+    return Notificacion(
+        usuario=prestador.usuario,
+        tipo='recordatorio',
+        titulo='Reporte Diario',
+        mensaje=f'Tienes {cantidad} reservas para hoy'
+    )
+
+@shared_task
+def generar_reporte_diario_prestador(prestador_id):
+    """Generar y enviar reporte diario al prestador"""
+    from .models import PerfilPrestador
+    
+    try:
+        prestador = PerfilPrestador.objects.select_related('usuario').get(id=prestador_id)
+        hoy = timezone.now().date()
+        
+        reservas_hoy = list(Reserva.objects.filter(
+            prestador=prestador,
+            fecha=hoy
+        ).select_related('cliente', 'servicio').order_by('hora_inicio'))
+        
+        if not reservas_hoy:
+            return "No hay reservas para hoy"
         
-        # Calcular ingresos esperados
-        ingresos = sum(r.monto_pagado for r in reservas_hoy if r.estado in ['confirmada', 'completada'])
-        mensaje += f"\n\nIngresos del día: ${ingresos}"
+        mensaje = _mensaje_reporte_diario(hoy, reservas_hoy, ingresos(prestador.id, hoy, hoy))
         
         # Enviar email
         send_mail(
@@ -229,51 +412,195 @@ def generar_reporte_diario_prestador(prestador_id):
         )
         
         # Crear notificación
-        Notificacion.objects.create(
-            usuario=prestador.usuario,
-            tipo='recordatorio',
-            titulo='Reporte Diario',
-            mensaje=f'Tienes {reservas_hoy.count()} reservas para hoy'
-        )
+        _notificacion_reporte_diario(prestador, len(reservas_hoy)).save()
         
         return f"Reporte enviado a {prestador.nombre_negocio}"
     except Exception as e:
         print(f"Error generando reporte diario: {e}")
         return f"Error: {e}"
 
+def _enviar_lote_reportes(reportes):
+    """
+    Envía los reportes (prestador, EmailMessage, cantidad) por una única
+    conexión SMTP y crea sus notificaciones en un solo INSERT. Devuelve la
+    cantidad de errores.
+    """
+    enviados = 0
+    conexion = get_connection()
+    try:
+        conexion.open()
+        for prestador, email, _ in reportes:
+            try:
+                email.connection = conexion
+                conexion.send_messages([email])
+                enviados += 1
+            except Exception as e:
+                print(f"Error enviando reporte diario a {prestador.nombre_negocio}: {e}")
+                conexion.close()
+                conexion.open()
+    except Exception as e:
+        print(f"Error de conexión SMTP enviando reportes diarios: {e}")
+    finally:
+        conexion.close()
+    
+    crear_notificaciones([
+        _notificacion_reporte_diario(prestador, cantidad) for prestador, _, cantidad in reportes
+    ])
+    return len(reportes) - enviados
+
 @shared_task
-def procesar_devolucion_mercadopago(reserva_id):
-    """Procesar devolución en MercadoPago"""
+def generar_reportes_para_todos_prestadores():
+    """
+    Reporte diario de todos los prestadores activos: una sola consulta de
+    reservas ordenada por prestador y hora, agrupada en Python, y envío por
+    lotes sobre una conexión SMTP compartida.
+    """
+    hoy = timezone.now().date()
+    
+    ingresos_por_prestador = dict(
+        ResumenDiario.objects.filter(fecha=hoy, estado__in=ESTADOS_INGRESOS)
+        .values('prestador_id').annotate(total=Sum('monto_pagado'))
+        .values_list('prestador_id', 'total').order_by()
+    )
+    
+    reservas = Reserva.objects.filter(
+        fecha=hoy,
+        prestador__activo=True
+    ).select_related('cliente', 'servicio', 'prestador__usuario').order_by('prestador_id', 'hora_inicio')
+    
+    enviados = errores = 0
+    lote = []
+    for _, grupo in groupby(reservas.iterator(chunk_size=2000), key=lambda r: r.prestador_id):
+        reservas_prestador = list(grupo)
+        prestador = reservas_prestador[0].prestador
+        email = EmailMessage(
+            f'Reporte Diario - {hoy.strftime("%d/%m/%Y")}',
+            _mensaje_reporte_diario(hoy, reservas_prestador, ingresos_por_prestador.get(prestador.id, 0)),
+            settings.DEFAULT_FROM_EMAIL,
+            [prestador.usuario.email],
+        )
+        lote.append((prestador, email, len(reservas_prestador)))
+        if len(lote) == TAMANO_LOTE_REPORTES:
+            errores += _enviar_lote_reportes(lote)
+            enviados += len(lote)
+            lote = []
+    if lote:
+        errores += _enviar_lote_reportes(lote)
+        enviados += len(lote)
+    
+    return f"Enviados {enviados - errores} reportes diarios ({errores} con error)"
+
+@shared_task
+def generar_comprobantes_lote(prestador_id, filtros, formato):
+    """
+    Comprobantes de las reservas filtradas en un PDF o un ZIP, guardado en
+    el storage (comprobantes/<prestador>/) por COMPROBANTES_LOTE_RETENCION_DIAS
+    (ver limpiar_comprobantes_lote). Avisa al prestador con una notificación
+    que enlaza a la descarga.
+    """
+    from .models import PerfilPrestador
+    
     try:
-        import mercadopago
-        reserva = Reserva.objects.get(id=reserva_id)
-        prestador = reserva.agenda.prestador
-        
-        if not reserva.mp_payment_id:
-            return "No hay pago asociado"
-        
-        # Verificar si corresponde devolución
-        if not reserva.puede_cancelar_con_devolucion():
-            return "No corresponde devolución por política de cancelación"
-        
-        # Procesar devolución
-        sdk = mercadopago.SDK(prestador.mp_access_token)
-        refund = sdk.refund().create(reserva.mp_payment_id)
-        
-        if refund["status"] == 201:
-            reserva.estado_pago = 'devuelto'
-            reserva.save()
-            
-            # Notificar al cliente
-            enviar_email_devolucion.delay(reserva_id)
-            
-            return "Devolución procesada exitosamente"
-        else:
-            return f"Error procesando devolución: {refund}"
+        prestador = PerfilPrestador.objects.select_related('usuario').get(id=prestador_id)
+        reservas = filtrar_reservas(prestador_id, filtros)
+        
+        with tempfile.TemporaryFile() as archivo:
+            if formato == 'zip':
+                for parte in partes_zip(reservas):
+                    archivo.write(parte)
+            else:
+                escribir_pdf(reservas, archivo)
+            archivo.seek(0)
+            nombre = default_storage.save(
+                f'comprobantes/{prestador_id}/comprobantes_{timezone.now():%Y%m%d_%H%M%S}.{formato}',
+                File(archivo)
+            )
+        
+        url = reverse('reservas_comprobantes_archivo', args=[nombre.rsplit('/', 1)[-1]])
+        crear_notificaciones([Notificacion(
+            usuario=prestador.usuario,
+            tipo='comprobantes',
+            titulo='Comprobantes listos',
+            mensaje=f'Los comprobantes que pediste están listos: {url}'
+        )])
+        
+        return f"Comprobantes generados: {nombre}"
     except Exception as e:
-        print(f"Error procesando devolución: {e}")
+        print(f"Error generando comprobantes: {e}")
         return f"Error: {e}"
 
+@shared_task
+def limpiar_comprobantes_lote():
+    """Eliminar los archivos de comprobantes en lote más viejos que la retención"""
+    limite = timezone.now() - timedelta(days=settings.COMPROBANTES_LOTE_RETENCION_DIAS)
+    eliminados = 0
+    
+    directorios, _ = default_storage.listdir('comprobantes') if default_storage.exists('comprobantes') else ([], [])
+    for directorio in directorios:
+        _, archivos = default_storage.listdir(f'comprobantes/{directorio}')
+        for archivo in archivos:
+            ruta = f'comprobantes/{directorio}/{archivo}'
+            if default_storage.get_modified_time(ruta) < limite:
+                default_storage.delete(ruta)
+                eliminados += 1
+    
+    return f"Archivos de comprobantes eliminados: {eliminados}"
+
+@shared_task
+def crear_preferencia_mercadopago(reserva_id, back_urls):
+    """Crear la preferencia de pago de una reserva fuera de la solicitud HTTP"""
+    reserva = Reserva.objects.select_related('prestador', 'servicio').get(id=reserva_id)
+    
+    if reserva.mp_preference_id:
+        return "Preferencia ya creada"
+    
+    try:
+        crear_preferencia(reserva, back_urls)
+    except MercadoPagoNoDisponible as e:
+        # Reintentar con espera creciente mientras MercadoPago no responda
+        intentos = crear_preferencia_mercadopago.request.retries
+        raise crear_preferencia_mercadopago.retry(exc=e, countdown=min(2 ** intentos * 5, 300), max_retries=8)
+    except MercadoPagoError as e:
+        print(f"Error creando preferencia para reserva {reserva_id}: {e}")
+        return f"Error: {e}"
+    
+    return f"Preferencia creada para reserva {reserva.codigo}"
+
+@shared_task
+def procesar_devolucion_mercadopago(reserva_id):
+    """Procesar devolución en MercadoPago"""
+    reserva = Reserva.objects.select_related('prestador').get(id=reserva_id)
+    
+    if not reserva.mp_payment_id:
+        return "No hay pago asociado"
+    
+    if reserva.estado_pago == 'devuelto':
+        return "Devolución ya procesada"
+    
+    # La política de cancelación se evalúa en el primer intento; los
+    # reintentos no deben perder la devolución porque pasó el plazo
+    intentos = procesar_devolucion_mercadopago.request.retries
+    if not intentos and not reserva.puede_cancelar_con_devolucion():
+        return "No corresponde devolución por política de cancelación"
+    
+    # Procesar devolución
+    try:
+        crear_devolucion(reserva)
+    except MercadoPagoNoDisponible as e:
+        # Reintentar con espera creciente mientras MercadoPago no responda
+        raise procesar_devolucion_mercadopago.retry(exc=e, countdown=min(2 ** intentos * 5, 300), max_retries=12)
+    except MercadoPagoError as e:
+        print(f"Error procesando devolución de reserva {reserva_id}: {e}")
+        return f"Error procesando devolución: {e}"
+    
+    reserva.estado_pago = 'devuelto'
+    reserva.save()
+    
+    # Notificar al cliente
+    enviar_email_devolucion.delay(reserva_id)
+    
+    return "Devolución procesada exitosamente"
+
 @shared_task
 def enviar_email_devolucion(reserva_id):
     """Enviar email confirmando devolución"""
@@ -294,7 +621,7 @@ def enviar_email_devolucion(reserva_id):
         
         Gracias por tu comprensión.
         
-        {reserva.agenda.prestador.nombre_negocio}
+        {reserva.prestador.nombre_negocio}
         """
         
         send_mail(
@@ -1,3 +1,1291 @@
-from django.test import TestCase
+import asyncio
+import csv
+import itertools
+import os
+import random
+import zipfile
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.core import mail
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.db.models import Sum, Value
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from .models import Usuario, PerfilPrestador, Agenda, Servicio, Cliente, Reserva, ResumenDiario, Notificacion
+from .estadisticas import estadisticas_prestador
+from .mercadopago_fake import ServidorMercadoPagoFake
+from .pagos import (
+    MercadoPagoError, MercadoPagoNoDisponible, RegistroClientesMercadoPago,
+    circuito_abierto, ejecutar, registro_clientes, sdk_para
+)
+from .busqueda import buscar_clientes
+from .paginacion import Fila, paginar
+from .resumenes import cambiar_estado, reconstruir
+from . import particiones, tasks
+from .notificaciones import (
+    crear_notificaciones, eliminar_notificaciones, marcar_leidas, no_leidas, sumar_no_leidas
+)
+from . import eventos
+from .eventos import tipo_evento
+from .backends import UsuarioBackend
+from .decorators import prestador_requerido, prestador_requerido_api
+from . import catalogo, comprobantes, disponibilidad, notificaciones, versiones
+from .comprobantes import escribir_pdf, partes_zip
+from .exportacion import COLUMNAS_CLIENTES, filas_clientes, respuesta_csv, respuesta_xlsx
+from .disponibilidad import (
+    agendas_activas, calcular_slots, intervalos_ocupados, invalidar_agenda, obtener_agenda
+)
+
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(
+    CACHES=CACHE_LOCAL,
+    MERCADOPAGO_TIMEOUT=0.5,
+    MERCADOPAGO_MAX_REINTENTOS=0,
+    MERCADOPAGO_CIRCUITO_UMBRAL=2,
+)
+class MercadoPagoTests(SimpleTestCase):
+    """Cliente de MercadoPago contra el servidor falso"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.servidor = ServidorMercadoPagoFake().iniciar()
+        self.addCleanup(self.servidor.detener)
+        ajustes = override_settings(MERCADOPAGO_API_URL=self.servidor.url)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        registro_clientes.limpiar()
+        self.sdk = sdk_para('TEST-token')
+
+    def test_crear_preferencia(self):
+        preferencia = ejecutar(self.sdk.preference().create, {
+            'items': [{'title': 'Corte', 'quantity': 1, 'unit_price': 100.0}],
+            'external_reference': 'abc',
+        })
+        self.assertTrue(preferencia['id'].startswith('pref-'))
+        self.assertIn(preferencia['id'], preferencia['init_point'])
+        self.assertEqual(self.servidor.solicitudes[0][0], '/checkout/preferences')
+
+    def test_devolucion(self):
+        devolucion = ejecutar(self.sdk.refund().create, '123')
+        self.assertEqual(devolucion['payment_id'], '123')
+
+    def test_error_de_cliente_no_abre_el_circuito(self):
+        self.servidor.status_error = 400
+        for _ in range(3):
+            with self.assertRaises(MercadoPagoError):
+                ejecutar(self.sdk.preference().create, {})
+        self.assertFalse(circuito_abierto())
+
+    def test_timeout_abre_el_circuito(self):
+        self.servidor.demora = 1
+        for _ in range(2):
+            with self.assertRaises(MercadoPagoNoDisponible):
+                ejecutar(self.sdk.preference().create, {})
+        self.assertTrue(circuito_abierto())
+
+        # Con el circuito abierto no se llama al servidor
+        self.servidor.demora = 0
+        llamadas = len(self.servidor.solicitudes)
+        with self.assertRaises(MercadoPagoNoDisponible):
+            ejecutar(self.sdk.preference().create, {})
+        self.assertEqual(len(self.servidor.solicitudes), llamadas)
+
+
+
+class DevolucionMercadoPagoTests(SimpleTestCase):
+    def setUp(self):
+        self.reserva = mock.Mock(mp_payment_id='123', estado_pago='total')
+        consulta = mock.patch.object(tasks.Reserva.objects, 'select_related')
+        consulta.start().return_value.get.return_value = self.reserva
+        self.addCleanup(consulta.stop)
+        email = mock.patch.object(tasks.enviar_email_devolucion, 'delay')
+        self.email = email.start()
+        self.addCleanup(email.stop)
+
+    def test_reintenta_mientras_mercadopago_no_responde(self):
+        fallos = [MercadoPagoNoDisponible('Circuito abierto')] * 2 + [{'id': 1}]
+        with mock.patch.object(tasks, 'crear_devolucion', side_effect=fallos) as crear_devolucion:
+            tasks.procesar_devolucion_mercadopago.apply(args=[1])
+        self.assertEqual(crear_devolucion.call_count, 3)
+        self.reserva.puede_cancelar_con_devolucion.assert_called_once()
+        self.assertEqual(self.reserva.estado_pago, 'devuelto')
+        self.email.assert_called_once_with(1)
+
+    def test_error_de_mercadopago_no_se_reintenta(self):
+        with mock.patch.object(tasks, 'crear_devolucion', side_effect=MercadoPagoError('Error 400')) as crear_devolucion:
+            resultado = tasks.procesar_devolucion_mercadopago.apply(args=[1]).get()
+        self.assertEqual(crear_devolucion.call_count, 1)
+        self.assertIn('Error 400', resultado)
+        self.email.assert_not_called()
+
+@override_settings(MERCADOPAGO_MAX_CLIENTES=2)
+class RegistroClientesMercadoPagoTests(SimpleTestCase):
+    """Reutilización de clientes por access token"""
+
+    def test_reutiliza_el_cliente_del_token(self):
+        registro = RegistroClientesMercadoPago()
+        self.assertIs(registro.obtener('a'), registro.obtener('a'))
+        metricas = registro.metricas()
+        self.assertEqual((metricas['aciertos'], metricas['fallos']), (1, 1))
+
+    def test_desaloja_el_menos_usado(self):
+        registro = RegistroClientesMercadoPago()
+        sdk_a = registro.obtener('a')
+        registro.obtener('b')
+        registro.obtener('a')
+        registro.obtener('c')
+
+        self.assertEqual(registro.metricas()['desalojos'], 1)
+        self.assertIs(registro.obtener('a'), sdk_a)
+        self.assertEqual(registro.metricas()['fallos'], 3)
+        registro.obtener('b')
+        self.assertEqual(registro.metricas()['fallos'], 4)
+
+    def test_invalidar(self):
+        registro = RegistroClientesMercadoPago()
+        sdk = registro.obtener('a')
+        registro.invalidar('a')
+        self.assertIsNot(registro.obtener('a'), sdk)
+
+
+class ExportacionTests(SimpleTestCase):
+    def clientes(self, *filas):
+        clientes = mock.Mock()
+        clientes.values_list.return_value.iterator.return_value = iter(filas)
+        return clientes
+
+    def test_fecha_de_registro_en_hora_local(self):
+        registro = datetime(2026, 10, 17, 2, 30, tzinfo=dt_timezone.utc)
+        fila, = filas_clientes(self.clientes(
+            ('Ana', 'Prueba', '1', 'ana@ejemplo.com', '', None, True, registro)
+        ))
+        # Buenos Aires es UTC-3: el registro fue el día anterior a las 23:30
+        self.assertEqual(fila[-1], datetime(2026, 10, 16, 23, 30))
+        self.assertEqual(fila[-2], 'Sí')
+
+    def test_csv_por_partes(self):
+        filas = [['Ana', 'Prueba'], ['José', 'Núñez']]
+        respuesta = respuesta_csv('clientes', COLUMNAS_CLIENTES[:2], iter(filas))
+        self.assertTrue(respuesta.streaming)
+        self.assertEqual(respuesta['Content-Disposition'], 'attachment; filename="clientes.csv"')
+        partes = list(respuesta.streaming_content)
+        self.assertEqual(len(partes), 3)
+        self.assertEqual(
+            b''.join(partes).decode('utf-8'),
+            '\ufeffNombre,Apellido\r\nAna,Prueba\r\nJosé,Núñez\r\n'
+        )
+
+    def test_formulas_escapadas(self):
+        fila = ['=HYPERLINK("http://x","y")', '+54 11', '-1', '@SUM(A1)', '\tx', 'Ana', Decimal('-5'), None]
+        esperada = ["'=HYPERLINK(\"http://x\",\"y\")", "'+54 11", "'-1", "'@SUM(A1)", "'\tx", 'Ana', Decimal('-5'), None]
+        columnas = [(str(n), str(n)) for n in range(len(fila))]
+
+        csv_ = b''.join(respuesta_csv('clientes', columnas, iter([fila])).streaming_content).decode('utf-8')
+        self.assertEqual(next(csv.reader(csv_.splitlines()[1:])), [str(v) if v is not None else '' for v in esperada])
+
+        xlsx = respuesta_xlsx('clientes', columnas, iter([fila]))
+        hoja = load_workbook(BytesIO(b''.join(xlsx.streaming_content)))['clientes']
+        self.assertEqual([c.data_type for c in hoja[2]][:6], ['s'] * 6)
+        self.assertEqual(hoja['A2'].value, esperada[0])
+
+    def test_xlsx(self):
+        registro = datetime(2026, 10, 16, 23, 30)
+        respuesta = respuesta_xlsx('clientes', COLUMNAS_CLIENTES, iter([
+            ['Ana', 'Prueba', '1', 'ana@ejemplo.com', '', None, 'No', registro]
+        ]))
+        self.assertTrue(respuesta.streaming)
+        libro = load_workbook(BytesIO(b''.join(respuesta.streaming_content)))
+        filas = list(libro['clientes'].values)
+        self.assertEqual(filas[0], tuple(titulo for titulo, _ in COLUMNAS_CLIENTES))
+        self.assertEqual(filas[1][0], 'Ana')
+        self.assertEqual(filas[1][-1], registro)
+
+
+@override_settings(VERSIONES_CACHE_TIMEOUT=3600)
+class VersionesCacheTests(SimpleTestCase):
+    def test_claves_de_version_vencen(self):
+        with mock.patch.object(versiones, 'cache') as cache_mock:
+            cache_mock.get_many.return_value = {}
+            cache_mock.incr.side_effect = ValueError
+            version = disponibilidad.version_dia(1, date(2026, 10, 19))
+            disponibilidad.invalidar_dia(1, date(2026, 10, 19))
+            catalogo.invalidar_catalogo('negocio')
+        self.assertRegex(version, r'^\d+-\d+$')
+        self.assertEqual(cache_mock.add.call_count, 4)
+        for llamada in cache_mock.add.call_args_list:
+            self.assertEqual(llamada.args[2], 3600)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class ContadorNoLeidasTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def contar(self, cantidad, durante=None):
+        """no_leidas con COUNT simulado; `durante` corre mientras se cuenta"""
+        def count():
+            if durante:
+                durante()
+            return cantidad
+
+        with mock.patch.object(notificaciones, 'Notificacion') as modelo:
+            modelo.objects.filter.return_value.count.side_effect = count
+            return no_leidas(1)
+
+    def test_cuenta_y_cachea(self):
+        self.assertEqual(self.contar(2), 2)
+        self.assertEqual(cache.get('notif:no_leidas:1'), 2)
+        sumar_no_leidas(1, 1)
+        self.assertEqual(no_leidas(1), 3)
+
+    def test_incremento_concurrente_no_se_pierde(self):
+        # Una notificación creada mientras se cuenta: su incr no se pierde ni
+        # queda guardado un valor que no se sabe si la incluye
+        self.assertEqual(self.contar(0, durante=lambda: sumar_no_leidas(1, 1)), 0)
+        self.assertIsNone(cache.get('notif:no_leidas:1'))
+        self.assertEqual(self.contar(1), 1)
+
+
+class CalcularSlotsTests(SimpleTestCase):
+    def setUp(self):
+        self.agenda = Agenda(
+            hora_inicio=time(9), hora_fin=time(12), lunes=True,
+            **{dia: False for dia in ('martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo')}
+        )
+        self.lunes = date(2026, 10, 19)
+
+    def test_agenda_vacia(self):
+        self.assertEqual(calcular_slots(self.agenda, self.lunes, 60, []), [540, 570, 600, 630, 660])
+
+    def test_dia_no_laborable(self):
+        self.assertEqual(calcular_slots(self.agenda, self.lunes + timedelta(days=1), 60, []), [])
+
+    def test_reservas_superpuestas(self):
+        reservas = [(time(9, 30), time(10, 30)), (time(9), time(10)), (time(10, 15), time(10, 45))]
+        self.assertEqual(intervalos_ocupados(reservas), [[540, 645]])
+        self.assertEqual(calcular_slots(self.agenda, self.lunes, 60, reservas), [660])
+
+    def test_reservas_contiguas_se_fusionan(self):
+        self.assertEqual(intervalos_ocupados([(time(10), time(11)), (time(9), time(10))]), [[540, 660]])
+
+    def test_reservas_en_los_bordes_de_la_jornada(self):
+        reservas = [(time(9), time(9, 30)), (time(11), time(12))]
+        self.assertEqual(calcular_slots(self.agenda, self.lunes, 60, reservas), [570, 600])
+
+    def test_duracion_mayor_que_la_jornada(self):
+        self.assertEqual(calcular_slots(self.agenda, self.lunes, 180, []), [540])
+        self.assertEqual(calcular_slots(self.agenda, self.lunes, 240, []), [])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Los planes de consulta requieren PostgreSQL')
+class PlanesConsultaReservasTests(TestCase):
+    """
+    Las consultas frecuentes sobre reservas deben resolverse con índices.
+
+    Carga un volumen grande de reservas (TURNOS_PLANES_RESERVAS, ~60k por
+    defecto), actualiza las estadísticas y verifica con EXPLAIN que ninguna
+    hace un Seq Scan sobre la tabla.
+    """
+
+    PRESTADORES = 40
+    AGENDAS_POR_PRESTADOR = 2
+    TURNOS_POR_DIA = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        total = int(os.environ.get('TURNOS_PLANES_RESERVAS', 60000))
+        dias = max(1, total // (cls.PRESTADORES * cls.AGENDAS_POR_PRESTADOR * cls.TURNOS_POR_DIA))
+        azar = random.Random(0)
+        cls.hoy = timezone.localdate()
+        inicio = cls.hoy - timedelta(days=dias // 2)
+
+        reservas = []
+        for n in range(cls.PRESTADORES):
+            usuario = Usuario.objects.create(username=f'prestador{n}', rol='prestador')
+            prestador = PerfilPrestador.objects.create(
+                usuario=usuario, nombre_negocio=f'Negocio {n}', slug=f'negocio-{n}'
+            )
+            servicio = Servicio.objects.create(
+                prestador=prestador, nombre='Corte', categoria='pelo',
+                precio=Decimal('1000'), duracion_minutos=60
+            )
+            clientes = Cliente.objects.bulk_create([
+                Cliente(prestador=prestador, nombre=f'Cliente {c}', apellido='Prueba',
+                        email=f'c{c}@ejemplo.com', dni=f'{n}{c:05d}')
+                for c in range(20)
+            ])
+            for a in range(cls.AGENDAS_POR_PRESTADOR):
+                agenda = Agenda.objects.create(prestador=prestador, nombre=f'Agenda {a}')
+                for d in range(dias):
+                    fecha = inicio + timedelta(days=d)
+                    for t in range(cls.TURNOS_POR_DIA):
+                        futura = fecha >= cls.hoy
+                        estado = azar.choices(
+                            ['pendiente', 'confirmada', 'cancelada', 'completada', 'no_asistio'],
+                            weights=[3, 6, 2, 1, 1] if futura else [0, 1, 2, 12, 1]
+                        )[0]
+                        reservas.append(Reserva(
+                            agenda=agenda, prestador=prestador, cliente=azar.choice(clientes), servicio=servicio,
+                            fecha=fecha, hora_inicio=time(9 + 2 * t), hora_fin=time(10 + 2 * t),
+                            estado=estado, monto_total=Decimal('1000'), monto_pagado=Decimal('500')
+                        ))
+        Reserva.objects.bulk_create(reservas, batch_size=5000)
+        reconstruir()
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE reservas')
+            cursor.execute('ANALYZE agendas')
+
+        cls.prestador = PerfilPrestador.objects.get(slug='negocio-7')
+        cls.agenda = cls.prestador.agendas.first()
+
+    def assertUsaIndices(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan on reservas', plan, plan)
+
+    def test_disponibilidad(self):
+        self.assertUsaIndices(Reserva.objects.filter(
+            agenda__in=[self.agenda.id],
+            fecha__in=[self.hoy + timedelta(days=n) for n in range(30)],
+            estado__in=Reserva.ESTADOS_ACTIVOS
+        ).values_list('agenda_id', 'fecha', 'hora_inicio', 'hora_fin'))
+
+    def test_dashboard(self):
+        reservas = Reserva.objects.filter(prestador=self.prestador)
+        self.assertUsaIndices(reservas.filter(fecha=self.hoy, estado='confirmada'))
+        self.assertUsaIndices(reservas.filter(estado='pendiente'))
+        self.assertUsaIndices(reservas.filter(
+            fecha__gte=self.hoy, estado='confirmada'
+        ).order_by('fecha', 'hora_inicio')[:10])
+
+    @override_settings(CACHES=CACHE_LOCAL)
+    def test_estadisticas_dashboard(self):
+        reservas = Reserva.objects.filter(prestador=self.prestador)
+        esperado = {
+            'reservas_hoy': reservas.filter(fecha=self.hoy, estado='confirmada').count(),
+            'reservas_pendientes': reservas.filter(estado='pendiente').count(),
+            'ingresos_mes': reservas.filter(
+                fecha__month=self.hoy.month, fecha__year=self.hoy.year,
+                estado__in=['confirmada', 'completada']
+            ).aggregate(total=Sum('monto_pagado'))['total'] or 0,
+        }
+        with self.assertNumQueries(1):
+            self.assertEqual(estadisticas_prestador(self.prestador.id, self.hoy), esperado)
+        with self.assertNumQueries(0):
+            estadisticas_prestador(self.prestador.id, self.hoy)
+
+    def test_listado_reservas(self):
+        reservas = Reserva.objects.filter(
+            prestador=self.prestador
+        ).select_related('cliente', 'servicio', 'agenda').order_by('-fecha', '-hora_inicio', '-id')
+        self.assertUsaIndices(reservas[:50])
+        self.assertUsaIndices(reservas.filter(
+            fecha__gte=self.hoy - timedelta(days=30), fecha__lte=self.hoy, estado='completada'
+        ))
+
+    def test_listado_paginado(self):
+        reservas = Reserva.objects.filter(prestador=self.prestador)
+        orden = ('-fecha', '-hora_inicio', '-id')
+        esperado = list(reservas.order_by(*orden).values_list('id', flat=True)[:30])
+
+        paginas, url = [], ''
+        for _ in range(3):
+            pagina = paginar(reservas, orden, RequestFactory().get(f'/reservas/{url}'), tamano=10)
+            paginas.append([r.id for r in pagina])
+            url = pagina.url_siguiente
+        self.assertEqual(sum(paginas, []), esperado)
+
+        anterior = paginar(reservas, orden, RequestFactory().get(f'/reservas/{pagina.url_anterior}'), tamano=10)
+        self.assertEqual([r.id for r in anterior], paginas[1])
+
+        ultima = pagina.objetos[-1]
+        self.assertUsaIndices(reservas.alias(
+            clave=Fila('fecha', 'hora_inicio', 'id')
+        ).filter(
+            clave__lt=Fila(Value(ultima.fecha), Value(ultima.hora_inicio), Value(ultima.id))
+        ).order_by(*orden)[:11])
+
+    def test_recordatorios_y_no_asistidas(self):
+        self.assertUsaIndices(Reserva.objects.filter(
+            fecha=self.hoy + timedelta(days=1), estado='confirmada'
+        ).select_related('cliente', 'servicio', 'prestador'))
+        self.assertUsaIndices(Reserva.objects.filter(
+            fecha=self.hoy - timedelta(days=1), estado='confirmada'
+        ))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'El resumen diario usa INSERT ... ON CONFLICT')
+class ResumenDiarioTests(TestCase):
+    """El resumen incremental coincide con el reconstruido desde las reservas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = Usuario.objects.create(username='prestador', rol='prestador')
+        cls.prestador = PerfilPrestador.objects.create(usuario=usuario, nombre_negocio='Negocio', slug='negocio')
+        cls.agendas = [Agenda.objects.create(prestador=cls.prestador, nombre=f'Agenda {a}') for a in range(2)]
+        cls.servicio = Servicio.objects.create(
+            prestador=cls.prestador, nombre='Corte', categoria='pelo',
+            precio=Decimal('1000'), duracion_minutos=60
+        )
+        cls.cliente = Cliente.objects.create(
+            prestador=cls.prestador, nombre='Ana', apellido='Prueba', email='ana@ejemplo.com', dni='1'
+        )
+        cls.hoy = timezone.localdate()
+
+    def crear_reserva(self, agenda, hora, **campos):
+        return Reserva.objects.create(
+            agenda=agenda, cliente=self.cliente, servicio=self.servicio, fecha=self.hoy,
+            hora_inicio=time(hora), hora_fin=time(hora + 1), monto_total=Decimal('1000'), **campos
+        )
+
+    def resumen(self):
+        return sorted(
+            ResumenDiario.objects.filter(cantidad__gt=0)
+            .values_list('agenda_id', 'fecha', 'estado', 'cantidad', 'monto_pagado')
+        )
+
+    def assertResumenCoincide(self):
+        incremental = self.resumen()
+        reconstruir()
+        self.assertEqual(incremental, self.resumen())
+
+    def test_altas_cambios_y_bajas(self):
+        primera = self.crear_reserva(self.agendas[0], 9, estado='confirmada', monto_pagado=Decimal('500'))
+        segunda = self.crear_reserva(self.agendas[0], 10)
+        self.crear_reserva(self.agendas[1], 9, estado='confirmada')
+        self.assertResumenCoincide()
+
+        primera.monto_pagado = Decimal('1000')
+        primera.estado = 'completada'
+        primera.save()
+        segunda.agenda = self.agendas[1]
+        segunda.hora_inicio, segunda.hora_fin = time(11), time(12)
+        segunda.save()
+        self.assertResumenCoincide()
+
+        Reserva.objects.get(pk=segunda.pk).delete()
+        self.assertResumenCoincide()
+
+    def test_cambio_masivo_de_estado(self):
+        for hora in (9, 10, 11):
+            self.crear_reserva(self.agendas[0], hora, estado='confirmada', monto_pagado=Decimal('300'))
+        self.crear_reserva(self.agendas[1], 9, estado='pendiente')
+
+        cantidad = cambiar_estado(Reserva.objects.filter(estado='confirmada'), 'no_asistio')
+        self.assertEqual(cantidad, 3)
+        self.assertResumenCoincide()
+
+
+@skipUnless(connection.vendor == 'postgresql', 'La búsqueda usa pg_trgm')
+class BusquedaClientesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = Usuario.objects.create(username='prestador', rol='prestador')
+        cls.prestador = PerfilPrestador.objects.create(usuario=usuario, nombre_negocio='Veterinaria', slug='veterinaria')
+        for nombre, apellido, dni, email in [
+            ('Ana', 'González', '30111222', 'ana@ejemplo.com'),
+            ('Mariana', 'Gonzalo', '30111999', 'mariana@ejemplo.com'),
+            ('Pedro', 'Álvarez', '27000111', 'pedro.alvarez@correo.com'),
+            ('Lucía', 'Fernandez', '28555666', 'lucia@correo.com'),
+        ]:
+            Cliente.objects.create(prestador=cls.prestador, nombre=nombre, apellido=apellido, dni=dni, email=email)
+
+    def buscar(self, q):
+        return [c.apellido for c in buscar_clientes(self.prestador.clientes.all(), q)]
+
+    def test_prefijo_de_dni(self):
+        self.assertEqual(self.buscar('30111'), ['González', 'Gonzalo'])
+
+    def test_prefijo_de_email(self):
+        self.assertEqual(self.buscar('pedro.alvarez@'), ['Álvarez'])
+
+    def test_subcadena_y_orden(self):
+        self.assertEqual(self.buscar('gonz'), ['González', 'Gonzalo'])
+        self.assertEqual(self.buscar('ana gonzález'), ['González'])
+
+    def test_aproximada(self):
+        self.assertEqual(self.buscar('fernandes'), ['Fernandez'])
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class RecordatoriosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = Usuario.objects.create(username='prestador', rol='prestador', email='negocio@ejemplo.com')
+        cls.prestador = prestador = PerfilPrestador.objects.create(usuario=usuario, nombre_negocio='Negocio', slug='negocio')
+        agenda = Agenda.objects.create(prestador=prestador, nombre='Agenda')
+        servicio = Servicio.objects.create(
+            prestador=prestador, nombre='Corte', categoria='pelo',
+            precio=Decimal('1000'), duracion_minutos=60
+        )
+        cls.mañana = mañana = timezone.now().date() + timedelta(days=1)
+        for n in range(5):
+            cliente = Cliente.objects.create(
+                prestador=prestador, nombre=f'Cliente {n}', apellido='Prueba', dni=str(n),
+                email=f'c{n}@ejemplo.com',
+                usuario=Usuario.objects.create(username=f'cliente{n}') if n % 2 else None
+            )
+            Reserva.objects.create(
+                agenda=agenda, cliente=cliente, servicio=servicio, fecha=mañana, estado='confirmada',
+                hora_inicio=time(9 + n), hora_fin=time(10 + n), monto_total=Decimal('1000')
+            )
+
+    def enviar(self):
+        return tasks.enviar_recordatorios_prestador(self.prestador.id, self.mañana.isoformat())
+
+    @mock.patch.object(tasks, 'TAMANO_LOTE_RECORDATORIOS', 2)
+    def test_envia_por_lotes(self):
+        self.assertEqual(self.enviar(), {'prestador_id': self.prestador.id, 'enviados': 5, 'errores': 0})
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(Notificacion.objects.filter(tipo='recordatorio').count(), 2)
+
+        # Un reintento no vuelve a enviar
+        self.assertEqual(self.enviar()['enviados'], 0)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_un_error_no_corta_el_lote(self):
+        original = tasks._email_recordatorio
+
+        def email(reserva, conexion):
+            if reserva.cliente.dni == '2':
+                raise ValueError('email inválido')
+            return original(reserva, conexion)
+
+        with mock.patch.object(tasks, '_email_recordatorio', email):
+            self.assertEqual(self.enviar()['errores'], 1)
+        self.assertEqual(len(mail.outbox), 4)
+
+        # La reserva que falló queda pendiente para el próximo intento
+        self.assertEqual(self.enviar()['enviados'], 1)
+
+    @override_settings(CACHES=CACHE_LOCAL, RECORDATORIOS_POR_MINUTO=2)
+    @mock.patch.object(tasks, 'TAMANO_LOTE_RECORDATORIOS', 2)
+    def test_cupo_por_minuto_reprograma_la_tarea(self):
+        # Cada lectura del reloj avanza medio minuto
+        reloj = mock.Mock(time=mock.Mock(side_effect=itertools.count(0, 30)))
+        with mock.patch.object(tasks, 'time', reloj), \
+                mock.patch.object(tasks.enviar_recordatorios_prestador, 'retry',
+                                  wraps=tasks.enviar_recordatorios_prestador.retry) as reintento:
+            resultado = tasks.enviar_recordatorios_prestador.apply(
+                args=(self.prestador.id, self.mañana.isoformat())
+            ).get()
+        self.assertEqual(resultado, {'prestador_id': self.prestador.id, 'enviados': 5, 'errores': 0})
+        self.assertEqual(len(mail.outbox), 5)
+        # Sin cupo se reprograma para el minuto siguiente, desde la última enviada
+        self.assertEqual(reintento.call_count, 1)
+        self.assertEqual(reintento.call_args.kwargs['countdown'], 60)
+        self.assertEqual(reintento.call_args.kwargs['kwargs']['enviados'], 2)
+
+    def test_reintenta_errores_de_conexion_smtp(self):
+        caida = mock.Mock(open=mock.Mock(side_effect=OSError('SMTP caído')))
+        with mock.patch.object(tasks, 'get_connection', side_effect=[caida, mail.get_connection()]):
+            resultado = tasks.enviar_recordatorios_prestador.apply(
+                args=(self.prestador.id, self.mañana.isoformat())
+            ).get()
+        self.assertEqual(resultado['enviados'], 5)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_abandona_tras_varios_errores_de_conexion(self):
+        caida = mock.Mock(open=mock.Mock(side_effect=OSError('SMTP caído')))
+        with mock.patch.object(tasks, 'get_connection', return_value=caida) as conexiones:
+            resultado = tasks.enviar_recordatorios_prestador.apply(
+                args=(self.prestador.id, self.mañana.isoformat())
+            ).get()
+        self.assertEqual(conexiones.call_count, tasks.MAX_FALLOS_SMTP + 1)
+        self.assertEqual(resultado['fallo'], 'SMTP caído')
+        self.assertEqual(resultado['enviados'], 0)
+
+    def test_reportes_diarios(self):
+        hoy = timezone.now().date()
+        reserva = Reserva.objects.filter(prestador=self.prestador).first()
+        for hora in (9, 11):
+            Reserva.objects.create(
+                agenda=reserva.agenda, cliente=reserva.cliente, servicio=reserva.servicio, fecha=hoy,
+                estado='confirmada', hora_inicio=time(hora), hora_fin=time(hora + 1),
+                monto_total=Decimal('1000'), monto_pagado=Decimal('400')
+            )
+
+        resultado = tasks.generar_reportes_para_todos_prestadores()
+        self.assertEqual(resultado, 'Enviados 1 reportes diarios (0 con error)')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Total de reservas: 2', mail.outbox[0].body)
+        self.assertIn('Ingresos del día: $800', mail.outbox[0].body)
+        self.assertTrue(Notificacion.objects.filter(titulo='Reporte Diario', mensaje='Tienes 2 reservas para hoy').exists())
+
+    def test_resumen(self):
+        resumen = tasks.resumir_recordatorios([
+            {'prestador_id': 1, 'enviados': 3, 'errores': 1},
+            {'prestador_id': 2, 'enviados': 2, 'errores': 0, 'fallo': 'SMTP caído'},
+        ])
+        self.assertEqual(resumen, 'Enviados 5 recordatorios (1 con error); prestadores sin terminar: [2]')
+
+
+class LimpiezaNotificacionesTests(TestCase):
+
+    @mock.patch.object(tasks, 'PAUSA_LIMPIEZA', 0)
+    @mock.patch.object(tasks, 'TAMANO_LOTE_LIMPIEZA', 2)
+    def test_elimina_por_lotes_solo_las_leidas_antiguas(self):
+        usuario = Usuario.objects.create(username='cliente')
+        for leida in (True, True, True, True, True, False):
+            Notificacion.objects.create(usuario=usuario, tipo='recordatorio', titulo='t', mensaje='m', leida=leida)
+        Notificacion.objects.create(usuario=usuario, tipo='recordatorio', titulo='nueva', mensaje='m', leida=True)
+        Notificacion.objects.exclude(titulo='nueva').update(fecha_creacion=timezone.now() - timedelta(days=40))
+
+        self.assertEqual(tasks.limpiar_notificaciones_antiguas(), 'Eliminadas 5 notificaciones antiguas')
+        self.assertEqual(Notificacion.objects.count(), 2)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Particiones de PostgreSQL')
+class ParticionesNotificacionesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create(username='cliente')
+        cls.hoy = timezone.localdate()
+
+    def crear(self, mes, leida=False):
+        notificacion = Notificacion.objects.create(
+            usuario=self.usuario, tipo='recordatorio', titulo='t', mensaje='m', leida=leida
+        )
+        fecha = timezone.make_aware(datetime.combine(mes + timedelta(days=1), time(12)))
+        Notificacion.objects.filter(id=notificacion.id).update(fecha_creacion=fecha)
+        return notificacion
+
+    def filas(self, tabla):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {tabla}')
+            return cursor.fetchone()[0]
+
+    def test_crear_particion_con_filas_en_la_particion_por_defecto(self):
+        particiones.particionar(meses_adelantados=1)
+        futuro = particiones.sumar_meses(self.hoy, 12)
+        self.crear(futuro)
+        self.assertEqual(self.filas(particiones.PARTICION_DEFECTO), 1)
+
+        particiones.crear_particiones(futuro, 1)
+        self.assertIn(futuro, particiones.particiones())
+        self.assertEqual(self.filas(particiones.PARTICION_DEFECTO), 0)
+        self.assertEqual(self.filas(f'{particiones.TABLA}_{futuro:%Y_%m}'), 1)
+
+    @mock.patch.object(tasks, 'PAUSA_LIMPIEZA', 0)
+    def test_limpieza_particionada_no_borra_por_lotes_dentro_de_la_retencion(self):
+        reciente = particiones.sumar_meses(self.hoy, -2)
+        self.crear(reciente, leida=True)
+        particiones.particionar(meses_adelantados=1)
+
+        self.assertEqual(tasks.limpiar_notificaciones_antiguas(), 'Eliminadas 0 notificaciones antiguas')
+        self.assertEqual(Notificacion.objects.count(), 1)
+
+    def test_eliminar_particiones_conserva_las_no_leidas(self):
+        vencido = particiones.sumar_meses(self.hoy, -8)
+        self.crear(vencido, leida=True)
+        no_leida = self.crear(vencido, leida=False)
+        particiones.particionar(meses_adelantados=1)
+
+        self.assertGreaterEqual(
+            particiones.eliminar_particiones_anteriores(particiones.sumar_meses(self.hoy, -6)), 1
+        )
+        self.assertNotIn(vencido, particiones.particiones())
+        self.assertEqual(list(Notificacion.objects.values_list('id', flat=True)), [no_leida.id])
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class NotificacionesTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.usuario = Usuario.objects.create(username='cliente')
+
+    def notificacion(self, **campos):
+        return Notificacion(usuario=self.usuario, tipo='recordatorio', titulo='t', mensaje='m', **campos)
+
+    def test_contador_sin_consultas(self):
+        self.notificacion().save()
+        self.assertEqual(no_leidas(self.usuario.id), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.notificacion().save()
+            crear_notificaciones([self.notificacion(), self.notificacion(leida=True)])
+        with self.assertNumQueries(0):
+            self.assertEqual(no_leidas(self.usuario.id), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            marcadas = marcar_leidas(self.usuario.id, [Notificacion.objects.filter(leida=False).first().id])
+        self.assertEqual(marcadas, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(no_leidas(self.usuario.id), 2)
+
+    def test_contador_no_queda_negativo(self):
+        self.assertEqual(no_leidas(self.usuario.id), 0)
+        sumar_no_leidas(self.usuario.id, -1)
+        self.notificacion().save()
+        self.assertEqual(no_leidas(self.usuario.id), 1)
+
+    def test_eliminar_invalida_el_contador(self):
+        leida, no_leida = self.notificacion(leida=True), self.notificacion()
+        leida.save()
+        no_leida.save()
+        self.assertEqual(no_leidas(self.usuario.id), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            eliminadas = eliminar_notificaciones(Notificacion.objects.filter(id__in=[leida.id, no_leida.id]))
+        self.assertEqual(eliminadas, 2)
+        self.assertEqual(no_leidas(self.usuario.id), 0)
+
+    def test_bandeja_paginada(self):
+        crear_notificaciones([self.notificacion() for _ in range(25)])
+        self.client.force_login(self.usuario)
+
+        primera = self.client.get('/api/notificaciones/').json()
+        self.assertEqual(len(primera['notificaciones']), 20)
+        segunda = self.client.get('/api/notificaciones/' + primera['siguiente']).json()
+        self.assertEqual(len(segunda['notificaciones']), 5)
+        self.assertIsNone(segunda['siguiente'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post('/api/notificaciones/leidas/', '{}', content_type='application/json')
+        self.assertEqual(respuesta.json()['marcadas'], 25)
+        self.assertEqual(no_leidas(self.usuario.id), 0)
+
+
+class EventosReservaTests(SimpleTestCase):
+    def test_tipo_evento(self):
+        self.assertEqual(tipo_evento(None, ('pendiente', 'pendiente'), True), 'creada')
+        self.assertEqual(tipo_evento(('confirmada', 'pendiente'), ('cancelada', 'pendiente'), False), 'cancelada')
+        self.assertEqual(tipo_evento(('pendiente', 'pendiente'), ('confirmada', 'seña'), False), 'pagada')
+        self.assertEqual(tipo_evento(('confirmada', 'seña'), ('confirmada', 'total'), False), 'pagada')
+        self.assertIsNone(tipo_evento(('confirmada', 'seña'), ('completada', 'seña'), False))
+        self.assertIsNone(tipo_evento(('cancelada', 'pendiente'), ('cancelada', 'pendiente'), False))
+
+    def test_escuchar_termina_y_libera_la_suscripcion(self):
+        suscripcion = mock.AsyncMock()
+        suscripcion.get_message.side_effect = [
+            {'data': b'{"tipo": "creada"}'}, None, None, None, None,
+        ]
+        cliente = mock.AsyncMock()
+        cliente.pubsub = mock.Mock(return_value=suscripcion)
+
+        async def consumir():
+            return [parte async for parte in eventos.escuchar(1)]
+
+        with mock.patch.object(eventos.redis_async.Redis, 'from_url', return_value=cliente), \
+                mock.patch.object(eventos, 'DURACION_MAXIMA', 60), \
+                mock.patch.object(eventos, 'time', mock.Mock(monotonic=mock.Mock(side_effect=[0, 1, 2, 61]))):
+            partes = async_to_sync(consumir)()
+
+        self.assertEqual(partes, [
+            'retry: 1000\n\n', 'event: reserva\ndata: {"tipo": "creada"}\n\n', ': keepalive\n\n',
+        ])
+        suscripcion.subscribe.assert_awaited_once_with('eventos:prestador:1')
+        suscripcion.unsubscribe.assert_awaited_once()
+        cliente.aclose.assert_awaited_once()
+
+    def test_escuchar_termina_al_desconectarse_el_cliente(self):
+        async def sin_mensajes(**kwargs):
+            await asyncio.sleep(kwargs['timeout'])
+
+        suscripcion = mock.AsyncMock()
+        suscripcion.get_message.side_effect = sin_mensajes
+        cliente = mock.AsyncMock()
+        cliente.pubsub = mock.Mock(return_value=suscripcion)
+
+        async def consumir():
+            desconectado = asyncio.Event()
+            asyncio.get_running_loop().call_later(0.05, desconectado.set)
+            return [parte async for parte in eventos.escuchar(1, desconectado)]
+
+        with mock.patch.object(eventos.redis_async.Redis, 'from_url', return_value=cliente):
+            partes = async_to_sync(consumir)()
+
+        self.assertEqual(partes, ['retry: 1000\n\n'])
+        suscripcion.unsubscribe.assert_awaited_once()
+        cliente.aclose.assert_awaited_once()
+
+    def test_middleware_marca_la_desconexion(self):
+        mensajes = asyncio.Queue()
+        marcas = []
+
+        async def app(scope, receive, send):
+            self.assertEqual((await receive())['type'], 'http.request')
+            await asyncio.wait_for(scope[eventos.CLAVE_DESCONEXION].wait(), 1)
+            marcas.append('desconectado')
+
+        async def ejecutar():
+            await mensajes.put({'type': 'http.request', 'body': b'', 'more_body': False})
+            await mensajes.put({'type': 'http.disconnect'})
+            await eventos.Desconexion(app)({'type': 'http'}, mensajes.get, mock.AsyncMock())
+
+        async_to_sync(ejecutar)()
+        self.assertEqual(marcas, ['desconectado'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Las reservas usan INSERT ... ON CONFLICT')
+class PublicacionEventosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create(username='prestador', rol='prestador')
+        prestador = PerfilPrestador.objects.create(usuario=cls.usuario, nombre_negocio='Negocio', slug='negocio')
+        cls.reserva_datos = {
+            'agenda': Agenda.objects.create(prestador=prestador, nombre='Agenda'),
+            'servicio': Servicio.objects.create(
+                prestador=prestador, nombre='Corte', categoria='pelo',
+                precio=Decimal('1000'), duracion_minutos=60
+            ),
+            'cliente': Cliente.objects.create(
+                prestador=prestador, nombre='Ana', apellido='Prueba', email='ana@ejemplo.com', dni='1'
+            ),
+            'fecha': timezone.localdate(), 'hora_inicio': time(9), 'hora_fin': time(10),
+            'monto_total': Decimal('1000'),
+        }
+
+    @mock.patch('turnos.signals.publicar_evento_reserva')
+    def test_publica_al_confirmar(self, publicar):
+        with self.captureOnCommitCallbacks(execute=True):
+            reserva = Reserva.objects.create(**self.reserva_datos)
+        publicar.assert_called_once_with(reserva, 'creada')
+
+        publicar.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            reserva.notas = 'Sin cambios de estado'
+            reserva.save()
+        publicar.assert_not_called()
+
+        reserva = Reserva.objects.get(pk=reserva.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            reserva.estado = 'cancelada'
+            reserva.save()
+        publicar.assert_called_once_with(reserva, 'cancelada')
+
+
+class EventosVistaTests(TestCase):
+    def test_solo_prestadores_con_perfil(self):
+        self.assertEqual(self.client.get('/api/eventos/reservas/').status_code, 403)
+
+        sin_perfil = Usuario.objects.create(username='sin_perfil', rol='prestador')
+        self.client.force_login(sin_perfil)
+        self.assertEqual(self.client.get('/api/eventos/reservas/').status_code, 403)
+
+    def test_stream(self):
+        usuario = Usuario.objects.create(username='prestador', rol='prestador')
+        prestador = PerfilPrestador.objects.create(usuario=usuario, nombre_negocio='Negocio', slug='negocio')
+        self.client.force_login(usuario)
+
+        # Bajo WSGI no se abre el stream
+        self.assertEqual(self.client.get('/api/eventos/reservas/').status_code, 501)
+
+        self.async_client.force_login(usuario)
+
+        async def eventos_falsos(prestador_id, desconectado):
+            yield f'data: {prestador_id}\n\n'
+
+        async def pedir():
+            respuesta = await self.async_client.get('/api/eventos/reservas/')
+            return respuesta, b''.join([parte async for parte in respuesta])
+
+        with mock.patch('turnos.views.escuchar', eventos_falsos):
+            respuesta, contenido = async_to_sync(pedir)()
+            self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+            self.assertEqual(respuesta['Cache-Control'], 'no-cache')
+            self.assertEqual(contenido, f'data: {prestador.id}\n\n'.encode())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Las reservas usan INSERT ... ON CONFLICT')
+@override_settings(CACHES=CACHE_LOCAL)
+class ComprobantesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        usuario = Usuario.objects.create(username='prestador', rol='prestador')
+        prestador = PerfilPrestador.objects.create(usuario=usuario, nombre_negocio='Negocio', slug='negocio')
+        servicio = Servicio.objects.create(
+            prestador=prestador, nombre='Corte', categoria='pelo',
+            precio=Decimal('1000'), duracion_minutos=60
+        )
+        cliente = Cliente.objects.create(
+            prestador=prestador, nombre='Ana', apellido='Prueba', email='ana@ejemplo.com', dni='1'
+        )
+        cls.usuario = usuario
+        agenda = Agenda.objects.create(prestador=prestador, nombre='Agenda')
+        cls.reservas = [
+            Reserva.objects.create(
+                agenda=agenda, cliente=cliente, servicio=servicio, fecha=timezone.localdate(),
+                hora_inicio=time(hora), hora_fin=time(hora + 1), monto_total=Decimal('1000')
+            )
+            for hora in range(9, 12)
+        ]
+        cls.reserva = cls.reservas[0]
+
+    def test_descargas_repetidas(self):
+        url = f'/reserva/comprobante/{self.reserva.codigo}/'
+        with mock.patch.object(comprobantes, 'renderizar', wraps=comprobantes.renderizar) as renderizar:
+            primera = self.client.get(url)
+            self.assertEqual(primera.status_code, 200)
+            self.assertTrue(primera.content.startswith(b'%PDF'))
+
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag']).status_code, 304)
+            self.assertEqual(self.client.get(url).content, primera.content)
+            self.assertEqual(renderizar.call_count, 1)
+
+            self.reserva.monto_pagado = Decimal('500')
+            self.reserva.save()
+            segunda = self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag'])
+            self.assertEqual(segunda.status_code, 200)
+            self.assertNotEqual(segunda['ETag'], primera['ETag'])
+            self.assertEqual(renderizar.call_count, 2)
+
+    def test_etag_sin_dibujar(self):
+        url = f'/reserva/comprobante/{self.reserva.codigo}/'
+        etag = self.client.get(url)['ETag']
+        cache.clear()
+        with mock.patch.object(comprobantes, 'renderizar') as renderizar:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        renderizar.assert_not_called()
+
+    def test_lote_zip_y_pdf(self):
+        self.client.force_login(self.usuario)
+
+        respuesta = self.client.get('/reservas/comprobantes/?formato=zip')
+        contenido = b''.join(respuesta.streaming_content)
+        nombres = zipfile.ZipFile(BytesIO(contenido)).namelist()
+        self.assertEqual(sorted(nombres), sorted(f'comprobante_{r.codigo}.pdf' for r in self.reservas))
+
+        respuesta = self.client.get('/reservas/comprobantes/?formato=pdf')
+        self.assertTrue(b''.join(respuesta.streaming_content).startswith(b'%PDF'))
+
+    def test_lote_en_una_consulta(self):
+        Reserva.objects.bulk_create([
+            Reserva(
+                agenda=self.reserva.agenda, prestador=self.reserva.prestador, cliente=self.reserva.cliente,
+                servicio=self.reserva.servicio, fecha=timezone.localdate() + timedelta(days=dia),
+                hora_inicio=time(9), hora_fin=time(10), monto_total=Decimal('1000')
+            )
+            for dia in range(1, 30)
+        ])
+        with self.assertNumQueries(1):
+            escribir_pdf(Reserva.objects.all(), BytesIO())
+        with self.assertNumQueries(1):
+            self.assertEqual(len(zipfile.ZipFile(BytesIO(b''.join(partes_zip(Reserva.objects.all())))).namelist()), 32)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class CatalogoPublicoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        usuario = Usuario.objects.create(username='prestador', rol='prestador')
+        cls.prestador = PerfilPrestador.objects.create(usuario=usuario, nombre_negocio='Negocio', slug='negocio')
+        cls.servicio = Servicio.objects.create(
+            prestador=cls.prestador, nombre='Corte', categoria='pelo',
+            precio=Decimal('1000'), duracion_minutos=60
+        )
+        Agenda.objects.create(prestador=cls.prestador, nombre='Agenda')
+
+    def test_pagina_cacheada_e_invalidada(self):
+        url = '/reservar/negocio/'
+        primera = self.client.get(url)
+        self.assertEqual(primera.status_code, 200)
+        self.assertIn('public', primera['Cache-Control'])
+        self.assertNotIn('csrfmiddlewaretoken', primera.content.decode())
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).content, primera.content)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.servicio.nombre = 'Corte y peinado'
+            self.servicio.save()
+        segunda = self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(segunda.status_code, 200)
+        self.assertIn('Corte y peinado', segunda.content.decode())
+        self.assertNotEqual(segunda['ETag'], primera['ETag'])
+
+    def test_lectura_concurrente_con_la_invalidacion(self):
+        viejos = catalogo.catalogo('negocio')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.servicio.nombre = 'Corte y peinado'
+            self.servicio.save()
+        # Una lectura que empezó antes de invalidar guarda lo que había leído
+        cache.set(f"catalogo:negocio:{viejos['version']}", viejos)
+
+        nuevos = catalogo.catalogo('negocio')
+        self.assertNotEqual(nuevos['version'], viejos['version'])
+        self.assertEqual([s.nombre for s in nuevos['servicios']], ['Corte y peinado'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Las reservas usan INSERT ... ON CONFLICT')
+@override_settings(CACHES=CACHE_LOCAL)
+class DisponibilidadCondicionalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        usuario = Usuario.objects.create(username='prestador', rol='prestador')
+        prestador = PerfilPrestador.objects.create(usuario=usuario, nombre_negocio='Negocio', slug='negocio')
+        cls.servicio = Servicio.objects.create(
+            prestador=prestador, nombre='Corte', categoria='pelo',
+            precio=Decimal('1000'), duracion_minutos=60
+        )
+        cls.cliente = Cliente.objects.create(
+            prestador=prestador, nombre='Ana', apellido='Prueba', email='ana@ejemplo.com', dni='1'
+        )
+        cls.agenda = Agenda.objects.create(
+            prestador=prestador, nombre='Agenda', hora_inicio=time(9), hora_fin=time(12),
+            **{dia: True for dia in ('lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo')}
+        )
+        cls.fecha = timezone.localdate() + timedelta(days=1)
+
+    def test_etag_por_dia(self):
+        url = (f'/api/disponibilidad/?agenda_id={self.agenda.id}&servicio_id={self.servicio.id}'
+               f'&fecha={self.fecha.isoformat()}')
+        primera = self.client.get(url)
+        self.assertEqual(len(primera.json()['slots']), 5)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Reserva.objects.create(
+                agenda=self.agenda, cliente=self.cliente, servicio=self.servicio, fecha=self.fecha,
+                hora_inicio=time(9), hora_fin=time(10), monto_total=Decimal('1000')
+            )
+        segunda = self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(segunda.status_code, 200)
+        self.assertNotEqual(segunda['ETag'], primera['ETag'])
+        self.assertNotIn('09:00', segunda.json()['slots'])
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class DisponibilidadPrestadorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        usuario = Usuario.objects.create(username='prestador', rol='prestador')
+        cls.prestador = PerfilPrestador.objects.create(usuario=usuario, nombre_negocio='Negocio', slug='negocio')
+        cls.servicio = Servicio.objects.create(
+            prestador=cls.prestador, nombre='Corte', categoria='pelo',
+            precio=Decimal('1000'), duracion_minutos=60
+        )
+        todos = {dia: True for dia in ('lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo')}
+        cls.manana = Agenda.objects.create(
+            prestador=cls.prestador, nombre='Mañana', hora_inicio=time(9), hora_fin=time(11), **todos
+        )
+        cls.tarde = Agenda.objects.create(
+            prestador=cls.prestador, nombre='Tarde', hora_inicio=time(10), hora_fin=time(12), **todos
+        )
+        Agenda.objects.create(
+            prestador=cls.prestador, nombre='Inactiva', hora_inicio=time(8), hora_fin=time(9), activa=False, **todos
+        )
+        cls.fecha = timezone.localdate() + timedelta(days=1)
+
+    def url(self, **params):
+        params = {
+            'prestador_id': self.prestador.id, 'servicio_id': self.servicio.id,
+            'fecha': self.fecha.isoformat(), **params
+        }
+        return '/api/disponibilidad/prestador/?' + '&'.join(f'{k}={v}' for k, v in params.items())
+
+    def test_union_de_agendas(self):
+        # Servicio, agendas activas y una sola consulta de reservas para las dos agendas
+        with self.assertNumQueries(3):
+            slots = self.client.get(self.url()).json()['slots']
+        self.assertEqual(slots, [
+            {'hora': '09:00', 'agendas': [self.manana.id]},
+            {'hora': '09:30', 'agendas': [self.manana.id]},
+            {'hora': '10:00', 'agendas': [self.manana.id, self.tarde.id]},
+            {'hora': '10:30', 'agendas': [self.tarde.id]},
+            {'hora': '11:00', 'agendas': [self.tarde.id]},
+        ])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url()).json()['slots'], slots)
+
+    def test_slots_cacheados_por_agenda_y_fecha(self):
+        pares = [(agenda, self.fecha + timedelta(days=n)) for agenda in (self.manana, self.tarde) for n in range(3)]
+        with self.assertNumQueries(1):
+            slots = disponibilidad._slots_cacheados(pares, 60)
+        self.assertEqual(len(slots), 6)
+        self.assertEqual(slots[(self.tarde.id, self.fecha)], [600, 630, 660])
+
+        # Sólo se recalcula el día invalidado, con una consulta
+        disponibilidad.invalidar_dia(self.manana.id, self.fecha)
+        with self.assertNumQueries(1):
+            self.assertEqual(disponibilidad._slots_cacheados(pares, 60), slots)
+        with self.assertNumQueries(0):
+            self.assertEqual(disponibilidad._slots_cacheados(pares, 60), slots)
+
+    def test_servicio_de_otro_prestador(self):
+        otro = Usuario.objects.create(username='otro', rol='prestador')
+        perfil = PerfilPrestador.objects.create(usuario=otro, nombre_negocio='Otro', slug='otro')
+        self.assertEqual(self.client.get(self.url(prestador_id=perfil.id)).status_code, 400)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class DisponibilidadRangoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        usuario = Usuario.objects.create(username='prestador', rol='prestador')
+        prestador = PerfilPrestador.objects.create(usuario=usuario, nombre_negocio='Negocio', slug='negocio')
+        cls.servicio = Servicio.objects.create(
+            prestador=prestador, nombre='Corte', categoria='pelo',
+            precio=Decimal('1000'), duracion_minutos=60
+        )
+        cls.agenda = Agenda.objects.create(
+            prestador=prestador, nombre='Lunes', hora_inicio=time(9), hora_fin=time(11), lunes=True,
+            **{dia: False for dia in ('martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo')}
+        )
+        # Un lunes más allá del primer rango de 30 días
+        hoy = timezone.localdate()
+        cls.lunes = hoy + timedelta(days=35 + (7 - hoy.weekday()) % 7)
+
+    def url(self, **params):
+        params = {'agenda_id': self.agenda.id, 'servicio_id': self.servicio.id, **params}
+        return '/api/disponibilidad/rango/?' + '&'.join(f'{k}={v}' for k, v in params.items())
+
+    def test_rango_desde_fecha(self):
+        datos = self.client.get(self.url(desde=self.lunes.isoformat(), dias=7)).json()
+        self.assertEqual(datos['desde'], self.lunes.isoformat())
+        self.assertEqual(datos['dias'], 7)
+        self.assertEqual(datos['origen'], '09:00')
+        self.assertEqual(datos['paso'], 30)
+        # Sólo el lunes: los demás días la agenda no trabaja
+        self.assertEqual(datos['disponibilidad'], {self.lunes.isoformat(): [0, 1, 2]})
+
+    def test_rango_por_defecto_y_limite(self):
+        datos = self.client.get(self.url()).json()
+        self.assertEqual(datos['desde'], timezone.localdate().isoformat())
+        self.assertEqual(datos['dias'], 30)
+        self.assertEqual(self.client.get(self.url(dias=1000)).json()['dias'], 62)
+
+    def test_desde_fuera_de_rango(self):
+        hoy = timezone.localdate()
+        for desde in ('9999-12-30', (hoy - timedelta(days=30)).isoformat(), (hoy + timedelta(days=366)).isoformat()):
+            respuesta = self.client.get(self.url(desde=desde, dias=62))
+            self.assertEqual(respuesta.status_code, 400, desde)
+        self.assertEqual(self.client.get(self.url(desde=(hoy + timedelta(days=365)).isoformat())).status_code, 200)
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get(self.url(desde='manana')).status_code, 400)
+        self.assertEqual(self.client.get(self.url(dias='x')).status_code, 400)
+        self.assertEqual(self.client.get('/api/disponibilidad/rango/?agenda_id=1').status_code, 400)
+
+
+class PrestadorRequeridoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create(username='prestador', rol='prestador')
+        PerfilPrestador.objects.create(usuario=cls.usuario, nombre_negocio='Negocio', slug='negocio')
+        cls.cliente = Usuario.objects.create(username='cliente', rol='cliente')
+
+    def test_perfil_cargado_con_el_usuario(self):
+        vista = prestador_requerido(lambda request: HttpResponse(request.prestador.slug))
+        request = RequestFactory().get('/')
+        request.session = {BACKEND_SESSION_KEY: 'django.contrib.auth.backends.ModelBackend'}
+        with self.assertNumQueries(1):
+            request.user = UsuarioBackend().get_user(self.usuario.id)
+            respuesta = vista(request)
+        self.assertEqual(respuesta.content, b'negocio')
+        self.assertEqual(request.session[BACKEND_SESSION_KEY], 'turnos.backends.UsuarioBackend')
+
+    def test_otro_rol(self):
+        vista = prestador_requerido_api(lambda request: HttpResponse())
+        request = RequestFactory().get('/')
+        request.user = UsuarioBackend().get_user(self.cliente.id)
+        self.assertEqual(vista(request).status_code, 403)
+
+    def test_registro_inicia_sesion(self):
+        respuesta = self.client.post('/registro/', {
+            'username': 'nuevo', 'email': 'nuevo@ejemplo.com', 'nombre_negocio': 'Nuevo',
+            'slug': 'nuevo', 'password1': 'Clave-segura-123', 'password2': 'Clave-segura-123',
+        })
+        self.assertRedirects(respuesta, '/perfil/', fetch_redirect_response=False)
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], 'turnos.backends.UsuarioBackend')
+        self.assertEqual(PerfilPrestador.objects.get(slug='nuevo').usuario.username, 'nuevo')
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class AgendaCacheadaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        usuario = Usuario.objects.create(username='prestador', rol='prestador')
+        cls.prestador = PerfilPrestador.objects.create(usuario=usuario, nombre_negocio='Negocio', slug='negocio')
+        cls.agenda = Agenda.objects.create(prestador=cls.prestador, nombre='Agenda', hora_fin=time(18))
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_invalidacion_al_modificar(self):
+        obtener_agenda(self.agenda.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(obtener_agenda(self.agenda.id).hora_fin, time(18))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.agenda.hora_fin = time(13)
+            self.agenda.save()
+        self.assertEqual(obtener_agenda(self.agenda.id).hora_fin, time(13))
+        self.assertEqual([a.hora_fin for a in agendas_activas(self.prestador.id)], [time(13)])
+
+    def test_lectura_concurrente_con_la_invalidacion(self):
+        vieja = Agenda.objects.get(pk=self.agenda.pk)
+
+        def leer_antes_de_confirmar(*args, **kwargs):
+            # La fila se leyó antes de que se confirmara el cambio e invalidara
+            invalidar_agenda(self.agenda.id, self.prestador.id)
+            return vieja
+
+        Agenda.objects.filter(pk=self.agenda.pk).update(hora_fin=time(13))
+        with mock.patch('turnos.disponibilidad.get_object_or_404', side_effect=leer_antes_de_confirmar):
+            self.assertEqual(obtener_agenda(self.agenda.id).hora_fin, time(18))
+        self.assertEqual(obtener_agenda(self.agenda.id).hora_fin, time(13))
+
+    def test_ids_invalidos(self):
+        respuesta = self.client.get('/api/disponibilidad/', {
+            'agenda_id': 'uno', 'servicio_id': '1', 'fecha': '2030-01-01'
+        })
+        self.assertEqual(respuesta.status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'La restricción de superposición es de PostgreSQL')
+@override_settings(CACHES=CACHE_LOCAL)
+class ProcesarReservaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        usuario = Usuario.objects.create(username='prestador', rol='prestador')
+        cls.prestador = PerfilPrestador.objects.create(usuario=usuario, nombre_negocio='Negocio', slug='negocio')
+        cls.servicio = Servicio.objects.create(
+            prestador=cls.prestador, nombre='Corte', categoria='pelo',
+            precio=Decimal('1000'), duracion_minutos=60
+        )
+        cls.agenda = Agenda.objects.create(prestador=cls.prestador, nombre='Agenda')
+        cls.fecha = timezone.localdate() + timedelta(days=1)
+
+    def reservar(self, hora, dni='1'):
+        return self.client.post('/api/reserva/', {
+            'prestador_id': self.prestador.id, 'agenda_id': self.agenda.id, 'servicio_id': self.servicio.id,
+            'fecha': self.fecha.isoformat(), 'hora': hora,
+            'dni': dni, 'nombre': 'Ana', 'apellido': 'Prueba', 'email': 'ana@ejemplo.com',
+        }, content_type='application/json')
+
+    def test_horario_ocupado(self):
+        self.assertEqual(self.reservar('09:00').status_code, 200)
+        respuesta = self.reservar('09:30', dni='2')
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertNotIn('09:30', respuesta.json()['alternativas'])
+
+    def test_otra_violacion_de_integridad_no_es_horario_ocupado(self):
+        with mock.patch.object(Reserva.objects, 'create', side_effect=IntegrityError('fk')):
+            with self.assertRaises(IntegrityError):
+                self.reservar('09:00')
+
+    def test_turno_que_pasa_la_medianoche(self):
+        self.assertEqual(self.reservar('23:30').status_code, 400)
+        self.assertEqual(self.reservar('9 y media').status_code, 400)
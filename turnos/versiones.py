@@ -0,0 +1,45 @@
+"""
+Claves de versión para invalidar cachés sin borrar por patrón.
+
+Cada conjunto de datos cacheados (la disponibilidad de un día, el catálogo
+de un prestador) tiene una clave de versión que forma parte de las claves de
+los datos; invalidar es incrementarla. Una lectura que empezó antes de la
+invalidación guarda lo que leyó bajo la versión anterior, que ya nadie
+consulta.
+
+Todas las claves de versión vencen a las VERSIONES_CACHE_TIMEOUT. Las
+versiones nuevas salen del reloj, así que una clave vencida (o descartada
+por Redis) nunca vuelve a tomar un valor anterior.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _version_inicial():
+    return time.time_ns() // 1000
+
+
+def obtener_versiones(claves):
+    """Lee (o inicializa) un conjunto de claves de versión en un solo viaje a Redis"""
+    versiones = cache.get_many(claves)
+    faltantes = [clave for clave in claves if clave not in versiones]
+    if faltantes:
+        iniciales = {clave: _version_inicial() for clave in faltantes}
+        for clave, version in iniciales.items():
+            cache.add(clave, version, settings.VERSIONES_CACHE_TIMEOUT)
+        versiones.update(iniciales)
+        versiones.update(cache.get_many(faltantes))
+    return versiones
+
+
+def obtener_version(clave):
+    return obtener_versiones([clave])[clave]
+
+
+def incrementar_version(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.add(clave, _version_inicial(), settings.VERSIONES_CACHE_TIMEOUT)
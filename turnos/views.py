@@ -1,25 +1,64 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import login, authenticate
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
-from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Q, Sum, Count
+from django.contrib.messages import get_messages
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, FileResponse, Http404
+from django.core.handlers.asgi import ASGIRequest
+from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
+from django.db import IntegrityError, transaction
+from django.db.models import Sum, Count
 from django.utils import timezone
-from datetime import datetime, timedelta, time
-import mercadopago
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+from django.utils.cache import add_never_cache_headers, get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from asgiref.sync import sync_to_async
+from datetime import datetime, time, timedelta
 import json
+import os
+import tempfile
 
 from .models import (
     Usuario, PerfilPrestador, Agenda, Servicio, 
     Cliente, Reserva, Notificacion
 )
+from .decorators import prestador_requerido, prestador_requerido_api
 from .forms import (
     RegistroForm, PerfilPrestadorForm, ServicioForm,
     AgendaForm, ClienteForm, ReservaForm
 )
+from .pagos import MercadoPagoError, MercadoPagoNoDisponible, crear_preferencia, registro_clientes
+from .tasks import crear_preferencia_mercadopago, generar_comprobantes_lote
+from .estadisticas import estadisticas_prestador
+from .catalogo import catalogo, pagina_publica
+from .paginacion import paginar
+from .notificaciones import eliminar_notificaciones, marcar_leidas, no_leidas
+from .eventos import CLAVE_DESCONEXION, escuchar
+from .comprobantes import (
+    FORMATOS_LOTE, comprobante_pdf, datos_comprobante, escribir_pdf, huella, partes_zip
+)
+from .busqueda import LIMITE_AUTOCOMPLETADO, buscar_clientes, filtrar_clientes
+from .exportacion import (
+    FORMATOS, FILTROS_RESERVAS, COLUMNAS_CLIENTES, COLUMNAS_RESERVAS, exportar, filas_clientes,
+    filas_reservas, filtrar_reservas
+)
+from .disponibilidad import (
+    PASO_MINUTOS, a_minutos, formatear, slots_disponibles, disponibilidad_rango,
+    disponibilidad_agendas, obtener_agenda, obtener_servicio, agendas_activas,
+    invalidar_dia, version_dia
+)
+
+# Días que devuelve por defecto la API de disponibilidad por rango
+DIAS_RANGO_DISPONIBILIDAD = 30
+MAX_DIAS_RANGO_DISPONIBILIDAD = 62
+# Hasta cuántos días adelante se puede consultar la disponibilidad por rango
+DIAS_ANTICIPACION_DISPONIBILIDAD = 365
+
+TAMANO_PAGINA_NOTIFICACIONES = 20
 
 # ==================== VISTAS PÚBLICAS ====================
 
@@ -43,7 +82,7 @@ def registro_prestador(request):
                 slug=form.cleaned_data['slug']
             )
             
-            login(request, user)
+            login(request, user, backend='turnos.backends.UsuarioBackend')
             messages.success(request, '¡Registro exitoso! Completa tu perfil.')
             return redirect('perfil_prestador')
     else:
@@ -53,58 +92,35 @@ def registro_prestador(request):
 
 # ==================== VISTAS PRESTADOR ====================
 
-@login_required
+@prestador_requerido
 def dashboard_prestador(request):
     """Panel principal del prestador"""
-    if request.user.rol != 'prestador':
-        messages.error(request, 'No tienes permisos para acceder.')
-        return redirect('home')
-    
-    perfil = request.user.perfil_prestador
+    perfil = request.prestador
     hoy = timezone.now().date()
     
-    # Estadísticas
-    reservas_hoy = Reserva.objects.filter(
-        agenda__prestador=perfil,
-        fecha=hoy,
-        estado='confirmada'
-    ).count()
-    
-    reservas_pendientes = Reserva.objects.filter(
-        agenda__prestador=perfil,
-        estado='pendiente'
-    ).count()
-    
-    ingresos_mes = Reserva.objects.filter(
-        agenda__prestador=perfil,
-        fecha__month=hoy.month,
-        fecha__year=hoy.year,
-        estado__in=['confirmada', 'completada']
-    ).aggregate(total=Sum('monto_pagado'))['total'] or 0
+    # Estadísticas (una consulta, cacheada hasta que cambie una reserva)
+    estadisticas = estadisticas_prestador(perfil.id, hoy)
     
     proximas_reservas = Reserva.objects.filter(
-        agenda__prestador=perfil,
+        prestador=perfil,
         fecha__gte=hoy,
         estado='confirmada'
     ).select_related('cliente', 'servicio', 'agenda').order_by('fecha', 'hora_inicio')[:10]
     
     context = {
         'perfil': perfil,
-        'reservas_hoy': reservas_hoy,
-        'reservas_pendientes': reservas_pendientes,
-        'ingresos_mes': ingresos_mes,
+        'reservas_hoy': estadisticas['reservas_hoy'],
+        'reservas_pendientes': estadisticas['reservas_pendientes'],
+        'ingresos_mes': estadisticas['ingresos_mes'],
         'proximas_reservas': proximas_reservas,
     }
     
     return render(request, 'turnos/dashboard_prestador.html', context)
 
-@login_required
+@prestador_requerido
 def perfil_prestador_view(request):
     """Gestión del perfil del prestador"""
-    if request.user.rol != 'prestador':
-        return redirect('home')
-    
-    perfil = request.user.perfil_prestador
+    perfil = request.prestador
     
     if request.method == 'POST':
         form = PerfilPrestadorForm(request.POST, request.FILES, instance=perfil)
@@ -117,28 +133,22 @@ def perfil_prestador_view(request):
     
     return render(request, 'turnos/perfil_prestador.html', {'form': form, 'perfil': perfil})
 
-@login_required
+@prestador_requerido
 def servicios_list(request):
     """Lista de servicios del prestador"""
-    if request.user.rol != 'prestador':
-        return redirect('home')
-    
-    perfil = request.user.perfil_prestador
+    perfil = request.prestador
     servicios = perfil.servicios.all()
     
     return render(request, 'turnos/servicios_list.html', {'servicios': servicios})
 
-@login_required
+@prestador_requerido
 def servicio_create(request):
     """Crear nuevo servicio"""
-    if request.user.rol != 'prestador':
-        return redirect('home')
-    
     if request.method == 'POST':
         form = ServicioForm(request.POST)
         if form.is_valid():
             servicio = form.save(commit=False)
-            servicio.prestador = request.user.perfil_prestador
+            servicio.prestador = request.prestador
             servicio.save()
             messages.success(request, 'Servicio creado exitosamente.')
             return redirect('servicios_list')
@@ -147,13 +157,10 @@ def servicio_create(request):
     
     return render(request, 'turnos/servicio_form.html', {'form': form})
 
-@login_required
+@prestador_requerido
 def servicio_update(request, pk):
     """Actualizar servicio"""
-    if request.user.rol != 'prestador':
-        return redirect('home')
-    
-    servicio = get_object_or_404(Servicio, pk=pk, prestador=request.user.perfil_prestador)
+    servicio = get_object_or_404(Servicio, pk=pk, prestador=request.prestador)
     
     if request.method == 'POST':
         form = ServicioForm(request.POST, instance=servicio)
@@ -166,45 +173,64 @@ def servicio_update(request, pk):
     
     return render(request, 'turnos/servicio_form.html', {'form': form, 'servicio': servicio})
 
-@login_required
+@prestador_requerido
 def servicio_delete(request, pk):
     """Eliminar servicio"""
-    if request.user.rol != 'prestador':
-        return redirect('home')
-    
-    servicio = get_object_or_404(Servicio, pk=pk, prestador=request.user.perfil_prestador)
-    servicio.delete()
+    servicio = get_object_or_404(Servicio, pk=pk, prestador=request.prestador)
+    with transaction.atomic():
+        # Se irían en cascada con las reservas, sin corregir los contadores de no leídas
+        eliminar_notificaciones(Notificacion.objects.filter(reserva__servicio=servicio))
+        servicio.delete()
     messages.success(request, 'Servicio eliminado.')
     return redirect('servicios_list')
 
-@login_required
+@prestador_requerido
 def clientes_list(request):
     """Ficha de clientes"""
-    if request.user.rol != 'prestador':
-        return redirect('home')
-    
-    perfil = request.user.perfil_prestador
-    clientes = perfil.clientes.all().order_by('-fecha_registro')
+    perfil = request.prestador
+    clientes = perfil.clientes.all()
     
     # Búsqueda
     q = request.GET.get('q')
     if q:
-        clientes = clientes.filter(
-            Q(nombre__icontains=q) |
-            Q(apellido__icontains=q) |
-            Q(dni__icontains=q) |
-            Q(email__icontains=q)
-        )
+        clientes = filtrar_clientes(clientes, q)
     
-    return render(request, 'turnos/clientes_list.html', {'clientes': clientes})
+    pagina = paginar(clientes, ('-fecha_registro', '-id'), request)
+    
+    return render(request, 'turnos/clientes_list.html', {'clientes': pagina, 'pagina': pagina})
 
-@login_required
+@prestador_requerido
+def clientes_exportar(request):
+    """Exportar la ficha de clientes (con la búsqueda `q`) a CSV o XLSX"""
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS:
+        return HttpResponse('Formato inválido', status=400)
+    
+    clientes = request.prestador.clientes.all()
+    q = request.GET.get('q')
+    if q:
+        clientes = filtrar_clientes(clientes, q)
+    
+    clientes = clientes.order_by('apellido', 'nombre', 'id')
+    return exportar(formato, 'clientes', COLUMNAS_CLIENTES, filas_clientes(clientes))
+
+@prestador_requerido_api
+def clientes_buscar_ajax(request):
+    """Autocompletado de clientes para la recepción"""
+    q = request.GET.get('q', '').strip()
+    if len(q) < 2:
+        return JsonResponse({'clientes': []})
+    
+    clientes = buscar_clientes(request.prestador.clientes.all(), q).values(
+        'id', 'nombre', 'apellido', 'dni', 'email', 'telefono'
+    )[:LIMITE_AUTOCOMPLETADO]
+    
+    return JsonResponse({'clientes': list(clientes)})
+
+@prestador_requerido
 def cliente_detail(request, pk):
     """Detalle del cliente"""
-    if request.user.rol != 'prestador':
-        return redirect('home')
-    
-    cliente = get_object_or_404(Cliente, pk=pk, prestador=request.user.perfil_prestador)
+    cliente = get_object_or_404(Cliente, pk=pk, prestador=request.prestador)
     reservas = cliente.reservas.all().order_by('-fecha')
     
     # Calcular estadísticas
@@ -220,13 +246,10 @@ def cliente_detail(request, pk):
     
     return render(request, 'turnos/cliente_detail.html', context)
 
-@login_required
+@prestador_requerido
 def cliente_toggle_bloqueo(request, pk):
     """Bloquear/desbloquear cliente"""
-    if request.user.rol != 'prestador':
-        return redirect('home')
-    
-    cliente = get_object_or_404(Cliente, pk=pk, prestador=request.user.perfil_prestador)
+    cliente = get_object_or_404(Cliente, pk=pk, prestador=request.prestador)
     cliente.bloqueado = not cliente.bloqueado
     cliente.save()
     
@@ -234,41 +257,66 @@ def cliente_toggle_bloqueo(request, pk):
     messages.success(request, f'Cliente {estado}.')
     return redirect('cliente_detail', pk=pk)
 
-@login_required
+def _filtrar_reservas(request):
+    """Reservas del prestador con los filtros del listado (fecha_desde, fecha_hasta, estado)"""
+    return filtrar_reservas(request.prestador.id, request.GET)
+
+@prestador_requerido
 def reservas_list(request):
     """Lista de reservas"""
-    if request.user.rol != 'prestador':
-        return redirect('home')
+    reservas = _filtrar_reservas(request).select_related('cliente', 'servicio', 'agenda')
+    pagina = paginar(reservas, ('-fecha', '-hora_inicio', '-id'), request)
     
-    perfil = request.user.perfil_prestador
-    
-    # Filtros
-    fecha_desde = request.GET.get('fecha_desde')
-    fecha_hasta = request.GET.get('fecha_hasta')
-    estado = request.GET.get('estado')
-    
-    reservas = Reserva.objects.filter(
-        agenda__prestador=perfil
-    ).select_related('cliente', 'servicio', 'agenda')
-    
-    if fecha_desde:
-        reservas = reservas.filter(fecha__gte=fecha_desde)
-    if fecha_hasta:
-        reservas = reservas.filter(fecha__lte=fecha_hasta)
-    if estado:
-        reservas = reservas.filter(estado=estado)
+    return render(request, 'turnos/reservas_list.html', {'reservas': pagina, 'pagina': pagina})
+
+@prestador_requerido
+def reservas_exportar(request):
+    """Exportar las reservas filtradas a CSV o XLSX"""
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS:
+        return HttpResponse('Formato inválido', status=400)
+    
+    reservas = _filtrar_reservas(request).order_by('-fecha', '-hora_inicio', '-id')
+    return exportar(formato, 'reservas', COLUMNAS_RESERVAS, filas_reservas(reservas))
+
+@prestador_requerido
+def reservas_comprobantes(request):
+    """Comprobantes de las reservas filtradas en un PDF de varias páginas o un ZIP"""
+    formato = request.GET.get('formato', 'pdf')
+    if formato not in FORMATOS_LOTE:
+        return HttpResponse('Formato inválido', status=400)
+    
+    reservas = _filtrar_reservas(request)
+    
+    # Los lotes grandes se generan en segundo plano
+    if reservas.count() > settings.COMPROBANTES_LOTE_SINCRONICO:
+        filtros = {campo: request.GET[campo] for campo in FILTROS_RESERVAS if request.GET.get(campo)}
+        generar_comprobantes_lote.delay(request.prestador.id, filtros, formato)
+        messages.info(request, 'Estamos generando los comprobantes. Te avisaremos con una notificación.')
+        return redirect('reservas_list')
     
-    reservas = reservas.order_by('-fecha', '-hora_inicio')
+    if formato == 'zip':
+        response = StreamingHttpResponse(partes_zip(reservas), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="comprobantes.zip"'
+        return response
     
-    return render(request, 'turnos/reservas_list.html', {'reservas': reservas})
+    archivo = tempfile.TemporaryFile()
+    escribir_pdf(reservas, archivo)
+    archivo.seek(0)
+    return FileResponse(archivo, as_attachment=True, filename='comprobantes.pdf', content_type='application/pdf')
 
-@login_required
+@prestador_requerido
+def reservas_comprobantes_archivo(request, nombre):
+    """Descargar comprobantes generados por generar_comprobantes_lote"""
+    ruta = f'comprobantes/{request.prestador.id}/{nombre}'
+    if not nombre.startswith('comprobantes_') or not default_storage.exists(ruta):
+        raise Http404
+    return FileResponse(default_storage.open(ruta), as_attachment=True, filename=nombre)
+
+@prestador_requerido
 def reserva_cancelar(request, pk):
     """Cancelar reserva"""
-    if request.user.rol != 'prestador':
-        return redirect('home')
-    
-    reserva = get_object_or_404(Reserva, pk=pk, agenda__prestador=request.user.perfil_prestador)
+    reserva = get_object_or_404(Reserva, pk=pk, prestador=request.prestador)
     
     if request.method == 'POST':
         motivo = request.POST.get('motivo', '')
@@ -296,17 +344,38 @@ def reserva_cancelar(request, pk):
 
 def reserva_publica(request, slug):
     """Vista pública para hacer reservas"""
-    prestador = get_object_or_404(PerfilPrestador, slug=slug, activo=True)
-    servicios = prestador.servicios.filter(activo=True)
-    agendas = prestador.agendas.filter(activa=True)
+    datos = catalogo(slug)
     
     context = {
-        'prestador': prestador,
-        'servicios': servicios,
-        'agendas': agendas,
+        'prestador': datos['prestador'],
+        'servicios': datos['servicios'],
+        'agendas': datos['agendas'],
+        'dias_anticipacion': DIAS_ANTICIPACION_DISPONIBILIDAD,
     }
     
-    return render(request, 'turnos/reserva_publica.html', context)
+    # Con sesión iniciada o mensajes pendientes la página es propia del visitante
+    if request.user.is_authenticated or get_messages(request):
+        response = render(request, 'turnos/reserva_publica.html', context)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    
+    etag = f'"{datos["version"]}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(pagina_publica(
+            datos, lambda: render_to_string('turnos/reserva_publica.html', context, request)
+        ))
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=settings.CATALOGO_MAX_AGE)
+    
+    return response
+
+@ensure_csrf_cookie
+def csrf_cookie(request):
+    """Cookie CSRF para las páginas públicas cacheadas (no incluyen el token)"""
+    response = HttpResponse(status=204)
+    add_never_cache_headers(response)
+    return response
 
 def disponibilidad_ajax(request):
     """API para obtener horarios disponibles"""
@@ -317,39 +386,95 @@ def disponibilidad_ajax(request):
     if not all([agenda_id, fecha, servicio_id]):
         return JsonResponse({'error': 'Faltan parámetros'}, status=400)
     
-    agenda = get_object_or_404(Agenda, id=agenda_id)
-    servicio = get_object_or_404(Servicio, id=servicio_id)
-    fecha_obj = datetime.strptime(fecha, '%Y-%m-%d').date()
+    try:
+        agenda_id, servicio_id = int(agenda_id), int(servicio_id)
+        fecha_obj = datetime.strptime(fecha, '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    
+    agenda = obtener_agenda(agenda_id)
+    servicio = obtener_servicio(servicio_id)
+    
+    # Los horarios dependen sólo de la agenda, el día y la duración: si el
+    # navegador ya tiene esta versión, 304 sin calcular ni consultar reservas
+    etag = f'"{version_dia(agenda.id, fecha_obj)}-{servicio.duracion_minutos}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        slots = slots_disponibles(agenda, fecha_obj, servicio.duracion_minutos)
+        response = JsonResponse({'slots': slots})
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=settings.DISPONIBILIDAD_MAX_AGE)
+    
+    return response
+
+def disponibilidad_rango_ajax(request):
+    """API para obtener los horarios disponibles de varios días en una sola llamada"""
+    agenda_id = request.GET.get('agenda_id')
+    servicio_id = request.GET.get('servicio_id')
     
-    # Obtener reservas del día
-    reservas = Reserva.objects.filter(
-        agenda=agenda,
-        fecha=fecha_obj,
-        estado__in=['pendiente', 'confirmada']
-    ).values_list('hora_inicio', 'hora_fin')
+    if not all([agenda_id, servicio_id]):
+        return JsonResponse({'error': 'Faltan parámetros'}, status=400)
     
-    # Generar slots disponibles
-    slots = []
-    hora_actual = agenda.hora_inicio
-    duracion = timedelta(minutes=servicio.duracion_minutos)
+    try:
+        agenda_id, servicio_id = int(agenda_id), int(servicio_id)
+        desde = request.GET.get('desde')
+        desde = datetime.strptime(desde, '%Y-%m-%d').date() if desde else timezone.localdate()
+        dias = int(request.GET.get('dias', DIAS_RANGO_DISPONIBILIDAD))
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    dias = max(1, min(dias, MAX_DIAS_RANGO_DISPONIBILIDAD))
+    
+    # Desde ayer (el navegador puede ir un día atrasado respecto del servidor)
+    # hasta DIAS_ANTICIPACION_DISPONIBILIDAD días adelante
+    hoy = timezone.localdate()
+    if not hoy - timedelta(days=1) <= desde <= hoy + timedelta(days=DIAS_ANTICIPACION_DISPONIBILIDAD):
+        return JsonResponse({'error': 'Fecha fuera de rango'}, status=400)
+    
+    agenda = obtener_agenda(agenda_id)
+    servicio = obtener_servicio(servicio_id)
+    rango = disponibilidad_rango(agenda, desde, dias, servicio.duracion_minutos)
+    
+    # Formato compacto: por cada fecha, índices de slot relativos al inicio de la jornada
+    origen = a_minutos(agenda.hora_inicio)
+    return JsonResponse({
+        'desde': desde.isoformat(),
+        'dias': dias,
+        'origen': formatear(origen),
+        'paso': PASO_MINUTOS,
+        'disponibilidad': {
+            fecha.isoformat(): [(m - origen) // PASO_MINUTOS for m in slots]
+            for fecha, slots in rango.items()
+        },
+    })
+
+def disponibilidad_prestador_ajax(request):
+    """API para obtener los horarios disponibles en cualquier agenda del prestador"""
+    prestador_id = request.GET.get('prestador_id')
+    fecha = request.GET.get('fecha')
+    servicio_id = request.GET.get('servicio_id')
     
-    while hora_actual < agenda.hora_fin:
-        hora_fin = (datetime.combine(fecha_obj, hora_actual) + duracion).time()
-        
-        if hora_fin <= agenda.hora_fin:
-            # Verificar si el slot está ocupado
-            ocupado = False
-            for res_inicio, res_fin in reservas:
-                if not (hora_fin <= res_inicio or hora_actual >= res_fin):
-                    ocupado = True
-                    break
-            
-            if not ocupado:
-                slots.append(hora_actual.strftime('%H:%M'))
-        
-        hora_actual = (datetime.combine(fecha_obj, hora_actual) + timedelta(minutes=30)).time()
+    if not all([prestador_id, fecha, servicio_id]):
+        return JsonResponse({'error': 'Faltan parámetros'}, status=400)
     
-    return JsonResponse({'slots': slots})
+    try:
+        prestador_id, servicio_id = int(prestador_id), int(servicio_id)
+        fecha_obj = datetime.strptime(fecha, '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    
+    servicio = obtener_servicio(servicio_id)
+    if servicio.prestador_id != prestador_id:
+        return JsonResponse({'error': 'Servicio inválido'}, status=400)
+    
+    agendas = agendas_activas(prestador_id)
+    slots = disponibilidad_agendas(agendas, fecha_obj, servicio.duracion_minutos)
+    
+    return JsonResponse({
+        'slots': [
+            {'hora': formatear(minutos), 'agendas': agenda_ids}
+            for minutos, agenda_ids in slots
+        ]
+    })
 
 def procesar_reserva(request):
     """Procesar nueva reserva"""
@@ -381,66 +506,181 @@ def procesar_reserva(request):
     servicio = get_object_or_404(Servicio, id=data['servicio_id'])
     
     monto_total = servicio.precio
-    monto_a_pagar = monto_total if prestador.requiere_pago_total else (monto_total * prestador.porcentaje_seña / 100)
-    
-    reserva = Reserva.objects.create(
-        agenda=agenda,
-        cliente=cliente,
-        servicio=servicio,
-        fecha=data['fecha'],
-        hora_inicio=data['hora'],
-        hora_fin=(datetime.combine(datetime.today(), datetime.strptime(data['hora'], '%H:%M').time()) + 
-                  timedelta(minutes=servicio.duracion_minutos)).time(),
-        monto_total=monto_total,
-        estado='pendiente'
-    )
+    
+    try:
+        fecha = datetime.strptime(data['fecha'], '%Y-%m-%d').date()
+        hora_inicio = datetime.strptime(data['hora'], '%H:%M').time()
+    except ValueError:
+        return JsonResponse({'error': 'Fecha u hora inválida'}, status=400)
+    
+    # El turno tiene que terminar el mismo día
+    fin = a_minutos(hora_inicio) + servicio.duracion_minutos
+    if fin >= 24 * 60:
+        return JsonResponse({'error': 'El turno termina después de la medianoche'}, status=400)
+    
+    try:
+        with transaction.atomic():
+            reserva = Reserva.objects.create(
+                agenda=agenda,
+                cliente=cliente,
+                servicio=servicio,
+                fecha=fecha,
+                hora_inicio=hora_inicio,
+                hora_fin=time(fin // 60, fin % 60),
+                monto_total=monto_total,
+                estado='pendiente'
+            )
+    except IntegrityError as e:
+        if getattr(getattr(e.__cause__, 'diag', None), 'constraint_name', None) != 'reservas_sin_superposicion':
+            raise
+        # Otra reserva activa ya ocupa el horario.
+        # La reserva ganadora puede no haber invalidado aún la cache: forzarlo.
+        invalidar_dia(agenda.id, fecha)
+        return JsonResponse({
+            'error': 'El horario seleccionado ya no está disponible',
+            'alternativas': slots_disponibles(agenda, fecha, servicio.duracion_minutos),
+        }, status=409)
     
     # Crear preferencia de MercadoPago
     if prestador.mp_access_token:
-        sdk = mercadopago.SDK(prestador.mp_access_token)
-        
-        preference_data = {
-            "items": [{
-                "title": f"{servicio.nombre} - {prestador.nombre_negocio}",
-                "quantity": 1,
-                "unit_price": float(monto_a_pagar)
-            }],
-            "back_urls": {
-                "success": f"{request.build_absolute_uri('/reserva/exito/')}?reserva={reserva.codigo}",
-                "failure": f"{request.build_absolute_uri('/reserva/fallo/')}",
-                "pending": f"{request.build_absolute_uri('/reserva/pendiente/')}"
-            },
-            "external_reference": str(reserva.codigo)
+        back_urls = {
+            "success": f"{request.build_absolute_uri('/reserva/exito/')}?reserva={reserva.codigo}",
+            "failure": f"{request.build_absolute_uri('/reserva/fallo/')}",
+            "pending": f"{request.build_absolute_uri('/reserva/pendiente/')}"
         }
         
-        preference = sdk.preference().create(preference_data)
-        reserva.mp_preference_id = preference["response"]["id"]
-        reserva.save()
+        if not settings.MERCADOPAGO_PREFERENCIA_ASINCRONA:
+            try:
+                preference = crear_preferencia(reserva, back_urls)
+                return JsonResponse({
+                    'reserva_id': reserva.id,
+                    'mp_preference_id': preference["id"],
+                    'init_point': preference["init_point"]
+                })
+            except MercadoPagoNoDisponible:
+                # MercadoPago lento o caído: seguir en segundo plano
+                pass
+            except MercadoPagoError:
+                return JsonResponse({
+                    'reserva_id': reserva.id,
+                    'error': 'No se pudo iniciar el pago'
+                }, status=502)
+        
+        crear_preferencia_mercadopago.delay(reserva.id, back_urls)
         
+        # El cliente consulta pago_url hasta obtener el init_point
         return JsonResponse({
             'reserva_id': reserva.id,
-            'mp_preference_id': preference["response"]["id"],
-            'init_point': preference["response"]["init_point"]
-        })
+            'pago_url': reverse('reserva_pago_estado', args=[reserva.codigo])
+        }, status=202)
     
     return JsonResponse({'reserva_id': reserva.id})
 
+def reserva_pago_estado(request, codigo):
+    """Estado de la preferencia de pago de una reserva"""
+    reserva = get_object_or_404(
+        Reserva.objects.values('mp_preference_id', 'mp_init_point'),
+        codigo=codigo
+    )
+    
+    if not reserva['mp_init_point']:
+        return JsonResponse({'pendiente': True}, status=202)
+    
+    return JsonResponse({
+        'mp_preference_id': reserva['mp_preference_id'],
+        'init_point': reserva['mp_init_point']
+    })
+
+# ==================== EVENTOS EN TIEMPO REAL ====================
+
+def _prestador_id_de(request):
+    if not request.user.is_authenticated or request.user.rol != 'prestador':
+        return None
+    try:
+        return request.user.perfil_prestador.id
+    except PerfilPrestador.DoesNotExist:
+        return None
+
+async def eventos_reservas(request):
+    """Reservas creadas, canceladas o pagadas del prestador (Server-Sent Events, requiere ASGI)"""
+    prestador_id = await sync_to_async(_prestador_id_de)(request)
+    if prestador_id is None:
+        return HttpResponse(status=403)
+    # Bajo WSGI el stream ocuparía un worker sincrónico hasta DURACION_MAXIMA
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse('Eventos disponibles sólo en el servidor ASGI', status=501)
+    
+    desconectado = request.scope.get(CLAVE_DESCONEXION)
+    respuesta = StreamingHttpResponse(escuchar(prestador_id, desconectado), content_type='text/event-stream')
+    respuesta['Cache-Control'] = 'no-cache'
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
+
+# ==================== NOTIFICACIONES ====================
+
+@login_required
+def notificaciones_ajax(request):
+    """Bandeja de notificaciones del usuario, de la más reciente a la más antigua"""
+    notificaciones = Notificacion.objects.filter(usuario=request.user)
+    if request.GET.get('no_leidas'):
+        notificaciones = notificaciones.filter(leida=False)
+    
+    pagina = paginar(notificaciones, ('-fecha_creacion', '-id'), request, tamano=TAMANO_PAGINA_NOTIFICACIONES)
+    
+    return JsonResponse({
+        'notificaciones': [{
+            'id': n.id,
+            'tipo': n.tipo,
+            'titulo': n.titulo,
+            'mensaje': n.mensaje,
+            'leida': n.leida,
+            'reserva_id': n.reserva_id,
+            'fecha_creacion': n.fecha_creacion.isoformat(),
+        } for n in pagina],
+        'siguiente': pagina.url_siguiente,
+        'no_leidas': no_leidas(request.user.id),
+    })
+
+@login_required
+def notificaciones_marcar_leidas(request):
+    """Marcar como leídas las notificaciones indicadas en `ids`, o todas"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    
+    try:
+        data = json.loads(request.body or '{}')
+        ids = data.get('ids')
+        if ids is not None:
+            ids = [int(i) for i in ids]
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    
+    marcadas = marcar_leidas(request.user.id, ids)
+    
+    return JsonResponse({'marcadas': marcadas, 'no_leidas': no_leidas(request.user.id)})
+
+@staff_member_required
+def metricas_mercadopago(request):
+    """Métricas del registro de clientes de MercadoPago de este proceso"""
+    return JsonResponse({'pid': os.getpid(), **registro_clientes.metricas()})
+
 def reserva_comprobante_pdf(request, codigo):
-    """Generar comprobante PDF"""
-    reserva = get_object_or_404(Reserva, codigo=codigo)
-    
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="comprobante_{codigo}.pdf"'
-    
-    p = canvas.Canvas(response, pagesize=letter)
-    p.drawString(100, 750, f"Comprobante de Reserva")
-    p.drawString(100, 730, f"Código: {reserva.codigo}")
-    p.drawString(100, 710, f"Cliente: {reserva.cliente.nombre} {reserva.cliente.apellido}")
-    p.drawString(100, 690, f"Servicio: {reserva.servicio.nombre}")
-    p.drawString(100, 670, f"Fecha: {reserva.fecha}")
-    p.drawString(100, 650, f"Hora: {reserva.hora_inicio}")
-    p.drawString(100, 630, f"Monto: ${reserva.monto_pagado}")
-    p.showPage()
-    p.save()
+    """Generar comprobante PDF (cacheado, con ETag y Last-Modified)"""
+    reserva = get_object_or_404(Reserva.objects.select_related('cliente', 'servicio'), codigo=codigo)
+    datos = datos_comprobante(reserva)
+    etag = f'"{huella(datos)}"'
+    
+    # El ETag sale de los datos: si coincide se responde 304 sin leer ni dibujar el PDF
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        contenido, generado = comprobante_pdf(datos)
+        ultima_modificacion = int(generado.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=ultima_modificacion)
+        if response is None:
+            response = HttpResponse(contenido, content_type='application/pdf')
+            response['Content-Disposition'] = f'attachment; filename="comprobante_{codigo}.pdf"'
+        response['Last-Modified'] = http_date(ultima_modificacion)
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
     
     return response
\ No newline at end of file